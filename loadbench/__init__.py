@@ -0,0 +1,15 @@
+"""
+Нагрузочное тестирование ya_news и ya_note без HTTP-сервера.
+
+Приложения yanews.wsgi, yanews.asgi, yanote.wsgi и yanote.asgi
+вызываются напрямую из этого процесса: WSGI — из пула потоков,
+ASGI — из множества корутин одного цикла событий. База данных —
+временный файл SQLite с заранее созданными данными реалистичного
+объёма. Результат каждого прогона — строка JSON с RPS и задержками
+p50/p95/p99 в целом и по сценариям.
+
+Запуск из корня репозитория:
+    python -m loadbench news --interface asgi --concurrency 50
+    python -m loadbench notes --mix list=50,detail=30,create=10,edit=5,delete=5
+    python -m loadbench all --output results.jsonl
+"""
@@ -0,0 +1,209 @@
+import argparse
+import ast
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from . import engine
+
+ROOT = Path(__file__).resolve().parent.parent
+PROJECTS = ('news', 'notes')
+INTERFACES = ('wsgi', 'asgi')
+
+
+def parse_mix(value):
+    """Строка «feed=50,detail=30» в словарь весов сценариев."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f'Ожидается имя=вес, получено {part!r}'
+            )
+    return mix
+
+
+def parse_setting(value):
+    """NAME=VALUE; значение — литерал Python или строка."""
+    name, sep, raw = value.partition('=')
+    if not sep or not name.isupper():
+        raise argparse.ArgumentTypeError(
+            f'Ожидается ИМЯ=значение, получено {value!r}'
+        )
+    try:
+        return name, ast.literal_eval(raw)
+    except (ValueError, SyntaxError):
+        return name, raw
+
+
+def configure(module, path, overrides):
+    """Настраиваем Django проекта на временную базу данных."""
+    sys.path.insert(0, str(ROOT / module.DIRECTORY))
+    os.environ['DJANGO_SETTINGS_MODULE'] = module.SETTINGS
+    from django.conf import settings
+    settings.DEBUG = False
+    settings.DATABASES = {
+        alias: {**database, 'NAME': path}
+        for alias, database in settings.DATABASES.items()
+    }
+    for name, value in overrides:
+        setattr(settings, name, value)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def login(user_ids, concurrency):
+    """Ключи сессий пользователей для виртуальных клиентов."""
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    users = get_user_model().objects.in_bulk(user_ids)
+    sessions = []
+    for number in range(concurrency):
+        user_id = user_ids[number % len(user_ids)]
+        client = Client()
+        client.force_login(users[user_id])
+        sessions.append(
+            (user_id, client.cookies[settings.SESSION_COOKIE_NAME].value)
+        )
+    return sessions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, path):
+    module = importlib.import_module(f'loadbench.{args.project}')
+    mix = args.mix or module.MIX
+    unknown = set(mix) - set(module.MIX)
+    if unknown:
+        sys.exit(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+    configure(module, path, args.set)
+    data = module.seed(args.scale)
+    scenarios = module.scenarios(data)
+    users = []
+    for number, (user_id, session_key) in enumerate(
+        login(data['user_ids'], args.concurrency)
+    ):
+        user = engine.VirtualUser(number, session_key, args.seed)
+        module.prepare(user, user_id, data)
+        users.append(user)
+    application = importlib.import_module(
+        module.APPLICATIONS[args.interface]
+    ).application
+    runner = engine.run_asgi if args.interface == 'asgi' else engine.run_wsgi
+    # Прогрев: шаблоны, соединения с базой, кэши представлений.
+    runner(application, users[:1], scenarios, mix, args.warmup)
+    summary = runner(application, users, scenarios, mix, args.requests)
+
+    import django
+    result = {
+        'project': args.project,
+        'interface': args.interface,
+        'concurrency': args.concurrency,
+        'requests_per_user': args.requests,
+        'mix': mix,
+        'scale': args.scale,
+        'seed': args.seed,
+        'settings': dict(args.set),
+        **summary,
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'timestamp': datetime.datetime.now(
+            datetime.timezone.utc
+        ).isoformat(timespec='seconds'),
+    }
+    line = json.dumps(result, ensure_ascii=False)
+    print(line)
+    if args.output:
+        with open(args.output, 'a') as output:
+            output.write(line + '\n')
+
+
+def run_all(args):
+    """
+    Каждое сочетание проекта и интерфейса — в отдельном процессе:
+    настройки Django и загруженные приложения у проектов разные.
+    """
+    options = [
+        '--concurrency', str(args.concurrency),
+        '--requests', str(args.requests),
+        '--warmup', str(args.warmup),
+        '--scale', str(args.scale),
+        '--seed', str(args.seed),
+    ]
+    for name, value in args.set:
+        options += ['--set', f'{name}={value!r}']
+    if args.output:
+        options += ['--output', str(Path(args.output).resolve())]
+    for project in PROJECTS:
+        for interface in INTERFACES:
+            subprocess.run([
+                sys.executable, '-m', 'loadbench', project,
+                '--interface', interface, *options,
+            ], cwd=ROOT, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m loadbench')
+    parser.add_argument('project', choices=(*PROJECTS, 'all'))
+    parser.add_argument('--interface', choices=INTERFACES, default='wsgi')
+    parser.add_argument(
+        '--concurrency', type=int, default=20,
+        help='число одновременных виртуальных клиентов'
+    )
+    parser.add_argument(
+        '--requests', type=int, default=50,
+        help='запросов от каждого клиента'
+    )
+    parser.add_argument(
+        '--warmup', type=int, default=20,
+        help='запросов прогрева перед измерением'
+    )
+    parser.add_argument(
+        '--mix', type=parse_mix,
+        help='веса сценариев, например feed=50,detail=30,comment=20'
+    )
+    parser.add_argument(
+        '--scale', type=float, default=1.0,
+        help='множитель объёма данных'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--set', type=parse_setting, action='append', default=[],
+        metavar='NAME=VALUE', help='переопределить настройку Django'
+    )
+    parser.add_argument(
+        '--output', help='дописать результат строкой JSON в файл'
+    )
+    args = parser.parse_args()
+    if args.project == 'all':
+        if args.mix:
+            parser.error('--mix задаётся для одного проекта')
+        run_all(args)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        run(args, str(Path(directory) / 'loadbench.sqlite3'))
+
+
+if __name__ == '__main__':
+    main()
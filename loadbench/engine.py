@@ -0,0 +1,264 @@
+"""Виртуальные клиенты и вызов приложений WSGI и ASGI."""
+import asyncio
+import io
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+# Маскированный токен CSRF: 64 допустимых символа. Одно и то же
+# значение в cookie и в заголовке проходит проверку CsrfViewMiddleware.
+CSRF_TOKEN = 'loadbench' + 'x' * 55
+HOST = 'localhost'
+
+
+class Request:
+    """Запрос сценария и действие после успешного ответа."""
+
+    def __init__(self, method, path, data=None, expected=200,
+                 on_success=None):
+        self.method = method
+        self.path = path
+        self.body = urlencode(data).encode() if data else b''
+        self.expected = expected
+        self.on_success = on_success
+
+
+class VirtualUser:
+    """Клиент со своими cookie, генератором случайных чисел и состоянием."""
+
+    def __init__(self, number, session_key, seed):
+        from django.conf import settings
+        self.number = number
+        self.random = random.Random(seed * 100003 + number)
+        self.cookies = {settings.CSRF_COOKIE_NAME: CSRF_TOKEN}
+        if session_key:
+            self.cookies[settings.SESSION_COOKIE_NAME] = session_key
+        self.state = {}
+
+    def cookie_header(self):
+        return '; '.join(
+            f'{name}={value}' for name, value in self.cookies.items()
+        )
+
+    def store_cookies(self, headers):
+        """Сохраняем cookie из ответа; удалённые сервером убираем."""
+        for name, value in headers:
+            if name.lower() != 'set-cookie':
+                continue
+            for morsel in SimpleCookie(value).values():
+                if morsel['max-age'] == '0' or not morsel.value:
+                    self.cookies.pop(morsel.key, None)
+                else:
+                    self.cookies[morsel.key] = morsel.value
+
+
+def call_wsgi(application, user, request):
+    """Запрос к WSGI-приложению; возвращает код ответа."""
+    path, _, query = request.path.partition('?')
+    environ = {
+        'REQUEST_METHOD': request.method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': HOST,
+        'HTTP_COOKIE': user.cookie_header(),
+        'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(request.body)),
+        'wsgi.input': io.BytesIO(request.body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split()[0])
+        started['headers'] = headers
+
+    result = application(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    user.store_cookies(started['headers'])
+    return started['status']
+
+
+async def call_asgi(application, user, request):
+    """Запрос к ASGI-приложению; возвращает код ответа."""
+    path, _, query = request.path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': request.method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [
+            (b'host', HOST.encode()),
+            (b'cookie', user.cookie_header().encode()),
+            (b'x-csrftoken', CSRF_TOKEN.encode()),
+            (b'content-type', b'application/x-www-form-urlencoded'),
+            (b'content-length', str(len(request.body)).encode()),
+        ],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    sent = False
+    started = {}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            return {'type': 'http.disconnect'}
+        sent = True
+        return {
+            'type': 'http.request', 'body': request.body, 'more_body': False
+        }
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            started['status'] = message['status']
+            started['headers'] = [
+                (name.decode('latin-1'), value.decode('latin-1'))
+                for name, value in message['headers']
+            ]
+
+    await application(scope, receive, send)
+    user.store_cookies(started['headers'])
+    return started['status']
+
+
+class Results:
+    """Задержки и ошибки по сценариям; пополняется из разных потоков."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def add(self, scenario, latency, ok):
+        with self.lock:
+            self.latencies[scenario].append(latency)
+            if not ok:
+                self.errors[scenario] += 1
+
+    def summary(self, seconds):
+        everything = [
+            latency for latencies in self.latencies.values()
+            for latency in latencies
+        ]
+        return {
+            'requests': len(everything),
+            'errors': sum(self.errors.values()),
+            'seconds': round(seconds, 3),
+            'rps': round(len(everything) / seconds, 1) if seconds else 0,
+            'latency_ms': percentiles(everything),
+            'scenarios': {
+                name: {
+                    'requests': len(latencies),
+                    'errors': self.errors[name],
+                    'latency_ms': percentiles(latencies),
+                }
+                for name, latencies in sorted(self.latencies.items())
+            },
+        }
+
+
+def percentiles(latencies):
+    """p50, p95, p99 и максимум в миллисекундах."""
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+
+    def at(share):
+        index = min(int(share * len(ordered)), len(ordered) - 1)
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        'p50': at(0.50), 'p95': at(0.95), 'p99': at(0.99),
+        'max': round(ordered[-1] * 1000, 2),
+    }
+
+
+def choose(user, mix):
+    """Сценарий с вероятностью, пропорциональной его весу."""
+    names = list(mix)
+    return user.random.choices(names, weights=[mix[name] for name in names])[0]
+
+
+def step(user, scenarios, mix):
+    name = choose(user, mix)
+    return name, scenarios[name](user)
+
+
+def finish(user, request, status, results, name, latency):
+    ok = status == request.expected
+    if ok and request.on_success:
+        request.on_success(user)
+    results.add(name, latency, ok)
+
+
+def run_wsgi(application, users, scenarios, mix, requests):
+    """Каждый клиент — поток, который отправляет запросы по очереди."""
+    from django.db import connections
+
+    results = Results()
+
+    def client(user):
+        try:
+            for _ in range(requests):
+                name, request = step(user, scenarios, mix)
+                started = time.perf_counter()
+                status = call_wsgi(application, user, request)
+                finish(user, request, status, results, name,
+                       time.perf_counter() - started)
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=client, args=(user,)) for user in users
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.summary(time.perf_counter() - started)
+
+
+def run_asgi(application, users, scenarios, mix, requests):
+    """Каждый клиент — корутина в общем цикле событий."""
+    results = Results()
+
+    async def client(user):
+        for _ in range(requests):
+            name, request = step(user, scenarios, mix)
+            started = time.perf_counter()
+            status = await call_asgi(application, user, request)
+            finish(user, request, status, results, name,
+                   time.perf_counter() - started)
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(client(user) for user in users))
+        return time.perf_counter() - started
+
+    return results.summary(asyncio.run(main()))
@@ -0,0 +1,94 @@
+"""Данные и сценарии нагрузки ya_news."""
+import datetime
+import random
+
+from .engine import Request
+
+DIRECTORY = 'ya_news'
+SETTINGS = 'yanews.settings'
+APPLICATIONS = {'wsgi': 'yanews.wsgi', 'asgi': 'yanews.asgi'}
+MIX = {'feed': 50, 'detail': 30, 'comments': 10, 'comment': 10}
+
+USERS = 200
+NEWS = 2000
+COMMENTS = 60000
+TEXT = 'Текст новости с подробностями происшествия. ' * 40
+
+
+def seed(scale):
+    """
+    Новости за несколько лет и комментарии к ним.
+
+    Комментарии распределены неравномерно: свежие новости
+    обсуждают намного чаще старых.
+    """
+    from django.contrib.auth import get_user_model
+
+    from news.models import Comment, News
+    from news.trending import update_trending
+
+    rng = random.Random(0)
+    user_model = get_user_model()
+    user_model.objects.bulk_create(
+        user_model(username=f'reader{i}') for i in range(int(USERS * scale))
+    )
+    today = datetime.date.today()
+    News.objects.bulk_create(
+        (News(title=f'Новость {i}', text=TEXT,
+              date=today - datetime.timedelta(days=i // 3))
+         for i in range(int(NEWS * scale))),
+        batch_size=1000,
+    )
+    user_ids = list(user_model.objects.values_list('pk', flat=True))
+    news_ids = list(
+        News.objects.order_by('-date', 'pk').values_list('pk', flat=True)
+    )
+    Comment.objects.bulk_create(
+        (Comment(news_id=pick(rng, news_ids), author_id=rng.choice(user_ids),
+                 text=f'Комментарий {i} к новости')
+         for i in range(int(COMMENTS * scale))),
+        batch_size=1000,
+    )
+    News.objects.recount_comments()
+    update_trending()
+    return {'user_ids': user_ids, 'news_ids': news_ids}
+
+
+def pick(rng, news_ids):
+    """Чаще выбираем свежие новости из начала списка."""
+    return news_ids[int(len(news_ids) * rng.random() ** 3)]
+
+
+def prepare(user, user_id, data):
+    """Состояние клиента не нужно: новости общие для всех."""
+
+
+def scenarios(data):
+    from django.urls import reverse
+
+    news_ids = data['news_ids']
+
+    def feed(user):
+        return Request('GET', reverse('news:home'))
+
+    def detail(user):
+        pk = pick(user.random, news_ids)
+        return Request('GET', reverse('news:detail', kwargs={'pk': pk}))
+
+    def comments(user):
+        pk = pick(user.random, news_ids)
+        return Request('GET', reverse('news:comments', kwargs={'pk': pk}))
+
+    def comment(user):
+        pk = pick(user.random, news_ids)
+        return Request(
+            'POST', reverse('news:detail', kwargs={'pk': pk}),
+            {'text': f'Комментарий читателя {user.number}'}, expected=302,
+        )
+
+    return {
+        'feed': feed,
+        'detail': detail,
+        'comments': comments,
+        'comment': comment,
+    }
@@ -0,0 +1,96 @@
+"""Данные и сценарии нагрузки ya_note."""
+import itertools
+
+from .engine import Request
+
+DIRECTORY = 'ya_note'
+SETTINGS = 'yanote.settings'
+APPLICATIONS = {'wsgi': 'yanote.wsgi', 'asgi': 'yanote.asgi'}
+MIX = {'list': 40, 'detail': 30, 'create': 10, 'edit': 10, 'delete': 10}
+
+USERS = 200
+NOTES_PER_USER = 150
+TEXT = 'Заметка о планах, задачах, ссылках и идеях на неделю. ' * 20
+
+
+def seed(scale):
+    """Пользователи, у каждого из которых много заметок."""
+    from django.contrib.auth import get_user_model
+
+    from notes.models import Note
+
+    user_model = get_user_model()
+    user_model.objects.bulk_create(
+        user_model(username=f'writer{i}') for i in range(int(USERS * scale))
+    )
+    user_ids = list(user_model.objects.values_list('pk', flat=True))
+    Note.objects.bulk_create(
+        (Note(title=f'Заметка {i}', text=TEXT, slug=f'u{author}-n{i}',
+              author_id=author)
+         for author in user_ids for i in range(NOTES_PER_USER)),
+        batch_size=1000,
+    )
+    return {'user_ids': user_ids}
+
+
+def prepare(user, user_id, data):
+    """Клиент знает slug своих заметок и создаёт новые с уникальным."""
+    user.state['slugs'] = [
+        f'u{user_id}-n{i}' for i in range(NOTES_PER_USER)
+    ]
+    user.state['counter'] = itertools.count()
+
+
+def scenarios(data):
+    from django.conf import settings
+    from django.urls import reverse
+
+    def own_slug(user):
+        return user.random.choice(user.state['slugs'])
+
+    def list_page(user):
+        pages = max(
+            1, len(user.state['slugs']) // settings.NOTES_COUNT_ON_LIST_PAGE
+        )
+        page = user.random.randint(1, pages)
+        return Request('GET', f'{reverse("notes:list")}?page={page}')
+
+    def detail(user):
+        return Request(
+            'GET', reverse('notes:detail', kwargs={'slug': own_slug(user)})
+        )
+
+    def create(user):
+        slug = f'bench-{user.number}-{next(user.state["counter"])}'
+        return Request(
+            'POST', reverse('notes:add'),
+            {'title': 'Новая заметка', 'text': TEXT, 'slug': slug},
+            expected=302,
+            on_success=lambda user: user.state['slugs'].append(slug),
+        )
+
+    def edit(user):
+        slug = own_slug(user)
+        return Request(
+            'POST', reverse('notes:edit', kwargs={'slug': slug}),
+            {'title': 'Изменённая заметка', 'text': TEXT, 'slug': slug},
+            expected=302,
+        )
+
+    def delete(user):
+        if len(user.state['slugs']) < 2:
+            return create(user)
+        slug = own_slug(user)
+        return Request(
+            'POST', reverse('notes:delete', kwargs={'slug': slug}),
+            expected=302,
+            on_success=lambda user: user.state['slugs'].remove(slug),
+        )
+
+    return {
+        'list': list_page,
+        'detail': detail,
+        'create': create,
+        'edit': edit,
+        'delete': delete,
+    }
@@ -0,0 +1,283 @@
+"""
+Бюджеты производительности маршрутов Django в тестах.
+
+Плагин pytest измеряет каждый запрос тестового клиента
+django.test.Client: число SQL-запросов, время ответа и размер
+отрисованной страницы. Измерения сравниваются с бюджетом имени
+маршрута из параметра budgets в pytest.ini:
+
+    [pytest]
+    pythonpath = ..
+    budgets =
+        news:home queries=1 time=0.5 bytes=20000
+
+Плагин подключается в conftest.py проекта:
+
+    pytest_plugins = ('pytest_budgets',)
+
+Клиент один и тот же в тестах pytest и в django.test.TestCase,
+поэтому бюджеты проверяются в обоих наборах тестов. Превышение
+проваливает тест на вызове клиента и показывает выполненные
+SQL-запросы и их отличия от прошлого отчёта. Отчёт JSON для
+отслеживания динамики пишется в файл из параметра budget_report.
+"""
+import datetime
+import difflib
+import json
+import re
+import statistics
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+import pytest
+
+LIMITS = {
+    'queries': 'SQL-запросов',
+    'time': 'время, с',
+    'bytes': 'размер ответа, байт',
+}
+# Имена точек сохранения разные при каждом запуске.
+SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+
+
+class BudgetExceeded(AssertionError):
+    """Запрос к маршруту превысил бюджет."""
+
+
+def parse_budgets(lines):
+    """Строки вида «news:home queries=1 time=0.5 bytes=20000»."""
+    budgets = {}
+    for line in lines:
+        name, *limits = line.split()
+        budget = {}
+        for limit in limits:
+            key, _, value = limit.partition('=')
+            if key not in LIMITS:
+                raise pytest.UsageError(
+                    f'Неизвестный лимит {key!r} в бюджете {name}'
+                )
+            budget[key] = float(value) if key == 'time' else int(value)
+        budgets[name] = budget
+    return budgets
+
+
+def describe_sql(queries):
+    """Пронумерованные запросы; повторы подряд схлопываются."""
+    lines = []
+    for number, sql in enumerate(queries, start=1):
+        if lines and lines[-1][1] == sql:
+            lines[-1][2] += 1
+        else:
+            lines.append([number, sql, 1])
+    return '\n'.join(
+        f'  {number:>3}. {sql}' + (f'  [×{repeats}]' if repeats > 1 else '')
+        for number, sql, repeats in lines
+    )
+
+
+def diff_sql(baseline, queries):
+    """Отличия выполненных запросов от запросов из прошлого отчёта."""
+    return '\n'.join(difflib.unified_diff(
+        baseline, queries, 'прошлый отчёт', 'сейчас', lineterm='', n=1
+    ))
+
+
+class BudgetPlugin:
+
+    def __init__(self, config):
+        self.budgets = parse_budgets(config.getini('budgets'))
+        self.enforce = not config.getoption('no_budgets')
+        report = (
+            config.getoption('budget_report')
+            or config.getini('budget_report')
+        )
+        self.report_path = Path(config.rootpath, report) if report else None
+        self.previous = self.load_previous()
+        self.baseline = {
+            name: route.get('sql', [])
+            for name, route in self.previous.items()
+        }
+        self.measurements = defaultdict(list)
+        self.item = None
+        self.original_request = None
+
+    def load_previous(self):
+        """Маршруты из прошлого отчёта: с ними сравниваются запросы."""
+        if self.report_path is None:
+            return {}
+        try:
+            return json.loads(self.report_path.read_text())['routes']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def pytest_sessionstart(self, session):
+        from django.test import Client
+        self.original_request = Client.request
+        plugin = self
+
+        def request(client, **request):
+            return plugin.measure(client, request)
+
+        Client.request = request
+
+    def pytest_sessionfinish(self, session):
+        if self.original_request is None:
+            return
+        from django.test import Client
+        Client.request = self.original_request
+        if self.report_path is not None and self.measurements:
+            self.report_path.write_text(json.dumps(
+                self.report(), ensure_ascii=False, indent=2
+            ) + '\n')
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        self.item = item
+        try:
+            yield
+        finally:
+            self.item = None
+
+    def measure(self, client, request):
+        from django.db import connections
+        from django.urls import Resolver404
+
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(SAVEPOINT.sub('"sN"', sql))
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(record)
+                )
+            started = time.perf_counter()
+            response = self.original_request(client, **request)
+            elapsed = time.perf_counter() - started
+        try:
+            name = response.resolver_match.view_name
+        except Resolver404:
+            return response
+        measurement = {
+            'path': request.get('PATH_INFO', ''),
+            'method': request.get('REQUEST_METHOD', 'GET'),
+            'status': response.status_code,
+            'queries': len(queries),
+            'time': elapsed,
+            'bytes': (
+                None if response.streaming else len(response.content)
+            ),
+            'sql': queries,
+        }
+        exceeded = self.check(name, measurement)
+        measurement['exceeded'] = bool(exceeded)
+        self.measurements[name].append(measurement)
+        if exceeded and self.enforce and not self.exempt():
+            raise BudgetExceeded(self.explain(name, measurement, exceeded))
+        return response
+
+    def exempt(self):
+        return self.item is not None and (
+            self.item.get_closest_marker('budget_exempt') is not None
+        )
+
+    def check(self, name, measurement):
+        """Превышенные лимиты: (лимит, значение, бюджет)."""
+        return [
+            (key, measurement[key], limit)
+            for key, limit in self.budgets.get(name, {}).items()
+            if measurement[key] is not None and measurement[key] > limit
+        ]
+
+    def explain(self, name, measurement, exceeded):
+        lines = [
+            f'Маршрут {name} превысил бюджет: '
+            f'{measurement["method"]} {measurement["path"]} '
+            f'→ {measurement["status"]}',
+        ]
+        lines += [
+            f'  {LIMITS[key]}: '
+            f'{f"{value:.3f}" if key == "time" else value} '
+            f'при бюджете {limit}'
+            for key, value, limit in exceeded
+        ]
+        lines += ['Выполненные запросы:', describe_sql(measurement['sql'])]
+        baseline = self.baseline.get(name)
+        if baseline is not None and baseline != measurement['sql']:
+            lines += [
+                'Отличия от прошлого отчёта:',
+                diff_sql(baseline, measurement['sql']),
+            ]
+        duplicates = [
+            (sql, count)
+            for sql, count in Counter(measurement['sql']).most_common()
+            if count > 1
+        ]
+        if duplicates:
+            lines.append('Повторяющиеся запросы:')
+            lines += [f'  ×{count} {sql}' for sql, count in duplicates]
+        return '\n'.join(lines)
+
+    def report(self):
+        """
+        Сводка по маршрутам. Маршруты, которые не запрашивались
+        в этом запуске, например при запуске части тестов,
+        остаются из прошлого отчёта.
+        """
+        routes = dict(self.previous)
+        for name, measurements in sorted(self.measurements.items()):
+            times = [item['time'] for item in measurements]
+            sizes = [
+                item['bytes'] for item in measurements
+                if item['bytes'] is not None
+            ]
+            heaviest = max(measurements, key=lambda item: item['queries'])
+            routes[name] = {
+                'budget': self.budgets.get(name, {}),
+                'requests': len(measurements),
+                'exceeded': sum(item['exceeded'] for item in measurements),
+                'queries_max': heaviest['queries'],
+                'queries_mean': round(statistics.mean(
+                    item['queries'] for item in measurements
+                ), 2),
+                'time_max_ms': round(max(times) * 1000, 2),
+                'time_median_ms': round(statistics.median(times) * 1000, 2),
+                'bytes_max': max(sizes) if sizes else None,
+                'sql': heaviest['sql'],
+            }
+        return {
+            'generated': datetime.datetime.now(
+                datetime.timezone.utc
+            ).isoformat(timespec='seconds'),
+            'routes': dict(sorted(routes.items())),
+        }
+
+
+def pytest_addoption(parser):
+    parser.addini(
+        'budgets', type='linelist', default=[],
+        help='Бюджеты маршрутов: «имя queries=N time=S bytes=N».'
+    )
+    parser.addini(
+        'budget_report', default='',
+        help='Файл отчёта JSON об измерениях маршрутов.'
+    )
+    group = parser.getgroup('budgets')
+    group.addoption(
+        '--budget-report', help='Файл отчёта JSON вместо budget_report.'
+    )
+    group.addoption(
+        '--no-budgets', action='store_true',
+        help='Только измерять маршруты, не проверяя бюджеты.'
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers', 'budget_exempt: не проверять бюджеты маршрутов в тесте.'
+    )
+    config.pluginmanager.register(BudgetPlugin(config), 'budget-plugin')
@@ -0,0 +1,169 @@
+"""
+Сравнение синхронных и асинхронных представлений под ASGI.
+
+Приложение yanews.asgi вызывается напрямую из цикла событий:
+множество одновременных клиентов медленно отправляют запрос
+и медленно читают ответ. Клиенты запрашивают ленту, страницу
+новости и порцию комментариев.
+Запуск из директории ya_news:
+    python -m benchmarks.asgi_views [--clients 200] [--requests 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+MODES = ('sync', 'async')
+NEWS_COUNT = 20
+COMMENTS_PER_NEWS = 60
+
+
+def configure(mode, path):
+    """Настраиваем Django на временную базу и выбранные представления."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanews.settings')
+    from django.conf import settings
+    settings.DEBUG = False
+    settings.NEWS_ASYNC_VIEWS = mode == 'async'
+    settings.DATABASES = {
+        alias: {**database, 'NAME': path}
+        for alias, database in settings.DATABASES.items()
+    }
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed():
+    """Новости с комментариями; возвращает адреса для запросов."""
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+
+    from news.models import Comment, News
+    author = get_user_model().objects.create(username='author')
+    News.objects.bulk_create(
+        News(title=f'Новость {i}', text='Текст новости. ' * 50)
+        for i in range(NEWS_COUNT)
+    )
+    paths = [reverse('news:home')]
+    for news in News.objects.all():
+        Comment.objects.bulk_create(
+            Comment(news=news, author=author, text=f'Комментарий {i}')
+            for i in range(COMMENTS_PER_NEWS)
+        )
+        paths.append(reverse('news:detail', kwargs={'pk': news.pk}))
+        paths.append(reverse('news:comments', kwargs={'pk': news.pk}))
+    return paths
+
+
+async def fetch(application, path, delay):
+    """Один запрос медленного клиента; возвращает код ответа."""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'localhost')],
+        'client': ('127.0.0.1', 0),
+        'server': ('localhost', 80),
+    }
+    status = None
+
+    async def receive():
+        await asyncio.sleep(delay)
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        else:
+            await asyncio.sleep(delay)
+
+    await application(scope, receive, send)
+    return status
+
+
+async def client(application, paths, offset, requests, delay, latencies):
+    for i in range(requests):
+        path = paths[(offset + i) % len(paths)]
+        started = time.perf_counter()
+        status = await fetch(application, path, delay)
+        assert status == 200, (path, status)
+        latencies.append(time.perf_counter() - started)
+
+
+async def load(application, paths, clients, requests, delay):
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(application, paths, offset, requests, delay, latencies)
+        for offset in range(clients)
+    ))
+    return time.perf_counter() - started, latencies
+
+
+def run_mode(mode, path, clients, requests, delay):
+    configure(mode, path)
+    paths = seed()
+    from yanews.asgi import application
+    # Прогрев: шаблоны, соединения с базой, кэш ленты.
+    asyncio.run(load(application, paths, 1, len(paths), 0))
+    elapsed, latencies = asyncio.run(
+        load(application, paths, clients, requests, delay)
+    )
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(json.dumps({
+        'mode': mode,
+        'clients': clients,
+        'requests': len(latencies),
+        'client_delay_ms': delay * 1000,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(quantiles[49] * 1000, 1),
+        'p95_ms': round(quantiles[94] * 1000, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument(
+        '--delay', type=float, default=0.05,
+        help='задержка медленного клиента при отправке и чтении, с'
+    )
+    parser.add_argument('--mode', choices=MODES)
+    parser.add_argument('--path')
+    args = parser.parse_args()
+    if args.mode:
+        run_mode(args.mode, args.path, args.clients, args.requests,
+                 args.delay)
+        return
+    # Каждый режим запускается в отдельном процессе: представления
+    # выбираются в news.urls при загрузке по NEWS_ASYNC_VIEWS.
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in MODES:
+            subprocess.run([
+                sys.executable, '-m', 'benchmarks.asgi_views',
+                '--mode', mode,
+                '--path', str(Path(directory) / f'{mode}.sqlite3'),
+                '--clients', str(args.clients),
+                '--requests', str(args.requests),
+                '--delay', str(args.delay),
+            ], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Замер времени проверки комментария на запрещённые слова.
+
+Запуск из директории ya_news:
+    python -m benchmarks.bad_words
+"""
+import random
+import timeit
+
+from news.matching import MATCHERS, BadWordsFilter
+
+ALPHABET = 'бвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+SIZES = (2, 10, 100, 1000, 10000)
+COMMENT = ' '.join(['Обычный комментарий к новости без ругательств.'] * 20)
+REPEAT = 200
+
+
+def make_words(count, seed=0):
+    """Случайные слова из кириллических букв длиной от 5 до 10."""
+    rnd = random.Random(seed)
+    return [''.join(rnd.choices(ALPHABET, k=rnd.randint(5, 10)))
+            for _ in range(count)]
+
+
+def naive_find(words, text):
+    """Прежний алгоритм: отдельный поиск подстроки для каждого слова."""
+    lowered_text = text.lower()
+    for word in words:
+        if word in lowered_text:
+            return word
+    return None
+
+
+def measure(func):
+    """Среднее время одного вызова в микросекундах."""
+    return min(timeit.repeat(func, number=REPEAT, repeat=5)) / REPEAT * 1e6
+
+
+def main():
+    engines = tuple(MATCHERS)
+    print(f'Длина комментария: {len(COMMENT)} символов, время в мкс')
+    print(f'{"слов":>6}', *(f'{name:>13}' for name in ('naive', *engines)))
+    for size in SIZES:
+        words = make_words(size)
+        timings = [measure(lambda: naive_find(words, COMMENT))]
+        for engine in engines:
+            words_filter = BadWordsFilter(words, engine)
+            timings.append(measure(lambda: words_filter.find(COMMENT)))
+        print(f'{size:>6}', *(f'{timing:>13.1f}' for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Нагрузочный тест записи комментариев из нескольких потоков.
+
+Сравнивает SQLite с настройками по умолчанию и с PRAGMA проекта.
+Запуск из директории ya_news:
+    python -m benchmarks.sqlite_writes [--threads 8] [--writes 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROFILES = ('default', 'tuned')
+
+
+def configure(profile, path):
+    """Настраиваем Django на временный файл базы данных."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanews.settings')
+    from django.conf import settings
+    if profile == 'default':
+        settings.DATABASES = {'default': {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': path,
+        }}
+        settings.DATABASE_ROUTERS = []
+    else:
+        settings.DATABASES = {
+            alias: {**database, 'NAME': path}
+            for alias, database in settings.DATABASES.items()
+        }
+    import django
+    django.setup()
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def worker(news_id, writes, results):
+    """Читаем новость и добавляем к ней комментарий в одной транзакции."""
+    from django.db import OperationalError, connections, transaction
+
+    from news.models import Comment, News
+    done = errors = 0
+    for i in range(writes):
+        try:
+            with transaction.atomic():
+                news = News.objects.get(pk=news_id)
+                Comment.objects.create(news=news, text=f'Комментарий {i}')
+            done += 1
+        except OperationalError:
+            errors += 1
+    connections.close_all()
+    results.append((done, errors))
+
+
+def run_profile(profile, path, threads, writes):
+    configure(profile, path)
+    from news.models import News
+    news = News.objects.create(title='Новость', text='Текст')
+    results = []
+    pool = [
+        threading.Thread(target=worker, args=(news.pk, writes, results))
+        for _ in range(threads)
+    ]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done = sum(result[0] for result in results)
+    print(json.dumps({
+        'profile': profile,
+        'threads': threads,
+        'writes': done,
+        'errors': sum(result[1] for result in results),
+        'seconds': round(elapsed, 3),
+        'writes_per_second': round(done / elapsed, 1),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--profile', choices=PROFILES)
+    parser.add_argument('--path')
+    args = parser.parse_args()
+    if args.profile:
+        run_profile(args.profile, args.path, args.threads, args.writes)
+        return
+    # Каждый профиль запускается в отдельном процессе: настройки
+    # соединений Django нельзя поменять после первого подключения.
+    with tempfile.TemporaryDirectory() as directory:
+        for profile in PROFILES:
+            subprocess.run([
+                sys.executable, '-m', 'benchmarks.sqlite_writes',
+                '--profile', profile,
+                '--path', str(Path(directory) / f'{profile}.sqlite3'),
+                '--threads', str(args.threads),
+                '--writes', str(args.writes),
+            ], check=True)
+
+
+if __name__ == '__main__':
+    main()
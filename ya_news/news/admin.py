@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Comment, News
+from .moderation import DELETE, REDACT, moderate_comments
 
 
 class CommentInline(admin.StackedInline):
@@ -10,6 +11,40 @@ class CommentInline(admin.StackedInline):
 
 @admin.register(News)
 class NewsAdmin(admin.ModelAdmin):
+    list_display = ('title', 'date', 'comment_count', 'last_comment_at')
     inlines = [
         CommentInline,
     ]
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'news', 'author', 'created')
+    list_filter = ('created',)
+    list_select_related = ('news', 'author')
+    search_fields = ('text', 'author__username')
+    actions = ('redact_comments', 'delete_comments')
+
+    def save_model(self, request, obj, form, change):
+        """Комментарий перенесли к другой новости: пересчитываем обе."""
+        super().save_model(request, obj, form, change)
+        if change and 'news' in form.changed_data:
+            News.objects.filter(
+                pk__in=(obj.news_id, form.initial['news'])
+            ).recount_comments()
+
+    @admin.action(
+        description='Скрыть текст выбранных комментариев',
+        permissions=('change',),
+    )
+    def redact_comments(self, request, queryset):
+        affected = moderate_comments(queryset, REDACT)
+        self.message_user(request, f'Скрыто комментариев: {affected}')
+
+    @admin.action(
+        description='Удалить выбранные комментарии одним запросом',
+        permissions=('delete',),
+    )
+    def delete_comments(self, request, queryset):
+        affected = moderate_comments(queryset, DELETE)
+        self.message_user(request, f'Удалено комментариев: {affected}')
@@ -5,3 +5,9 @@ class NewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'news'
     verbose_name = 'Новости'
+
+    def ready(self):
+        from yanews.metrics import connect_write_signals
+
+        from . import signals  # noqa: F401
+        connect_write_signals()
@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+FEED_VERSION_KEY = 'news:feed:version'
+PAGES_VERSION_KEY = 'news:pages:version'
+COMMENTS_VERSION_KEY = 'news:{}:comments:version'
+
+
+def get_feed_cache():
+    """Кэш, в котором хранятся фрагменты ленты новостей."""
+    return caches[settings.NEWS_FEED_CACHE]
+
+
+def get_feed_version():
+    """
+    Текущая версия ленты новостей.
+
+    Версия входит в ключ кэшированного фрагмента, поэтому после
+    её увеличения старые фрагменты больше не используются.
+    Начальное значение берётся из текущего времени, чтобы после
+    вытеснения ключа версия не совпала с одной из прежних.
+    """
+    return get_feed_cache().get_or_set(FEED_VERSION_KEY, time.time_ns, None)
+
+
+def get_detail_version(news_id):
+    """
+    Версия страницы новости.
+
+    Складывается из версии всех страниц новостей, которая меняется
+    вместе с любой новостью (от них зависят ссылки на соседние),
+    и версии комментариев к этой новости.
+    """
+    cache = get_feed_cache()
+    keys = (PAGES_VERSION_KEY, COMMENTS_VERSION_KEY.format(news_id))
+    versions = cache.get_many(keys)
+    return '-'.join(
+        str(versions.get(key) or cache.get_or_set(key, time.time_ns, None))
+        for key in keys
+    )
+
+
+def bump_version(key):
+    """Увеличиваем версию; пропавший ключ заводим заново."""
+    cache = get_feed_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def invalidate_feed():
+    """Сбрасываем кэш ленты, увеличивая её версию."""
+    bump_version(FEED_VERSION_KEY)
+
+
+def invalidate_pages():
+    """Меняем версию всех страниц новостей."""
+    bump_version(PAGES_VERSION_KEY)
+
+
+def invalidate_comments(news_id):
+    """Меняем версию страницы новости после изменения комментариев."""
+    bump_version(COMMENTS_VERSION_KEY.format(news_id))
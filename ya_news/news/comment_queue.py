@@ -0,0 +1,358 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import (
+    DatabaseError, IntegrityError, close_old_connections, connections,
+    router, transaction
+)
+from django.db.models import Max
+from django.db.models.signals import post_save
+
+from .models import Comment
+
+logger = logging.getLogger(__name__)
+
+STOP = object()
+
+
+def save_comments(comments):
+    """
+    Записываем пачку комментариев в одной транзакции и отправляем post_save.
+
+    Сигналы обновляют счётчики новости, сбрасывают кэши и передают
+    комментарии в поток, как при обычном save().
+    SQLite в Django 3.2 не возвращает ключи из bulk_create. Пока
+    транзакция не зафиксирована, другие соединения писать не могут,
+    а ключи AUTOINCREMENT выдаются подряд, поэтому ключи пачки
+    восстанавливаются по наибольшему ключу таблицы.
+    """
+    using = router.db_for_write(Comment)
+    with transaction.atomic(using=using):
+        Comment.objects.using(using).bulk_create(comments)
+        if comments[0].pk is None:
+            last = Comment.objects.using(using).aggregate(
+                last=Max('pk')
+            )['last']
+            for pk, comment in enumerate(
+                    comments, start=last - len(comments) + 1):
+                comment.pk = pk
+        for comment in comments:
+            post_save.send(
+                sender=Comment, instance=comment, created=True,
+                update_fields=None, raw=False, using=using,
+            )
+
+
+class CommentJournal:
+    """
+    Журнал комментариев, принятых в очередь, но ещё не записанных.
+
+    Каждый процесс пишет свой файл и держит на нём блокировку flock.
+    Файл без блокировки остался от завершившегося аварийно процесса,
+    его записи воспроизводит следующий процесс.
+    В журнале две разновидности строк: комментарий с порядковым номером
+    и отметка о том, что комментарии до этого номера записаны в базу,
+    кроме перечисленных в ней незаписанных. Отметка пишется после
+    фиксации транзакции: при сбое между ними комментарий может быть
+    записан повторно, но не будет потерян.
+    """
+
+    def __init__(self, directory, fsync=True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.path = self.directory / (
+            f'comments-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl'
+        )
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.lock(self.file)
+        self.seq = 0
+        self.committed = 0
+        self.pending = set()
+
+    @staticmethod
+    def lock(file):
+        """
+        Блокировка файла без ожидания; BlockingIOError, если он занят.
+
+        fcntl есть только в POSIX и импортируется здесь: журнал
+        по умолчанию выключен, и без него проект работает в Windows.
+        """
+        import fcntl
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def append(self, comment):
+        self.seq += 1
+        self.write({
+            'seq': self.seq,
+            'news_id': comment.news_id,
+            'author_id': comment.author_id,
+            'text': comment.text,
+        })
+        return self.seq
+
+    def commit(self, seq, empty, pending=()):
+        """
+        Отмечаем записанными комментарии до seq, кроме pending.
+        Журнал без очереди и незаписанных комментариев обрезается.
+        """
+        self.committed = seq
+        self.pending = set(pending)
+        if empty and not self.pending:
+            self.file.truncate(0)
+            if self.fsync:
+                os.fsync(self.file.fileno())
+        else:
+            self.write({'committed': seq, 'pending': sorted(self.pending)})
+
+    def close(self):
+        """
+        Закрываем журнал и удаляем его, если всё записано. Иначе
+        незаписанные комментарии воспроизведёт следующий процесс.
+        """
+        if self.committed == self.seq and not self.pending:
+            self.path.unlink()
+        self.file.close()
+
+    def recover(self):
+        """Незаписанные комментарии из журналов других процессов."""
+        comments = []
+        for path in sorted(self.directory.glob('comments-*.jsonl')):
+            if path == self.path:
+                continue
+            with open(path, encoding='utf-8') as file:
+                try:
+                    self.lock(file)
+                except BlockingIOError:
+                    # Процесс жив и сам запишет свои комментарии.
+                    continue
+                comments += self.read(file)
+            path.unlink()
+        return comments
+
+    @staticmethod
+    def read(file):
+        records = []
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Строка оборвалась при сбое: запрос не получил ответа.
+                continue
+        marker = max(
+            (record for record in records if 'committed' in record),
+            key=lambda record: record['committed'],
+            default={'committed': 0},
+        )
+        committed = marker['committed']
+        pending = set(marker.get('pending', ()))
+        return [
+            Comment(
+                news_id=record['news_id'],
+                author_id=record['author_id'],
+                text=record['text'],
+            )
+            for record in records
+            if 'seq' in record and (
+                record['seq'] > committed or record['seq'] in pending
+            )
+        ]
+
+
+class CommentWriter:
+    """
+    Очередь комментариев и поток, который записывает их пачками.
+
+    Запрос только ставит комментарий в очередь и сразу получает ответ.
+    Поток ждёт, пока наберётся NEWS_COMMENT_QUEUE_BATCH_SIZE
+    комментариев или пройдёт NEWS_COMMENT_QUEUE_FLUSH_INTERVAL секунд,
+    и записывает пачку одной транзакцией: блокировку записи SQLite
+    берёт одна транзакция на пачку, а не каждый запрос.
+    Если пачка не записалась, её комментарии записываются по одному;
+    незаписанные остаются в журнале, и их воспроизводит следующий
+    процесс. Параметры, не переданные явно, берутся из настроек при
+    запуске.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, max_size=None,
+                 journal_dir=None, fsync=None, retries=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.journal_dir = journal_dir
+        self.fsync = fsync
+        self.retries = retries
+        self.journal = None
+        self.failed = set()
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = False
+
+    def configure(self):
+        for name in ('batch_size', 'flush_interval', 'max_size',
+                     'journal_dir', 'fsync', 'retries'):
+            if getattr(self, name) is None:
+                setattr(self, name, getattr(
+                    settings, f'NEWS_COMMENT_QUEUE_{name.upper()}'
+                ))
+
+    def start(self):
+        """Запускаем поток; комментарии из брошенных журналов — в очередь."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.configure()
+            if self.journal_dir:
+                self.journal = CommentJournal(self.journal_dir, self.fsync)
+                for comment in self.journal.recover():
+                    self.queue.put((self.journal.append(comment), comment))
+            self.thread = threading.Thread(
+                target=self.run, name='comment-writer', daemon=True
+            )
+            self.thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, comment):
+        """
+        Ставим комментарий в очередь.
+
+        Возвращает False, если очередь переполнена или остановлена:
+        тогда комментарий нужно сохранить обычным образом.
+        """
+        self.start()
+        with self.lock:
+            if self.stopped or self.queue.qsize() >= self.max_size:
+                return False
+            seq = self.journal.append(comment) if self.journal else 0
+            self.queue.put((seq, comment))
+        return True
+
+    def flush(self):
+        """Ждём, пока будут записаны все принятые комментарии."""
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        """Записываем очередь и останавливаем поток."""
+        with self.lock:
+            if self.thread is None or self.stopped:
+                return
+            self.stopped = True
+            self.queue.put(STOP)
+        self.thread.join(timeout)
+        if self.journal is not None and not self.thread.is_alive():
+            self.journal.close()
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    if not self.write_batch():
+                        return
+                except Exception:
+                    # Ошибка журнала: отметка не записана, поэтому
+                    # комментарии пачки при восстановлении повторятся.
+                    logger.exception('Журнал комментариев не обновлён')
+        finally:
+            connections.close_all()
+
+    def write_batch(self):
+        """Записываем одну пачку; False, когда поток пора остановить."""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not STOP and len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        items = [item for item in batch if item is not STOP]
+        try:
+            if items:
+                self.commit(items[-1][0], self.write(items))
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+        return batch[-1] is not STOP
+
+    def write(self, items):
+        """
+        Пишем пачку; возвращаем номера незаписанных комментариев.
+
+        Ошибки базы повторяются не больше retries раз. Пачка,
+        которую так и не удалось записать, например из-за исключения
+        в обработчике post_save, пишется по одному комментарию.
+        """
+        comments = [comment for _, comment in items]
+        for attempt in range(self.retries + 1):
+            close_old_connections()
+            try:
+                save_comments(comments)
+                return []
+            except IntegrityError:
+                # Новость или автора удалили, пока комментарий ждал.
+                break
+            except DatabaseError:
+                if attempt == self.retries:
+                    logger.exception('Пачка комментариев не записана')
+                    break
+                logger.warning('Не удалось записать комментарии, повтор')
+                time.sleep(self.flush_interval or 0.1)
+            except Exception:
+                logger.exception('Пачка комментариев не записана')
+                break
+        return self.write_one_by_one(items)
+
+    @staticmethod
+    def write_one_by_one(items):
+        failed = []
+        for seq, comment in items:
+            comment.pk = None
+            try:
+                with transaction.atomic(
+                    using=router.db_for_write(Comment)
+                ):
+                    comment.save()
+            except IntegrityError:
+                logger.warning(
+                    'Комментарий к удалённой новости %s не сохранён',
+                    comment.news_id,
+                )
+            except Exception:
+                logger.exception(
+                    'Комментарий %s остаётся в журнале', seq
+                )
+                failed.append(seq)
+        return failed
+
+    def commit(self, seq, failed):
+        """
+        Отмечаем пачку в журнале. Незаписанные комментарии остаются
+        в нём: отметка перечисляет их, а не сдвигается до них.
+        """
+        if self.journal is None:
+            return
+        with self.lock:
+            self.failed.update(failed)
+            self.journal.commit(
+                seq, empty=self.queue.empty(), pending=self.failed
+            )
+
+
+writer = CommentWriter()
@@ -1,7 +1,11 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.forms import ModelForm
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django import forms
 from .models import Comment
+from .matching import BadWordsFilter
+from .moderation import DELETE, REDACT, moderate_comments, select_comments
 
 BAD_WORDS = (
     'редиска',
@@ -10,6 +14,12 @@ BAD_WORDS = (
 )
 WARNING = 'Не ругайтесь!'
 
+bad_words_filter = BadWordsFilter(
+    BAD_WORDS, engine=settings.NEWS_BAD_WORDS_MATCHER
+)
+if settings.NEWS_BAD_WORDS_FILE:
+    bad_words_filter.load_file(settings.NEWS_BAD_WORDS_FILE)
+
 
 class CommentForm(ModelForm):
     text = forms.CharField(
@@ -21,8 +31,46 @@ class CommentForm(ModelForm):
 
     def clean_text(self):
         text = self.cleaned_data['text']
-        lowered_text = text.lower()
-        for word in BAD_WORDS:
-            if word in lowered_text:
-                raise ValidationError(WARNING)
+        if bad_words_filter.find(text):
+            raise ValidationError(WARNING)
         return text
+
+
+class CommentModerationForm(forms.Form):
+    """Условия массовой модерации комментариев."""
+
+    news_id = forms.IntegerField(label='Id новости', required=False)
+    author = forms.CharField(label='Логин автора', required=False)
+    date_from = forms.DateField(label='Начиная с даты', required=False)
+    date_to = forms.DateField(label='По дату', required=False)
+    bad_words = forms.BooleanField(
+        label='Только с запрещёнными словами', required=False
+    )
+    action = forms.ChoiceField(label='Действие', choices=(
+        (REDACT, 'Скрыть текст'),
+        (DELETE, 'Удалить'),
+    ))
+
+    def clean_author(self):
+        username = self.cleaned_data['author']
+        if not username:
+            return None
+        try:
+            return get_user_model().objects.get(username=username)
+        except ObjectDoesNotExist:
+            raise ValidationError('Пользователь не найден.')
+
+    def moderate(self):
+        """Применяем действие ко всем подходящим комментариям."""
+        data = self.cleaned_data
+        comments = select_comments(
+            news_id=data['news_id'],
+            author=data['author'],
+            date_from=data['date_from'],
+            date_to=data['date_to'],
+        )
+        return moderate_comments(
+            comments,
+            data['action'],
+            bad_words_filter if data['bad_words'] else None,
+        )
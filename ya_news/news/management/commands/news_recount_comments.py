@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news.cache import invalidate_feed
+from news.models import News
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики комментариев новостей '
+        'и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько новостей проверять за один раз.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        news = News.objects.order_by('pk').annotate_comment_stats().only(
+            'comment_count', 'last_comment_at'
+        )
+        checked = fixed = 0
+        last_pk = 0
+        while True:
+            # Внутри транзакции маршрутизатор читает из основной базы:
+            # значения с отстающей реплики записались бы как исправление.
+            with transaction.atomic():
+                chunk = list(news.filter(pk__gt=last_pk)[:chunk_size])
+                if not chunk:
+                    break
+                drifted = [item for item in chunk if self.repair(item)]
+                News.objects.bulk_update(
+                    drifted, ('comment_count', 'last_comment_at')
+                )
+            last_pk = chunk[-1].pk
+            checked += len(chunk)
+            fixed += len(drifted)
+        if fixed:
+            invalidate_feed()
+        if options['verbosity']:
+            self.stderr.write(
+                f'Проверено новостей: {checked}, исправлено: {fixed}'
+            )
+
+    @staticmethod
+    def repair(news):
+        """Подставляем настоящие значения; True, если они расходились."""
+        if (news.comment_count, news.last_comment_at) == (
+                news.actual_comment_count, news.actual_last_comment_at):
+            return False
+        news.comment_count = news.actual_comment_count
+        news.last_comment_at = news.actual_last_comment_at
+        return True
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from news.trending import update_trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг обсуждаемых новостей по комментариям, '
+        'добавленным после прошлого запуска. Запускайте по расписанию.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Рассчитать рейтинг заново по всем комментариям.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько комментариев читать из базы за один раз.'
+        )
+
+    def handle(self, *args, **options):
+        counted = update_trending(
+            rebuild=options['rebuild'], chunk_size=options['chunk_size']
+        )
+        if options['verbosity']:
+            self.stderr.write(f'Учтено новых комментариев: {counted}')
@@ -0,0 +1,122 @@
+from collections import deque
+
+# Латинские буквы, похожие на кириллические. И словарь, и текст
+# комментария приводятся к кириллическому написанию, поэтому
+# «peдиcкa», набранная вперемешку, всё равно будет найдена.
+HOMOGLYPHS = str.maketrans({
+    'a': 'а',
+    'b': 'в',
+    'c': 'с',
+    'e': 'е',
+    'h': 'н',
+    'k': 'к',
+    'm': 'м',
+    'o': 'о',
+    'p': 'р',
+    't': 'т',
+    'x': 'х',
+    'y': 'у',
+    'ё': 'е',
+})
+
+
+def normalize(text):
+    """Приводим текст к нижнему регистру и кириллическому написанию."""
+    return text.casefold().translate(HOMOGLYPHS)
+
+
+class AhoCorasickMatcher:
+    """
+    Поиск словаря запрещённых слов автоматом Ахо — Корасик.
+
+    Автомат строится один раз, после чего текст просматривается
+    за один проход независимо от размера словаря.
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+        for word in words:
+            self._add(word)
+        self._link()
+
+    def _add(self, word):
+        node = 0
+        for char in word:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            node = next_node
+        self._output[node] = word
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[child] = fail if fail != child else 0
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+    def search(self, text):
+        """Первое найденное в тексте слово словаря или None."""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node] is not None:
+                return output[node]
+        return None
+
+
+MATCHERS = {
+    'aho_corasick': AhoCorasickMatcher,
+}
+
+
+def read_words(path):
+    """
+    Читаем словарь из файла: одно слово в строке.
+
+    Пустые строки и строки, начинающиеся с #, пропускаются.
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                yield word
+
+
+class BadWordsFilter:
+    """Фильтр запрещённых слов с перестраиваемым словарём."""
+
+    def __init__(self, words=(), engine='aho_corasick'):
+        self.matcher_class = MATCHERS[engine]
+        self.load(words)
+
+    def load(self, words):
+        """Заменяем словарь и заново строим автомат поиска."""
+        self.words = tuple(dict.fromkeys(
+            normalize(word) for word in words if word.strip()
+        ))
+        self._matcher = self.matcher_class(self.words)
+
+    def load_file(self, path):
+        """Добавляем к словарю слова из файла."""
+        self.load((*self.words, *read_words(path)))
+
+    def find(self, text):
+        """Первое запрещённое слово в тексте или None."""
+        return self._matcher.search(normalize(text))
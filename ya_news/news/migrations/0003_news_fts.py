@@ -0,0 +1,100 @@
+from django.db import migrations
+
+NEWS_FTS = 'news_news_fts'
+COMMENT_FTS = 'news_comment_fts'
+
+CREATE_SQL = (
+    f"""
+    CREATE VIRTUAL TABLE {NEWS_FTS} USING fts5(
+        title, text,
+        content='news_news', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    INSERT INTO {NEWS_FTS}({NEWS_FTS}, rank)
+    VALUES ('rank', 'bm25(10.0, 1.0)')
+    """,
+    f"""
+    CREATE TRIGGER news_news_fts_insert AFTER INSERT ON news_news BEGIN
+        INSERT INTO {NEWS_FTS}(rowid, title, text)
+        VALUES (new.id, new.title, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER news_news_fts_delete AFTER DELETE ON news_news BEGIN
+        INSERT INTO {NEWS_FTS}({NEWS_FTS}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER news_news_fts_update AFTER UPDATE OF title, text
+    ON news_news BEGIN
+        INSERT INTO {NEWS_FTS}({NEWS_FTS}, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO {NEWS_FTS}(rowid, title, text)
+        VALUES (new.id, new.title, new.text);
+    END
+    """,
+    f"INSERT INTO {NEWS_FTS}({NEWS_FTS}) VALUES ('rebuild')",
+    f"""
+    CREATE VIRTUAL TABLE {COMMENT_FTS} USING fts5(
+        text,
+        content='news_comment', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER news_comment_fts_insert AFTER INSERT ON news_comment BEGIN
+        INSERT INTO {COMMENT_FTS}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER news_comment_fts_delete AFTER DELETE ON news_comment BEGIN
+        INSERT INTO {COMMENT_FTS}({COMMENT_FTS}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER news_comment_fts_update AFTER UPDATE OF text
+    ON news_comment BEGIN
+        INSERT INTO {COMMENT_FTS}({COMMENT_FTS}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {COMMENT_FTS}(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    f"INSERT INTO {COMMENT_FTS}({COMMENT_FTS}) VALUES ('rebuild')",
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS news_news_fts_insert',
+    'DROP TRIGGER IF EXISTS news_news_fts_delete',
+    'DROP TRIGGER IF EXISTS news_news_fts_update',
+    'DROP TRIGGER IF EXISTS news_comment_fts_insert',
+    'DROP TRIGGER IF EXISTS news_comment_fts_delete',
+    'DROP TRIGGER IF EXISTS news_comment_fts_update',
+    f'DROP TABLE IF EXISTS {NEWS_FTS}',
+    f'DROP TABLE IF EXISTS {COMMENT_FTS}',
+)
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0002_comment_news_created_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:20
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# SQLite пересоздаёт таблицу при добавлении поля и теряет триггеры
+# полнотекстового индекса, поэтому индекс создаётся заново.
+fts = import_module('news.migrations.0003_news_fts')
+
+
+def count_comments(apps, schema_editor):
+    News = apps.get_model('news', 'News')
+    Comment = apps.get_model('news', 'Comment')
+    comments = Comment.objects.filter(news=OuterRef('pk')).order_by()
+    News.objects.update(
+        comment_count=Coalesce(Subquery(
+            comments.values('news').annotate(count=Count('pk'))
+            .values('count')
+        ), 0),
+        last_comment_at=Subquery(
+            comments.order_by('-created').values('created')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_news_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fts.run_on_sqlite(fts.DROP_SQL), fts.run_on_sqlite(fts.CREATE_SQL)
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='last_comment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последний комментарий'),
+        ),
+        migrations.RunPython(count_comments, migrations.RunPython.noop),
+        migrations.RunPython(
+            fts.run_on_sqlite(fts.CREATE_SQL), fts.run_on_sqlite(fts.DROP_SQL)
+        ),
+    ]
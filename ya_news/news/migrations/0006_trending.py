@@ -0,0 +1,37 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_news_comment_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('news', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='news.news')),
+                ('score', models.FloatField(verbose_name='Обсуждаемость')),
+            ],
+            options={
+                'verbose_name': 'Обсуждаемость новости',
+                'verbose_name_plural': 'Обсуждаемость новостей',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_comment_id', models.PositiveBigIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score', 'news'], name='trending_score_idx'),
+        ),
+    ]
@@ -1,21 +1,114 @@
 import datetime
 from django.conf import settings
 from django.db import models
+from django.db.models import (
+    Count, DateTimeField, F, OuterRef, Subquery, Value
+)
+from django.db.models.functions import Coalesce, Greatest
+
+
+class NewsQuerySet(models.QuerySet):
+    """Обновление счётчиков комментариев одним запросом UPDATE."""
+
+    def comment_added(self, created):
+        """Новый комментарий: +1 к счётчику и время последней активности."""
+        created = Value(created, output_field=DateTimeField())
+        return self.update(
+            comment_count=F('comment_count') + 1,
+            last_comment_at=Greatest(
+                Coalesce('last_comment_at', created), created
+            ),
+        )
+
+    def comment_removed(self):
+        """
+        Комментарий удалён: -1 к счётчику, время последнего
+        комментария перечитывается по индексу (news, created, id).
+        """
+        return self.update(
+            comment_count=Greatest(F('comment_count') - 1, Value(0)),
+            last_comment_at=self.latest_comment_created(),
+        )
+
+    def recount_comments(self):
+        """Пересчитываем счётчики по самим комментариям."""
+        return self.update(
+            comment_count=self.actual_comment_count(),
+            last_comment_at=self.latest_comment_created(),
+        )
+
+    def annotate_comment_stats(self):
+        """Настоящие значения счётчиков для сравнения с сохранёнными."""
+        return self.annotate(
+            actual_comment_count=self.actual_comment_count(),
+            actual_last_comment_at=self.latest_comment_created(),
+        )
+
+    @staticmethod
+    def actual_comment_count():
+        comments = Comment.objects.filter(news=OuterRef('pk')).order_by()
+        return Coalesce(Subquery(
+            comments.values('news').annotate(count=Count('pk'))
+            .values('count')
+        ), 0)
+
+    @staticmethod
+    def latest_comment_created():
+        return Subquery(
+            Comment.objects.filter(news=OuterRef('pk'))
+            .order_by('-created').values('created')[:1]
+        )
 
 
 class News(models.Model):
     title = models.CharField(max_length=50)
     text = models.TextField()
     date = models.DateField(default=datetime.date.today)
+    comment_count = models.PositiveIntegerField(
+        'Комментариев', default=0, editable=False
+    )
+    last_comment_at = models.DateTimeField(
+        'Последний комментарий', null=True, blank=True, editable=False
+    )
+
+    objects = NewsQuerySet.as_manager()
 
     class Meta:
         ordering = ('-date',)
+        indexes = (
+            models.Index(fields=('date', 'id'), name='news_date_id_idx'),
+        )
         verbose_name_plural = 'Новости'
         verbose_name = 'Новость'
 
     def __str__(self):
         return self.title
 
+    def get_neighbours(self):
+        """
+        Предыдущая и следующая по дате новости или None.
+
+        Сначала сосед ищется среди новостей того же дня, затем среди
+        более ранних или поздних дней. Оба запроса идут по диапазону
+        индекса (date, id) и не сортируют таблицу, в отличие от
+        get_previous_by_date(), условие которого с OR SQLite
+        выполняет через временную сортировку.
+        """
+        news = type(self).objects.only('id', 'title', 'date')
+        previous = (
+            news.filter(date=self.date, pk__lt=self.pk).order_by('-pk')
+            .first()
+            or news.filter(date__lt=self.date).order_by('-date', '-pk')
+            .first()
+        )
+        following = (
+            news.filter(date=self.date, pk__gt=self.pk).order_by('pk')
+            .first()
+            or news.filter(date__gt=self.date).order_by('date', 'pk')
+            .first()
+        )
+        return previous, following
+
 
 class Comment(models.Model):
     news = models.ForeignKey(News, on_delete=models.CASCADE,
@@ -27,6 +120,43 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ('created',)
+        indexes = (
+            models.Index(
+                fields=('news', 'created', 'id'),
+                name='comment_news_created_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:50]
+
+
+class TrendingScore(models.Model):
+    """
+    Обсуждаемость новости: комментарии с затуханием по времени.
+
+    Каждый комментарий весит 1 в момент написания, и вес
+    уменьшается вдвое за NEWS_TRENDING_HALF_LIFE секунд.
+    Таблицу пополняет команда news_trending, значения
+    приведены ко времени TrendingState.computed_at.
+    """
+    news = models.OneToOneField(
+        News, on_delete=models.CASCADE, primary_key=True,
+        related_name='trending'
+    )
+    score = models.FloatField('Обсуждаемость')
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('-score', 'news'), name='trending_score_idx'
+            ),
+        )
+        verbose_name_plural = 'Обсуждаемость новостей'
+        verbose_name = 'Обсуждаемость новости'
+
+
+class TrendingState(models.Model):
+    """Последний учтённый в рейтинге комментарий и время пересчёта."""
+    last_comment_id = models.PositiveBigIntegerField(default=0)
+    computed_at = models.DateTimeField(null=True)
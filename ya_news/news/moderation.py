@@ -0,0 +1,98 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils.timezone import make_aware
+
+from .cache import invalidate_comments, invalidate_feed, invalidate_pages
+from .models import Comment, News
+
+REDACT = 'redact'
+DELETE = 'delete'
+REDACTED_TEXT = 'Комментарий скрыт модератором.'
+MODERATION_BATCH_SIZE = 500
+
+
+def select_comments(news_id=None, author=None, date_from=None, date_to=None):
+    """
+    Комментарии, подходящие под условия модерации.
+
+    Границы дат включаются в выборку и переводятся в моменты времени,
+    чтобы фильтр по created мог использовать индекс.
+    """
+    comments = Comment.objects.all()
+    if news_id is not None:
+        comments = comments.filter(news_id=news_id)
+    if author is not None:
+        comments = comments.filter(author=author)
+    if date_from is not None:
+        comments = comments.filter(
+            created__gte=make_aware(datetime.combine(date_from, time.min))
+        )
+    if date_to is not None:
+        comments = comments.filter(created__lt=make_aware(
+            datetime.combine(date_to + timedelta(days=1), time.min)
+        ))
+    return comments
+
+
+def iter_bad_comment_ids(comments, words_filter):
+    """Id комментариев, в тексте которых есть запрещённые слова."""
+    for pk, text in comments.values_list('pk', 'text').iterator(
+            chunk_size=MODERATION_BATCH_SIZE
+    ):
+        if words_filter.find(text):
+            yield pk
+
+
+def _apply(comments, action):
+    """Изменяем комментарии; возвращаем их число и id их новостей."""
+    news_ids = set(
+        comments.order_by().values_list('news_id', flat=True).distinct()
+    )
+    if action == REDACT:
+        return comments.update(text=REDACTED_TEXT), news_ids
+    # Обычный delete() загружает все удаляемые объекты ради сигналов,
+    # поэтому удаляем одним запросом, а то, что сделали бы сигналы,
+    # делаем сами: пересчитываем счётчики затронутых новостей здесь,
+    # а версии кэша меняем после транзакции.
+    deleted = comments._raw_delete(comments.db)
+    News.objects.filter(pk__in=news_ids).recount_comments()
+    return deleted, news_ids
+
+
+def moderate_comments(comments, action, words_filter=None):
+    """
+    Удаляем или скрываем комментарии пачками в одной транзакции.
+
+    Без фильтра по словам изменения выполняются одним запросом
+    UPDATE/DELETE. С фильтром тексты читаются потоком, и только после
+    чтения изменения отправляются пачками по MODERATION_BATCH_SIZE id:
+    SQLite не гарантирует корректную выборку из таблицы, которая
+    меняется, пока открыт курсор.
+    Возвращает число затронутых комментариев.
+    """
+    affected = 0
+    news_ids = set()
+    with transaction.atomic():
+        if words_filter is None:
+            affected, news_ids = _apply(comments, action)
+        else:
+            ids = list(iter_bad_comment_ids(comments, words_filter))
+            for start in range(0, len(ids), MODERATION_BATCH_SIZE):
+                batch = ids[start:start + MODERATION_BATCH_SIZE]
+                batch_affected, batch_news_ids = _apply(
+                    Comment.objects.filter(pk__in=batch), action
+                )
+                affected += batch_affected
+                news_ids |= batch_news_ids
+    if affected:
+        # UPDATE и DELETE одним запросом не отправляют сигналов,
+        # поэтому версии сбрасываются так же, как в news.signals.
+        # Потоку комментариев сообщать нечего: он передаёт только
+        # новые комментарии, а курсор удалённого комментария остаётся
+        # корректным, потому что сравнивается по (created, id).
+        invalidate_feed()
+        invalidate_pages()
+        for news_id in news_ids:
+            invalidate_comments(news_id)
+    return affected
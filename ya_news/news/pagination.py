@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Comment
+
+CURSOR_SEPARATOR = '_'
+
+
+def encode_cursor(comment):
+    """Курсор указывает на последний показанный комментарий."""
+    return f'{comment.created.isoformat()}{CURSOR_SEPARATOR}{comment.pk}'
+
+
+def decode_cursor(cursor):
+    """
+    Разбираем курсор на дату создания и id комментария.
+
+    Дата без часового пояса при USE_TZ не сравнима с датами
+    комментариев, поэтому такой курсор тоже некорректен.
+    """
+    try:
+        created, pk = cursor.rsplit(CURSOR_SEPARATOR, 1)
+        created, pk = datetime.fromisoformat(created), int(pk)
+    except ValueError:
+        raise BadRequest('Некорректный курсор комментариев.')
+    if timezone.is_naive(created) == settings.USE_TZ:
+        raise BadRequest('Некорректный курсор комментариев.')
+    return created, pk
+
+
+def get_comments_page(news_id, cursor=None, page_size=None):
+    """
+    Очередная порция комментариев к новости.
+
+    Комментарии выбираются по ключу (created, id) после курсора,
+    поэтому стоимость запроса зависит от размера страницы,
+    а не от числа комментариев в обсуждении.
+    Возвращает список комментариев и курсор следующей страницы
+    или None, если комментариев больше нет.
+    """
+    if page_size is None:
+        page_size = settings.COMMENTS_COUNT_ON_DETAIL_PAGE
+    comments = Comment.objects.filter(news_id=news_id)
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk)
+        )
+    comments = list(
+        comments.select_related('author').order_by(
+            'created', 'pk'
+        )[:page_size + 1]
+    )
+    if len(comments) <= page_size:
+        return comments, None
+    comments = comments[:page_size]
+    return comments, encode_cursor(comments[-1])
+
+
+def get_stream_cursor(news_id, comments, next_cursor):
+    """
+    Курсор последнего комментария к новости.
+
+    С него поток новых комментариев продолжает обсуждение,
+    показанное на странице. Если на странице всё обсуждение,
+    курсор берётся из последнего комментария без запроса к базе.
+    Пустая строка означает, что комментариев ещё нет.
+    """
+    if next_cursor is None:
+        return encode_cursor(comments[-1]) if comments else ''
+    latest = Comment.objects.filter(news_id=news_id).order_by(
+        '-created', '-pk'
+    ).only('created').first()
+    return encode_cursor(latest) if latest else ''
@@ -1,12 +1,29 @@
+import asyncio
+import json
 import pytest
 import datetime
 from http import HTTPStatus
+from asgiref.sync import async_to_sync, sync_to_async
 from django.contrib.auth import get_user_model
-from django.test import Client
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import QuerySet
+from django.http import Http404
+from django.test import Client, RequestFactory
 from django.urls import reverse
+from django.utils import timezone
 
+from news import views
+from news.cache import invalidate_feed
 from news.models import Comment
 from news.models import News
+from news.pagination import encode_cursor
+from news.moderation import DELETE, moderate_comments
+from news.search import search_news, search_news_fallback
+from news.stream import (
+    OVERFLOW, CommentStreamApp, Subscription, broker, stream_served
+)
+from news.trending import update_trending
+from pytest_budgets import BudgetExceeded
 
 User = get_user_model()
 
@@ -122,3 +139,891 @@ def test_comment_form_accessible_to_authenticated_user():
     response = user.get(reverse('news:detail', kwargs={'pk': news.pk}))
     assert response.status_code == HTTPStatus.OK
     assert 'form' in response.context
+
+
+@pytest.mark.django_db
+def test_home_page_shows_comment_count(create_news):
+    """
+    Тест проверяет, что на главной странице выводится
+      количество комментариев к новости.
+    """
+    news1, news2, news3 = create_news
+    for i in range(3):
+        Comment.objects.create(news=news1, text=f'Comment {i}')
+    client = Client()
+    response = client.get(reverse('news:home'))
+    assert response.status_code == HTTPStatus.OK
+    feed = {news.pk: news for news in response.context['news_feed']}
+    assert feed[news1.pk].comment_count == 3
+    assert feed[news2.pk].comment_count == 0
+    assert 'Комментариев: 3' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_home_page_query_count_does_not_depend_on_comments(
+        create_news, django_assert_num_queries):
+    """
+    Тест проверяет, что главная страница выполняет фиксированное
+      число запросов независимо от количества комментариев.
+    """
+    client = Client()
+    with django_assert_num_queries(1):
+        client.get(reverse('news:home'))
+    for news in create_news:
+        Comment.objects.bulk_create(
+            Comment(news=news, text=f'Comment {i}') for i in range(50)
+        )
+    # bulk_create не отправляет сигналов: без сброса кэша лента
+    # отдалась бы из него, и проверка прошла бы без запросов к базе.
+    invalidate_feed()
+    with django_assert_num_queries(1):
+        client.get(reverse('news:home'))
+
+
+@pytest.fixture(params=['locmem', 'filebased'])
+def feed_cache(request, settings, tmp_path):
+    """
+    Фикстура подключает кэш ленты к разным бэкендам.
+
+    Лента должна одинаково работать с кэшем в памяти процесса
+    и с кэшем в файлах, общим для нескольких процессов.
+    """
+    backends = {
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': str(tmp_path),
+        },
+        'filebased': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        },
+    }
+    settings.CACHES = {'default': backends[request.param]}
+
+
+@pytest.mark.django_db
+def test_home_page_feed_is_served_from_cache(
+        feed_cache, create_news, django_assert_num_queries):
+    """
+    Тест проверяет, что повторный запрос главной страницы
+      не обращается к базе данных.
+    """
+    client = Client()
+    first = client.get(reverse('news:home'))
+    with django_assert_num_queries(0):
+        second = client.get(reverse('news:home'))
+    assert second.content == first.content
+
+
+@pytest.mark.django_db
+def test_new_comment_invalidates_feed_cache(feed_cache, create_news):
+    """
+    Тест проверяет, что новый комментарий сбрасывает кэш ленты.
+    """
+    news1, news2, news3 = create_news
+    client = Client()
+    response = client.get(reverse('news:home'))
+    assert 'Комментариев' not in response.content.decode()
+    comment = Comment.objects.create(news=news1, text='Comment')
+    response = client.get(reverse('news:home'))
+    assert 'Комментариев: 1' in response.content.decode()
+    comment.delete()
+    response = client.get(reverse('news:home'))
+    assert 'Комментариев' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_news_changes_invalidate_feed_cache(feed_cache, create_news):
+    """
+    Тест проверяет, что изменение и удаление новости
+      сбрасывают кэш ленты.
+    """
+    news1, news2, news3 = create_news
+    client = Client()
+    client.get(reverse('news:home'))
+    news1.title = 'Обновлённый заголовок'
+    news1.save()
+    response = client.get(reverse('news:home'))
+    assert 'Обновлённый заголовок' in response.content.decode()
+    news1.delete()
+    response = client.get(reverse('news:home'))
+    assert 'Обновлённый заголовок' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_feed_cache_keeps_header_for_each_user(feed_cache, create_news):
+    """
+    Тест проверяет, что кэш ленты не подменяет шапку страницы
+      у анонимного и авторизованного пользователей.
+    """
+    User.objects.create_user(username='testuser', password='testpassword')
+    anonymous = Client()
+    anonymous.get(reverse('news:home'))
+    author = Client()
+    author.login(username='testuser', password='testpassword')
+    response = author.get(reverse('news:home'))
+    assert 'Пользователь: testuser' in response.content.decode()
+    response = anonymous.get(reverse('news:home'))
+    assert 'Пользователь: testuser' not in response.content.decode()
+    assert 'Войти' in response.content.decode()
+
+
+@pytest.fixture
+def news_with_comments(settings):
+    """
+    Фикстура создаёт новость с семью комментариями
+      и уменьшает размер страницы комментариев до трёх.
+
+    У всех комментариев одинаковое время создания,
+    порядок определяется только их id.
+    """
+    settings.COMMENTS_COUNT_ON_DETAIL_PAGE = 3
+    news = News.objects.create(title='Test News', text='This is a test news')
+    Comment.objects.bulk_create(
+        Comment(news=news, text=f'Comment {i}') for i in range(7)
+    )
+    comments = Comment.objects.filter(news=news)
+    comments.update(created=timezone.now())
+    return news, list(comments.order_by('pk').values_list('pk', flat=True))
+
+
+@pytest.mark.django_db
+def test_news_detail_page_shows_first_page_of_comments(news_with_comments):
+    """
+    Тест проверяет, что на странице новости выводится только первая
+      порция комментариев и ссылка на следующую, которую загружает
+      скрипт страницы.
+    """
+    news, comment_ids = news_with_comments
+    client = Client()
+    response = client.get(reverse('news:detail', kwargs={'pk': news.pk}))
+    assert response.status_code == HTTPStatus.OK
+    comments = response.context['comments']
+    assert [comment.pk for comment in comments] == comment_ids[:3]
+    assert response.context['next_cursor']
+    content = response.content.decode()
+    assert reverse('news:comments', kwargs={'pk': news.pk}) in content
+    assert 'class="load-more-comments"' in content
+    assert "closest('.load-more-comments')" in content
+
+
+@pytest.mark.django_db
+def test_load_more_comments_walks_whole_thread(news_with_comments):
+    """
+    Тест проверяет, что по курсорам можно получить все комментарии
+      без пропусков и повторов.
+    """
+    news, comment_ids = news_with_comments
+    client = Client()
+    response = client.get(reverse('news:detail', kwargs={'pk': news.pk}))
+    seen = [comment.pk for comment in response.context['comments']]
+    cursor = response.context['next_cursor']
+    while cursor:
+        response = client.get(
+            reverse('news:comments', kwargs={'pk': news.pk}),
+            {'after': cursor}
+        )
+        assert response.status_code == HTTPStatus.OK
+        seen += [comment.pk for comment in response.context['comments']]
+        cursor = response.context['next_cursor']
+    assert seen == comment_ids
+    assert 'Показать ещё' not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_load_more_comments_query_count_does_not_depend_on_thread_size(
+        news_with_comments, django_assert_num_queries):
+    """
+    Тест проверяет, что порция комментариев загружается
+      одним запросом независимо от размера обсуждения.
+    """
+    news, comment_ids = news_with_comments
+    Comment.objects.bulk_create(
+        Comment(news=news, text=f'Comment {i}') for i in range(100)
+    )
+    client = Client()
+    with django_assert_num_queries(1):
+        client.get(reverse('news:comments', kwargs={'pk': news.pk}))
+
+
+@pytest.mark.django_db
+def test_load_more_comments_rejects_bad_cursor(news_with_comments):
+    """
+    Тест проверяет, что некорректный курсор приводит к ошибке 400.
+    """
+    news, comment_ids = news_with_comments
+    client = Client()
+    response = client.get(
+        reverse('news:comments', kwargs={'pk': news.pk}),
+        {'after': 'not-a-cursor'}
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_load_more_comments_for_missing_news():
+    """
+    Тест проверяет, что для несуществующей новости
+      возвращается ошибка 404.
+    """
+    client = Client()
+    response = client.get(reverse('news:comments', kwargs={'pk': 404}))
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.fixture
+def search_archive():
+    """
+    Фикстура создаёт новости, которые отличаются
+      местом совпадения со словом «выборы».
+    """
+    in_title = News.objects.create(title='Выборы мэра',
+                                   text='Итоги голосования')
+    in_text = News.objects.create(title='Городские новости',
+                                  text='Скоро выборы в совет')
+    in_comment = News.objects.create(title='Погода', text='Будет дождь')
+    Comment.objects.create(news=in_comment, text='Зато на выборы не пойду')
+    News.objects.create(title='Спорт', text='Матч перенесли')
+    return in_title, in_text, in_comment
+
+
+def search(client, query, **params):
+    response = client.get(reverse('news:search'), {'q': query, **params})
+    assert response.status_code == HTTPStatus.OK
+    return response
+
+
+@pytest.mark.django_db
+def test_search_ranks_title_matches_first(search_archive):
+    """
+    Тест проверяет, что совпадение в заголовке важнее
+      совпадения в тексте, а комментарии по умолчанию не учитываются.
+    """
+    in_title, in_text, in_comment = search_archive
+    response = search(Client(), 'выборы')
+    assert list(response.context['results']) == [in_title, in_text]
+
+
+@pytest.mark.django_db
+def test_search_in_comments(search_archive):
+    """
+    Тест проверяет поиск по тексту комментариев.
+    """
+    in_title, in_text, in_comment = search_archive
+    response = search(Client(), 'выборы', comments='on')
+    assert list(response.context['results']) == [
+        in_title, in_text, in_comment
+    ]
+
+
+@pytest.mark.django_db
+def test_search_highlights_snippet(search_archive):
+    """
+    Тест проверяет подсветку найденных слов и экранирование текста.
+    """
+    News.objects.create(title='Социология', text='<b>Итоги</b> & опросы')
+    response = search(Client(), 'опросы')
+    content = response.content.decode()
+    assert '<mark>опросы</mark>' in content
+    assert '&lt;b&gt;Итоги&lt;/b&gt; &amp;' in content
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes(search_archive):
+    """
+    Тест проверяет, что изменения новостей и комментариев,
+      в том числе массовые, сразу видны в поиске.
+    """
+    in_title, in_text, in_comment = search_archive
+    client = Client()
+    in_text.text = 'Скоро собрание'
+    in_text.save()
+    Comment.objects.filter(news=in_comment).update(text='Без политики')
+    response = search(client, 'выборы', comments='on')
+    assert list(response.context['results']) == [in_title]
+    in_title.delete()
+    response = search(client, 'выборы', comments='on')
+    assert list(response.context['results']) == []
+
+
+@pytest.mark.django_db
+def test_search_query_count_is_fixed(
+        search_archive, django_assert_num_queries):
+    """
+    Тест проверяет, что поиск выполняет фиксированное число запросов.
+    """
+    with django_assert_num_queries(3):
+        search_news('выборы', 10, with_comments=True)
+
+
+@pytest.mark.django_db
+def test_search_skips_news_missing_from_database(search_archive, monkeypatch):
+    """
+    Тест проверяет, что новость, найденная в индексе, но не
+      прочитанная из базы, пропускается, а не роняет поиск.
+    """
+    in_title, in_text, in_comment = search_archive
+    in_bulk = QuerySet.in_bulk
+
+    def lagging_in_bulk(queryset, id_list):
+        found = in_bulk(queryset, id_list)
+        found.pop(in_text.pk, None)
+        return found
+
+    monkeypatch.setattr(QuerySet, 'in_bulk', lagging_in_bulk)
+    assert search_news('выборы', 10) == [in_title]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query', ['"', 'выборы OR', '*', 'NEAR(', ''])
+def test_search_ignores_query_syntax(query, search_archive):
+    """
+    Тест проверяет, что спецсимволы в запросе не приводят к ошибке.
+    """
+    search(Client(), query, comments='on')
+
+
+@pytest.mark.django_db
+def test_search_fallback_without_fts(search_archive):
+    """
+    Тест проверяет поиск для баз данных без FTS5.
+    """
+    in_title, in_text, in_comment = search_archive
+    results = search_news_fallback('ыборы', 10, with_comments=True)
+    assert set(results) == {in_title, in_text, in_comment}
+
+
+@pytest.fixture
+def archive(settings):
+    """
+    Фикстура создаёт по три новости за два дня мая 2023 года
+      и одну новость за июнь, размер страницы архива — две новости.
+    """
+    settings.NEWS_COUNT_ON_ARCHIVE_PAGE = 2
+    news = [
+        News.objects.create(title=f'News {day}.{i}', text='Text',
+                            date=datetime.date(2023, 5, day))
+        for day in (1, 2) for i in range(3)
+    ]
+    news.append(News.objects.create(title='June', text='Text',
+                                    date=datetime.date(2023, 6, 1)))
+    return news
+
+
+@pytest.mark.django_db
+def test_archive_month_is_paginated(archive):
+    """
+    Тест проверяет, что архив за месяц выводится постранично,
+      от новых новостей к старым.
+    """
+    client = Client()
+    url = reverse('news:archive_month', args=(2023, 5))
+    seen = []
+    for page in (1, 2, 3):
+        response = client.get(url, {'page': page})
+        assert response.status_code == HTTPStatus.OK
+        seen += list(response.context['object_list'])
+    assert seen == sorted(archive[:6], key=lambda news: (news.date, news.pk),
+                          reverse=True)
+
+
+@pytest.mark.django_db
+def test_archive_year_lists_months(archive):
+    """
+    Тест проверяет, что архив за год показывает месяцы с новостями.
+    """
+    client = Client()
+    response = client.get(reverse('news:archive_year', args=(2023,)))
+    months = [date.month for date in response.context['date_list']]
+    assert months == [5, 6]
+
+
+@pytest.mark.django_db
+def test_archive_day_shows_only_that_day(archive):
+    """
+    Тест проверяет, что архив за день содержит только новости этого дня.
+    """
+    client = Client()
+    response = client.get(reverse('news:archive_day', args=(2023, 5, 2)))
+    assert {news.date for news in response.context['object_list']} == {
+        datetime.date(2023, 5, 2)
+    }
+
+
+@pytest.mark.django_db
+def test_news_detail_links_to_neighbours(archive):
+    """
+    Тест проверяет ссылки на предыдущую и следующую новости,
+      в том числе среди новостей одного дня.
+    """
+    client = Client()
+    first, second = archive[0], archive[1]
+    response = client.get(reverse('news:detail', kwargs={'pk': first.pk}))
+    assert response.context['previous_news'] is None
+    assert response.context['next_news'] == second
+    response = client.get(reverse('news:detail', kwargs={'pk': second.pk}))
+    assert response.context['previous_news'] == first
+    last = archive[-1]
+    response = client.get(reverse('news:detail', kwargs={'pk': last.pk}))
+    assert response.context['next_news'] is None
+
+
+@pytest.fixture
+def call_async_view(rf):
+    """
+    Фикстура вызывает асинхронное представление так,
+      как это делает обработчик ASGI.
+    """
+    def _call_async_view(view_class, url, user=None, **kwargs):
+        view = view_class.as_view()
+        assert asyncio.iscoroutinefunction(view)
+        request = rf.get(url)
+        request.user = user or AnonymousUser()
+        return async_to_sync(view)(request, **kwargs)
+
+    return _call_async_view
+
+
+@pytest.mark.django_db
+def test_async_home_page_matches_sync(
+        create_news, call_async_view, django_assert_num_queries):
+    """
+    Тест проверяет, что асинхронная лента совпадает с синхронной
+      и загружается одним запросом.
+    """
+    url = reverse('news:home')
+    with django_assert_num_queries(1):
+        response = call_async_view(views.AsyncNewsList, url)
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == Client().get(url).content
+
+
+@pytest.mark.django_db
+def test_async_detail_page_matches_sync(
+        news_with_comments, call_async_view):
+    """
+    Тест проверяет, что асинхронная страница новости совпадает
+      с синхронной.
+    """
+    news, comment_ids = news_with_comments
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    response = call_async_view(views.AsyncNewsDetailView, url, pk=news.pk)
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == Client().get(url).content
+
+
+@pytest.mark.django_db
+def test_async_detail_page_shows_form_to_author(
+        news_with_comments, call_async_view):
+    """
+    Тест проверяет, что авторизованный пользователь видит
+      на асинхронной странице новости форму комментария.
+    """
+    news, comment_ids = news_with_comments
+    user = User.objects.create(username='reader')
+    response = call_async_view(
+        views.AsyncNewsDetail,
+        reverse('news:detail', kwargs={'pk': news.pk}),
+        user=user,
+        pk=news.pk,
+    )
+    assert 'Оставить комментарий' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_async_load_more_comments(
+        news_with_comments, call_async_view, django_assert_num_queries):
+    """
+    Тест проверяет, что асинхронная порция комментариев совпадает
+      с синхронной, а для несуществующей новости возвращается 404.
+    """
+    news, comment_ids = news_with_comments
+    url = reverse('news:comments', kwargs={'pk': news.pk})
+    with django_assert_num_queries(1):
+        response = call_async_view(
+            views.AsyncNewsCommentsPage, url, pk=news.pk
+        )
+    assert response.content == Client().get(url).content
+    with pytest.raises(Http404):
+        call_async_view(
+            views.AsyncNewsCommentsPage,
+            reverse('news:comments', kwargs={'pk': 404}),
+            pk=404,
+        )
+
+
+@pytest.mark.django_db
+def test_comment_stream_without_asgi_returns_missed_comments(
+        news_with_comments, client):
+    """
+    Тест проверяет, что без ASGI страница не подключает EventSource,
+      а поток отдаёт порцию комментариев после курсора или курсор
+      последнего комментария и закрывается; Last-Event-ID важнее ?after.
+    """
+    news, comment_ids = news_with_comments
+    url = reverse('news:stream', kwargs={'pk': news.pk})
+    latest = encode_cursor(Comment.objects.get(pk=comment_ids[-1]))
+    detail = client.get(reverse('news:detail', kwargs={'pk': news.pk}))
+    assert not detail.context['live_comments']
+    assert 'EventSource' not in detail.content.decode()
+    cursor = encode_cursor(Comment.objects.get(pk=comment_ids[1]))
+    response = client.get(url, {'after': cursor})
+    assert response['Content-Type'].startswith('text/event-stream')
+    content = response.content.decode()
+    assert content.startswith('retry: ')
+    assert [
+        json.loads(line[len('data: '):])['id']
+        for line in content.splitlines() if line.startswith('data: ')
+    ] == comment_ids[2:5]
+    response = client.get(url, {'after': cursor}, HTTP_LAST_EVENT_ID=latest)
+    assert 'data: ' not in response.content.decode()
+    content = client.get(url).content.decode()
+    assert f'id: {latest}\n\n' in content
+    assert 'data: ' not in content
+    missing = client.get(reverse('news:stream', kwargs={'pk': 404}))
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_stream_app_marks_requests_it_passes_on():
+    """
+    Тест проверяет, что CommentStreamApp отмечает запросы, которые
+      передаёт Django: по отметке страница подключает EventSource.
+    """
+    scopes = []
+
+    async def application(scope, receive, send):
+        scopes.append(scope)
+
+    async_to_sync(CommentStreamApp(application))(
+        {'type': 'http', 'method': 'GET', 'path': '/', 'headers': []},
+        None, None,
+    )
+    request = RequestFactory().get('/')
+    assert not stream_served(request)
+    request.scope = scopes[0]
+    assert stream_served(request)
+
+
+class StreamClient:
+    """Клиент потока SSE, подключённый к приложению ASGI напрямую."""
+
+    def __init__(self):
+        self.status = None
+        self.body = b''
+        self.received = asyncio.Event()
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        else:
+            self.body += message['body']
+            self.received.set()
+
+    async def wait(self):
+        await self.received.wait()
+        self.received.clear()
+
+
+@pytest.mark.django_db
+def test_asgi_comment_stream_sends_one_page_of_missed_comments(
+        news_with_comments):
+    """
+    Тест проверяет, что поток ASGI без курсора начинается с последнего
+      комментария, а с курсором отдаёт одну порцию пропущенного
+      и закрывается, если за ней есть ещё.
+    """
+    news, comment_ids = news_with_comments
+    app = CommentStreamApp(application=None)
+
+    async def stream(headers):
+        client = StreamClient()
+        scope = {
+            'type': 'http', 'method': 'GET', 'query_string': b'',
+            'path': reverse('news:stream', kwargs={'pk': news.pk}),
+            'headers': headers,
+        }
+        task = asyncio.ensure_future(app(scope, client.receive, client.send))
+        await asyncio.wait_for(client.wait(), 10)
+        closed = task.done()
+        client.disconnected.set()
+        await task
+        return client, closed
+
+    def event_ids(client):
+        return [
+            json.loads(line[len('data: '):])['id']
+            for line in client.body.decode().splitlines()
+            if line.startswith('data: ')
+        ]
+
+    client, closed = async_to_sync(stream)([])
+    assert (client.status, event_ids(client), closed) == (
+        HTTPStatus.OK, [], False
+    )
+    latest = encode_cursor(Comment.objects.get(pk=comment_ids[-1]))
+    assert f'id: {latest}\n\n' in client.body.decode()
+    cursor = encode_cursor(Comment.objects.get(pk=comment_ids[0]))
+    client, closed = async_to_sync(stream)(
+        [(b'last-event-id', cursor.encode())]
+    )
+    assert (event_ids(client), closed) == (comment_ids[1:4], True)
+    cursor = encode_cursor(Comment.objects.get(pk=comment_ids[3]))
+    client, closed = async_to_sync(stream)(
+        [(b'last-event-id', cursor.encode())]
+    )
+    assert (event_ids(client), closed) == (comment_ids[4:], False)
+
+
+@pytest.mark.django_db
+def test_comment_stream_rejects_cursor_without_timezone(
+        news_with_comments, client):
+    """
+    Тест проверяет, что курсор с датой без часового пояса
+      отклоняется, а не роняет сравнение с датами комментариев.
+    """
+    news, comment_ids = news_with_comments
+    naive = f'2020-01-01T00:00:00_{comment_ids[0]}'
+    url = reverse('news:stream', kwargs={'pk': news.pk})
+    assert client.get(url, {'after': naive}).status_code == (
+        HTTPStatus.BAD_REQUEST
+    )
+    stream = StreamClient()
+    async_to_sync(CommentStreamApp(application=None))(
+        {
+            'type': 'http', 'method': 'GET', 'path': url,
+            'query_string': b'',
+            'headers': [(b'last-event-id', naive.encode())],
+        },
+        stream.receive, stream.send,
+    )
+    assert stream.status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_stream_pushes_new_comment_to_thousands_of_clients():
+    """
+    Тест проверяет, что новый комментарий после фиксации
+      приходит всем открытым потокам новости.
+    """
+    news = News.objects.create(title='Срочная новость', text='Текст')
+    app = CommentStreamApp(application=None)
+    path = reverse('news:stream', kwargs={'pk': news.pk})
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path,
+        'query_string': b'', 'headers': [],
+    }
+
+    async def scenario():
+        clients = [StreamClient() for _ in range(2000)]
+        streams = [
+            asyncio.ensure_future(app(scope, client.receive, client.send))
+            for client in clients
+        ]
+        await asyncio.wait_for(
+            asyncio.gather(*(client.wait() for client in clients)), 10
+        )
+        await sync_to_async(Comment.objects.create)(
+            news=news, text='Первый комментарий'
+        )
+        await asyncio.wait_for(
+            asyncio.gather(*(client.wait() for client in clients)), 10
+        )
+        for client in clients:
+            client.disconnected.set()
+        await asyncio.gather(*streams)
+        return clients
+
+    clients = async_to_sync(scenario)()
+    assert {client.status for client in clients} == {HTTPStatus.OK}
+    assert all(
+        'Первый комментарий' in client.body.decode() for client in clients
+    )
+    assert not broker.has_subscribers(news.pk)
+
+
+def test_comment_stream_drops_lagging_subscription():
+    """
+    Тест проверяет, что переполненная очередь медленного клиента
+      очищается и закрывает его поток.
+    """
+    async def overflow():
+        subscription = Subscription(asyncio.get_running_loop(), 2)
+        for event in ('first', 'second', 'third'):
+            subscription.put(event)
+        return [subscription.queue.get_nowait()], subscription.queue.empty()
+
+    assert asyncio.run(overflow()) == ([OVERFLOW], True)
+
+
+def assert_not_modified(response):
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response.templates == []
+    assert response.content == b''
+
+
+@pytest.mark.django_db
+def test_home_page_not_modified(
+        client, create_news, django_assert_num_queries):
+    """
+    Тест проверяет, что неизменённая лента не отрисовывается повторно
+      и не читается из базы, а новый комментарий меняет ETag.
+    """
+    url = reverse('news:home')
+    etag = client.get(url)['ETag']
+    with django_assert_num_queries(0):
+        assert_not_modified(client.get(url, HTTP_IF_NONE_MATCH=etag))
+    Comment.objects.create(news=create_news[0], text='Комментарий')
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == (
+        HTTPStatus.OK
+    )
+
+
+@pytest.mark.django_db
+def test_news_detail_not_modified(
+        client, create_news, django_assert_num_queries):
+    """
+    Тест проверяет, что ETag страницы новости меняется от комментариев
+      к ней и от изменения новостей, но не от чужих комментариев.
+    """
+    news, other_news, _ = create_news
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    etag = client.get(url)['ETag']
+    with django_assert_num_queries(0):
+        assert_not_modified(client.get(url, HTTP_IF_NONE_MATCH=etag))
+    Comment.objects.create(news=other_news, text='Чужой комментарий')
+    assert_not_modified(client.get(url, HTTP_IF_NONE_MATCH=etag))
+    Comment.objects.create(news=news, text='Комментарий')
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    etag = response['ETag']
+    News.objects.create(title='Соседняя новость', text='Текст')
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == (
+        HTTPStatus.OK
+    )
+
+
+@pytest.mark.django_db
+def test_news_detail_etag_changes_after_moderation(client, create_news):
+    """
+    Тест проверяет, что массовая модерация меняет ETag страниц новостей.
+    """
+    news = create_news[0]
+    Comment.objects.create(news=news, text='Плохой комментарий')
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    etag = client.get(url)['ETag']
+    moderate_comments(Comment.objects.all(), DELETE)
+    assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == (
+        HTTPStatus.OK
+    )
+
+
+@pytest.mark.django_db
+def test_news_detail_etag_depends_on_session(client, create_news):
+    """
+    Тест проверяет, что после входа пользователь не получает
+      страницу, закэшированную для анонимного посетителя.
+    """
+    url = reverse('news:detail', kwargs={'pk': create_news[0].pk})
+    etag = client.get(url)['ETag']
+    client.force_login(User.objects.create(username='reader'))
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert 'Оставить комментарий' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_async_news_detail_not_modified(create_news, rf):
+    """
+    Тест проверяет, что асинхронная страница новости тоже
+      отвечает 304 без обращения к базе.
+    """
+    news = create_news[0]
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    etag = Client().get(url)['ETag']
+    request = rf.get(url, HTTP_IF_NONE_MATCH=etag)
+    request.user = AnonymousUser()
+    view = views.AsyncNewsDetailView.as_view()
+    response = async_to_sync(view)(request, pk=news.pk)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+@pytest.fixture
+def trending(create_news):
+    """
+    Фикстура рассчитывает рейтинг: к первой новости три комментария
+      час назад, ко второй пять двое суток назад, к третьей один сейчас.
+    """
+    news1, news2, news3 = create_news
+    now = timezone.now()
+    for news, count, age in ((news1, 3, 1), (news2, 5, 48), (news3, 1, 0)):
+        for i in range(count):
+            comment = Comment.objects.create(news=news, text=f'Comment {i}')
+            Comment.objects.filter(pk=comment.pk).update(
+                created=now - datetime.timedelta(hours=age)
+            )
+    update_trending(now)
+    return create_news
+
+
+@pytest.mark.django_db
+def test_trending_page_ranks_news_by_recent_comments(client, trending):
+    """
+    Тест проверяет, что обсуждаемые новости упорядочены
+      по свежим комментариям, а давнее обсуждение отсеяно.
+    """
+    news1, news2, news3 = trending
+    response = client.get(reverse('news:trending'))
+    assert response.status_code == HTTPStatus.OK
+    assert list(response.context['news_feed']) == [news1, news3]
+
+
+@pytest.mark.django_db
+def test_trending_page_query_count_is_fixed(
+        client, trending, django_assert_num_queries):
+    """
+    Тест проверяет, что страница читает готовый рейтинг
+      и не обращается к комментариям.
+    """
+    news1, news2, news3 = trending
+    Comment.objects.bulk_create(
+        Comment(news=news2, text=f'Comment {i}') for i in range(50)
+    )
+    with django_assert_num_queries(2):
+        client.get(reverse('news:trending'))
+
+
+@pytest.mark.django_db
+def test_trending_page_not_modified_until_recomputed(client, trending):
+    """
+    Тест проверяет, что страница отдаёт 304,
+      пока рейтинг не пересчитан.
+    """
+    url = reverse('news:trending')
+    etag = client.get(url)['ETag']
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    update_trending()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.django_db
+def test_route_budget_shows_executed_sql(
+        client, create_news, request, monkeypatch):
+    """
+    Тест проверяет, что превышение бюджета маршрута проваливает
+      тест и показывает выполненные SQL-запросы.
+    """
+    plugin = request.config.pluginmanager.get_plugin('budget-plugin')
+    monkeypatch.setitem(plugin.budgets, 'news:home', {'queries': 0})
+    with pytest.raises(BudgetExceeded) as error:
+        client.get(reverse('news:home'))
+    message = str(error.value)
+    assert 'news:home' in message
+    assert 'SQL-запросов: 1 при бюджете 0' in message
+    assert 'FROM "news_news"' in message
@@ -1,12 +1,49 @@
+import asyncio
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import closing
+
 import pytest
-from django.contrib.auth.models import User
-from django.test import Client
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Permission, User
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import (
+    OperationalError, connection, connections, transaction
+)
+from django.db.models.deletion import Collector
+from django.db.models.signals import post_save
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from http import HTTPStatus
 
-from news.forms import CommentForm
+from news import comment_queue
+from news.cache import (
+    COMMENTS_VERSION_KEY, get_detail_version, get_feed_cache
+)
+from news.comment_queue import CommentJournal, CommentWriter
+from news.forms import BAD_WORDS, WARNING, CommentForm
 from news.models import Comment
-from news.models import News
+from news.models import News, TrendingScore
+from news.matching import MATCHERS, BadWordsFilter, normalize
+from news.moderation import (
+    DELETE, REDACT, REDACTED_TEXT, moderate_comments, select_comments
+)
+from news.trending import update_trending
+from yanews import metrics, profiling
+from yanews.routers import (
+    PRIMARY_COOKIE_NAME, PrimaryStickinessMiddleware, ReplicaRouter
+)
 
 
 @pytest.mark.django_db
@@ -94,3 +131,1004 @@ def test_authenticated_user_can_edit_or_delete_own_comments():
 
     response = client.get(reverse('news:delete', kwargs={'pk': comment.pk}))
     assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.fixture
+def comment_author():
+    """Фикстура создаёт комментарий и клиент его автора."""
+    user = User.objects.create_user(username='author', password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    comment = Comment.objects.create(news=news, author=user, text='Comment')
+    client = Client()
+    client.force_login(user)
+    return client, comment
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('method, name, data, queries', (
+    # Сессия, пользователь, новость; вставка и счётчик в транзакции.
+    ('post', 'news:detail', {'text': 'New comment'}, 7),
+    # Комментарий вместе с новостью для заголовка страницы.
+    ('get', 'news:edit', None, 3),
+    ('get', 'news:delete', None, 3),
+    # Комментарий без новости: для адреса перехода хватает news_id.
+    ('post', 'news:edit', {'text': 'Edited comment'}, 4),
+    ('post', 'news:delete', None, 7),
+))
+def test_comment_routes_query_count(
+        comment_author, django_assert_num_queries,
+        method, name, data, queries):
+    """
+    Тест проверяет, что представления комментариев загружают
+      комментарий один раз, а новость — только для шаблона.
+    """
+    client, comment = comment_author
+    pk = comment.news_id if name == 'news:detail' else comment.pk
+    with django_assert_num_queries(queries):
+        response = getattr(client, method)(
+            reverse(name, kwargs={'pk': pk}), data
+        )
+    assert response.status_code in (HTTPStatus.OK, HTTPStatus.FOUND)
+
+
+@pytest.mark.parametrize('text', [
+    'Ты редиска!',
+    'НЕГОДЯЙ',
+    'Ну ты и peдиcкa',
+])
+def test_comment_form_rejects_bad_words(text):
+    """
+    Тест проверяет, что форма отклоняет запрещённые слова
+      в любом регистре и с латинскими буквами вместо кириллических.
+    """
+    form = CommentForm(data={'text': text})
+    assert not form.is_valid()
+    assert form.errors['text'] == [WARNING]
+
+
+def test_comment_form_accepts_clean_text():
+    """Тест проверяет, что форма пропускает текст без запрещённых слов."""
+    form = CommentForm(data={'text': 'Отличная новость, спасибо!'})
+    assert form.is_valid()
+
+
+@pytest.mark.parametrize('engine', MATCHERS)
+def test_bad_words_filter_engines_agree(engine):
+    """
+    Тест проверяет, что все алгоритмы поиска находят
+      одни и те же слова, в том числе вложенные друг в друга.
+    """
+    words = ('he', 'she', 'his', 'hers')
+    words_filter = BadWordsFilter(words, engine)
+    assert words_filter.find('ushers') in map(normalize, words)
+    assert words_filter.find('ahishers') is not None
+    assert words_filter.find('xyz') is None
+    assert BadWordsFilter((), engine).find('anything') is None
+
+
+def test_bad_words_filter_loads_words_from_file(tmp_path):
+    """
+    Тест проверяет загрузку словаря из файла
+      с пропуском пустых строк и комментариев.
+    """
+    path = tmp_path / 'bad_words.txt'
+    path.write_text('# спам\nкупите\n\nскидка\n', encoding='utf-8')
+    words_filter = BadWordsFilter(BAD_WORDS)
+    words_filter.load_file(path)
+    assert words_filter.words == (*BAD_WORDS, 'купите', 'скидка')
+    assert words_filter.find('Большая СКИДКА!') == 'скидка'
+    assert words_filter.find('Ты редиска') == 'редиска'
+
+
+@pytest.fixture
+def moderator():
+    """Фикстура создаёт пользователя с правами модератора комментариев."""
+    user = User.objects.create_user(username='moderator',
+                                    password='password')
+    user.user_permissions.add(*Permission.objects.filter(
+        content_type__app_label='news',
+        codename__in=('change_comment', 'delete_comment'),
+    ))
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+@pytest.fixture
+def spam_wave():
+    """
+    Фикстура создаёт две новости: к первой двадцать
+      комментариев, половина из которых со спамом.
+    """
+    spammer = User.objects.create_user(username='spammer',
+                                       password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    other_news = News.objects.create(title='Other', text='Other news')
+    Comment.objects.bulk_create(
+        Comment(news=news, author=spammer,
+                text='Ты редиска' if i % 2 else f'Comment {i}')
+        for i in range(20)
+    )
+    Comment.objects.create(news=other_news, author=spammer,
+                           text='Ты редиска')
+    return news, other_news, spammer
+
+
+@pytest.mark.django_db
+def test_moderation_deletes_comments_of_news(moderator, spam_wave):
+    """
+    Тест проверяет, что модератор может удалить
+      все комментарии к новости одним действием.
+    """
+    news, other_news, spammer = spam_wave
+    response = moderator.post(reverse('news:moderate'), data={
+        'news_id': news.pk, 'action': DELETE,
+    })
+    assert response.status_code == HTTPStatus.OK
+    assert response.context['affected'] == 20
+    assert not Comment.objects.filter(news=news).exists()
+    assert Comment.objects.filter(news=other_news).count() == 1
+
+
+@pytest.mark.django_db
+def test_moderation_redacts_comments_with_bad_words(moderator, spam_wave):
+    """
+    Тест проверяет, что модератор может скрыть текст
+      только тех комментариев, в которых есть запрещённые слова.
+    """
+    news, other_news, spammer = spam_wave
+    response = moderator.post(reverse('news:moderate'), data={
+        'author': spammer.username, 'bad_words': 'on', 'action': REDACT,
+    })
+    assert response.context['affected'] == 11
+    assert Comment.objects.filter(text=REDACTED_TEXT).count() == 11
+    assert Comment.objects.filter(text__startswith='Comment').count() == 10
+
+
+@pytest.mark.django_db
+def test_moderation_filters_by_date_range(moderator, spam_wave):
+    """
+    Тест проверяет, что модерация затрагивает
+      только комментарии из указанного диапазона дат.
+    """
+    news, other_news, spammer = spam_wave
+    Comment.objects.filter(news=other_news).update(
+        created=timezone.now() - datetime.timedelta(days=10)
+    )
+    today = timezone.localdate()
+    response = moderator.post(reverse('news:moderate'), data={
+        'date_from': today, 'date_to': today, 'action': DELETE,
+    })
+    assert response.context['affected'] == 20
+    assert Comment.objects.filter(news=other_news).exists()
+
+
+@pytest.mark.django_db
+def test_moderation_query_count_does_not_depend_on_volume(
+        spam_wave, django_assert_num_queries):
+    """
+    Тест проверяет, что удаление выполняется одним запросом DELETE
+      внутри транзакции независимо от количества комментариев:
+      ещё два запроса выбирают затронутые новости
+      и пересчитывают их счётчики.
+    """
+    news, other_news, spammer = spam_wave
+    with django_assert_num_queries(5):
+        moderate_comments(select_comments(news_id=news.pk), DELETE)
+    Comment.objects.bulk_create(
+        Comment(news=news, text=f'Comment {i}') for i in range(200)
+    )
+    with django_assert_num_queries(5):
+        affected = moderate_comments(select_comments(news_id=news.pk),
+                                     DELETE)
+    assert affected == 200
+
+
+@pytest.mark.django_db
+def test_moderation_resets_comment_versions_of_affected_news(spam_wave):
+    """
+    Тест проверяет, что модерация без сигналов меняет версии
+      комментариев затронутых новостей, как это сделали бы сигналы.
+    """
+    news, other_news, spammer = spam_wave
+    cache = get_feed_cache()
+
+    def versions():
+        return [
+            cache.get(COMMENTS_VERSION_KEY.format(pk))
+            for pk in (news.pk, other_news.pk)
+        ]
+
+    for pk in (news.pk, other_news.pk):
+        get_detail_version(pk)
+    for action in (REDACT, DELETE):
+        before = versions()
+        moderate_comments(select_comments(news_id=news.pk), action)
+        after = versions()
+        assert after[0] != before[0]
+        assert after[1] == before[1]
+
+
+@pytest.mark.django_db
+def test_moderation_route_query_count(
+        moderator, spam_wave, django_assert_num_queries):
+    """
+    Тест проверяет число запросов всего маршрута модерации:
+      сессия, пользователь, его права и само удаление.
+    """
+    news, other_news, spammer = spam_wave
+    with django_assert_num_queries(9):
+        moderator.post(reverse('news:moderate'), data={
+            'news_id': news.pk, 'action': DELETE,
+        })
+
+
+@pytest.mark.django_db
+def test_moderation_not_available_without_permissions(spam_wave):
+    """
+    Тест проверяет, что обычный пользователь
+      не может выполнять массовую модерацию.
+    """
+    news, other_news, spammer = spam_wave
+    client = Client()
+    client.force_login(spammer)
+    response = client.post(reverse('news:moderate'), data={
+        'news_id': news.pk, 'action': DELETE,
+    })
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    assert Comment.objects.filter(news=news).count() == 20
+
+
+@pytest.mark.django_db
+def test_admin_action_redacts_selected_comments(admin_client, spam_wave):
+    """
+    Тест проверяет действие админки, скрывающее
+      текст выбранных комментариев.
+    """
+    news, other_news, spammer = spam_wave
+    ids = Comment.objects.filter(news=news).values_list('pk', flat=True)
+    response = admin_client.post(
+        reverse('admin:news_comment_changelist'),
+        {'action': 'redact_comments', '_selected_action': list(ids)},
+    )
+    assert response.status_code == HTTPStatus.FOUND
+    assert Comment.objects.filter(text=REDACTED_TEXT).count() == 20
+
+
+@pytest.mark.django_db
+def test_admin_action_deletes_all_matching_comments(admin_client, spam_wave):
+    """
+    Тест проверяет действие админки, удаляющее
+      все комментарии, подходящие под фильтр списка.
+    """
+    response = admin_client.post(
+        reverse('admin:news_comment_changelist') + '?q=редиска',
+        {'action': 'delete_comments', 'select_across': '1',
+         '_selected_action': [0]},
+    )
+    assert response.status_code == HTTPStatus.FOUND
+    assert Comment.objects.count() == 10
+
+
+@pytest.mark.django_db
+def test_comment_views_keep_news_counters():
+    """
+    Тест проверяет, что добавление и удаление комментария
+      обновляют счётчик и время последнего комментария новости.
+    """
+    user = User.objects.create_user(username='user', password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    client = Client()
+    client.force_login(user)
+    detail_url = reverse('news:detail', kwargs={'pk': news.pk})
+    client.post(detail_url, {'text': 'First comment'})
+    client.post(detail_url, {'text': 'Second comment'})
+    first, second = Comment.objects.filter(news=news)
+    news.refresh_from_db()
+    assert news.comment_count == 2
+    assert news.last_comment_at == second.created
+    client.post(reverse('news:delete', kwargs={'pk': second.pk}))
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    assert news.last_comment_at == first.created
+    client.post(reverse('news:delete', kwargs={'pk': first.pk}))
+    news.refresh_from_db()
+    assert news.comment_count == 0
+    assert news.last_comment_at is None
+
+
+@pytest.mark.django_db
+def test_moderation_recounts_news_counters(moderator, spam_wave):
+    """
+    Тест проверяет, что массовое удаление пересчитывает
+      счётчики всех затронутых новостей.
+    """
+    news, other_news, spammer = spam_wave
+    moderator.post(reverse('news:moderate'), data={
+        'author': spammer.username, 'bad_words': 'on', 'action': DELETE,
+    })
+    news.refresh_from_db()
+    other_news.refresh_from_db()
+    assert news.comment_count == 10
+    assert news.last_comment_at == Comment.objects.filter(
+        news=news).latest('created').created
+    assert other_news.comment_count == 0
+    assert other_news.last_comment_at is None
+
+
+@pytest.mark.django_db
+def test_recount_command_repairs_drift(spam_wave):
+    """
+    Тест проверяет, что команда пересчёта исправляет
+      счётчики, разошедшиеся после bulk_create.
+    """
+    news, other_news, spammer = spam_wave
+    News.objects.filter(pk=other_news.pk).update(comment_count=5)
+    news.refresh_from_db()
+    assert news.comment_count == 0
+    call_command('news_recount_comments', '--chunk-size', '1',
+                 verbosity=0)
+    news.refresh_from_db()
+    other_news.refresh_from_db()
+    assert news.comment_count == 20
+    assert news.last_comment_at == Comment.objects.filter(
+        news=news).latest('created').created
+    assert other_news.comment_count == 1
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_recount_command_reads_from_primary(spam_wave):
+    """
+    Тест проверяет, что команда пересчёта сравнивает счётчики
+      с основной базой, а не с репликой, которая может отставать.
+    """
+    with CaptureQueriesContext(connections['replica']) as queries:
+        call_command('news_recount_comments', '--chunk-size', '1',
+                     verbosity=0)
+    assert len(queries) == 0
+
+
+def add_comments(news, count, created):
+    """Комментарии с заданным временем создания."""
+    comments = [
+        Comment.objects.create(news=news, text=f'Comment {i}').pk
+        for i in range(count)
+    ]
+    Comment.objects.filter(pk__in=comments).update(created=created)
+
+
+def get_scores():
+    return dict(TrendingScore.objects.values_list('news_id', 'score'))
+
+
+@pytest.mark.django_db
+def test_trending_counts_only_new_comments(settings):
+    """
+    Тест проверяет, что пересчёт учитывает только новые
+      комментарии, а прежние оценки затухают со временем.
+    """
+    settings.NEWS_TRENDING_HALF_LIFE = 3600
+    news = News.objects.create(title='Test News', text='This is a test news')
+    now = timezone.now()
+    add_comments(news, 4, now)
+    assert update_trending(now) == 4
+    assert get_scores() == {news.pk: pytest.approx(4)}
+    later = now + datetime.timedelta(hours=1)
+    assert update_trending(later) == 0
+    assert get_scores() == {news.pk: pytest.approx(2)}
+    add_comments(news, 1, later)
+    assert update_trending(later) == 1
+    assert get_scores() == {news.pk: pytest.approx(3)}
+
+
+@pytest.mark.django_db
+def test_trending_rebuild_matches_incremental_runs(settings):
+    """
+    Тест проверяет, что оценки после серии пересчётов
+      совпадают с рассчитанными заново, а остывшие новости удаляются.
+    """
+    settings.NEWS_TRENDING_HALF_LIFE = 3600
+    hot = News.objects.create(title='Hot', text='Hot news')
+    cold = News.objects.create(title='Cold', text='Cold news')
+    start = timezone.now()
+    add_comments(cold, 1, start - datetime.timedelta(hours=2))
+    for hour in range(4):
+        now = start + datetime.timedelta(hours=hour)
+        add_comments(hot, hour + 1, now)
+        update_trending(now)
+    incremental = get_scores()
+    update_trending(now, rebuild=True)
+    assert get_scores() == pytest.approx(incremental)
+    assert list(incremental) == [hot.pk]
+
+
+@pytest.mark.django_db
+def test_trending_command_fills_ranking():
+    """Тест проверяет команду пересчёта рейтинга."""
+    news = News.objects.create(title='Test News', text='This is a test news')
+    Comment.objects.create(news=news, text='This is a comment')
+    call_command('news_trending', verbosity=0)
+    assert list(get_scores()) == [news.pk]
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_writer_loses_no_comments(tmp_path):
+    """
+    Тест проверяет, что все комментарии, поставленные в очередь
+      из нескольких потоков, записаны после остановки записи.
+    """
+    user = User.objects.create_user(username='user', password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    writer = CommentWriter(batch_size=25, flush_interval=0.01,
+                           max_size=1000, journal_dir=tmp_path, fsync=False)
+
+    def submit(thread):
+        for i in range(50):
+            assert writer.submit(
+                Comment(news=news, author=user, text=f'{thread}-{i}')
+            )
+
+    threads = [
+        threading.Thread(target=submit, args=(thread,))
+        for thread in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.stop()
+    texts = set(Comment.objects.values_list('text', flat=True))
+    assert texts == {f'{thread}-{i}' for thread in range(8)
+                     for i in range(50)}
+    news.refresh_from_db()
+    assert news.comment_count == 400
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_writer_replays_journal_of_crashed_process(tmp_path):
+    """
+    Тест проверяет, что комментарии из журнала аварийно
+      завершившегося процесса записываются, а уже записанные — нет.
+    """
+    news = News.objects.create(title='Test News', text='This is a test news')
+    journal = CommentJournal(tmp_path, fsync=False)
+    for text in ('written', 'lost 1', 'lost 2'):
+        journal.append(Comment(news=news, text=text))
+    journal.commit(1, empty=False)
+    journal.file.write('{"seq": 4, "news_')
+    journal.file.close()
+    writer = CommentWriter(journal_dir=tmp_path)
+    writer.start()
+    writer.stop()
+    assert sorted(Comment.objects.values_list('text', flat=True)) == [
+        'lost 1', 'lost 2'
+    ]
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_writer_keeps_failed_comment_in_journal(tmp_path):
+    """
+    Тест проверяет, что комментарий, на котором запись упала не из-за
+      базы, остаётся в журнале, а остальные комментарии пачки записаны.
+    """
+    news = News.objects.create(title='Test News', text='This is a test news')
+
+    def fail(sender, instance, **kwargs):
+        if instance.text == 'broken':
+            raise ValueError('broken receiver')
+
+    post_save.connect(fail, sender=Comment)
+    try:
+        writer = CommentWriter(batch_size=10, flush_interval=0.05,
+                               journal_dir=tmp_path, fsync=False)
+        for text in ('first', 'broken', 'last'):
+            assert writer.submit(Comment(news=news, text=text))
+        writer.flush()
+        assert writer.submit(Comment(news=news, text='next batch'))
+        writer.stop()
+    finally:
+        post_save.disconnect(fail, sender=Comment)
+    assert sorted(Comment.objects.values_list('text', flat=True)) == [
+        'first', 'last', 'next batch'
+    ]
+    assert len(list(tmp_path.iterdir())) == 1
+    writer = CommentWriter(journal_dir=tmp_path, fsync=False)
+    writer.start()
+    writer.stop()
+    assert Comment.objects.filter(text='broken').count() == 1
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_writer_retries_database_errors_limited_times(monkeypatch):
+    """
+    Тест проверяет, что пачка повторяется не больше retries раз,
+      после чего комментарии записываются по одному.
+    """
+    news = News.objects.create(title='Test News', text='This is a test news')
+    calls = []
+
+    def save_comments(comments):
+        calls.append(len(comments))
+        raise OperationalError('database is locked')
+
+    monkeypatch.setattr(comment_queue, 'save_comments', save_comments)
+    writer = CommentWriter(flush_interval=0.01, journal_dir='', retries=2)
+    assert writer.submit(Comment(news=news, text='Queued comment'))
+    writer.flush()
+    assert calls == [1, 1, 1]
+    assert Comment.objects.get().text == 'Queued comment'
+    writer.stop()
+
+
+def test_comment_queue_imports_without_fcntl(monkeypatch):
+    """
+    Тест проверяет, что очередь комментариев импортируется
+      без fcntl (в Windows), а без него недоступен только журнал.
+    """
+    monkeypatch.setitem(sys.modules, 'fcntl', None)
+    spec = importlib.util.spec_from_file_location(
+        'news.comment_queue_without_fcntl', comment_queue.__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.CommentWriter(journal_dir='').journal is None
+    with pytest.raises(ImportError):
+        module.CommentJournal.lock(None)
+
+
+@pytest.mark.django_db(transaction=True, databases=['default', 'replica'])
+def test_comment_post_through_write_queue(settings, monkeypatch):
+    """
+    Тест проверяет, что в режиме очереди запрос сразу получает
+      перенаправление, а комментарий записывается потоком со счётчиком.
+    """
+    settings.NEWS_COMMENT_WRITE_QUEUE = True
+    writer = CommentWriter(journal_dir='')
+    monkeypatch.setattr(comment_queue, 'writer', writer)
+    user = User.objects.create_user(username='user', password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    client = Client()
+    client.force_login(user)
+    response = client.post(reverse('news:detail', kwargs={'pk': news.pk}),
+                           {'text': 'Queued comment'})
+    assert response.status_code == HTTPStatus.FOUND
+    writer.flush()
+    comment = Comment.objects.get()
+    assert (comment.text, comment.author) == ('Queued comment', user)
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    writer.stop()
+
+
+@pytest.mark.django_db
+def test_full_write_queue_saves_comment_in_request(settings, monkeypatch):
+    """
+    Тест проверяет, что при переполненной очереди
+      комментарий сохраняется в самом запросе.
+    """
+    settings.NEWS_COMMENT_WRITE_QUEUE = True
+    writer = CommentWriter(max_size=0, journal_dir='')
+    monkeypatch.setattr(comment_queue, 'writer', writer)
+    user = User.objects.create_user(username='user', password='password')
+    news = News.objects.create(title='Test News', text='This is a test news')
+    client = Client()
+    client.force_login(user)
+    client.post(reverse('news:detail', kwargs={'pk': news.pk}),
+                {'text': 'Direct comment'})
+    assert Comment.objects.get().text == 'Direct comment'
+    writer.stop()
+
+
+@pytest.fixture
+def sqlite_file(tmp_path, settings, django_db_blocker):
+    """
+    Фикстура открывает файл SQLite с настройками проекта:
+      основное соединение и соединение реплики.
+    """
+    databases = {
+        alias: {**settings.DATABASES[alias], 'NAME': tmp_path / 'db.sqlite3',
+                'TEST': {}}
+        for alias in ('default', 'replica')
+    }
+    handler = ConnectionHandler(databases)
+    with django_db_blocker.unblock():
+        yield handler
+    handler.close_all()
+
+
+def test_sqlite_connection_pragmas(sqlite_file):
+    """
+    Тест проверяет, что PRAGMA из настроек выполняются
+      при открытии соединения.
+    """
+    with sqlite_file['default'].cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        assert cursor.fetchone() == ('wal',)
+        cursor.execute('PRAGMA synchronous')
+        assert cursor.fetchone() == (1,)
+        cursor.execute('PRAGMA busy_timeout')
+        assert cursor.fetchone() == (5000,)
+
+
+def test_sqlite_replica_connection_rejects_writes(sqlite_file):
+    """
+    Тест проверяет, что соединение реплики видит данные,
+      но не может их изменять.
+    """
+    with sqlite_file['default'].cursor() as cursor:
+        cursor.execute('CREATE TABLE t (x INTEGER)')
+        cursor.execute('INSERT INTO t VALUES (1)')
+    with sqlite_file['replica'].cursor() as cursor:
+        cursor.execute('SELECT x FROM t')
+        assert cursor.fetchall() == [(1,)]
+        with pytest.raises(OperationalError):
+            cursor.execute('INSERT INTO t VALUES (2)')
+
+
+def test_reads_outside_transaction_use_replica():
+    """
+    Тест проверяет, что чтение вне транзакции
+      направляется на реплику.
+    """
+    assert ReplicaRouter().db_for_read(News) == 'replica'
+    assert ReplicaRouter().db_for_write(News) == 'default'
+
+
+@pytest.mark.django_db
+def test_reads_inside_transaction_use_default_connection():
+    """
+    Тест проверяет, что внутри транзакции чтение идёт
+      через основное соединение и видит свои изменения.
+    """
+    with transaction.atomic():
+        assert ReplicaRouter().db_for_read(News) == 'default'
+
+
+@pytest.mark.django_db
+def test_comment_post_pins_session_to_primary(client):
+    """
+    Тест проверяет, что после публикации комментария сеанс
+      закрепляется за основной базой, а чтение — нет.
+    """
+    news = News.objects.create(title='Новость', text='Текст')
+    client.force_login(User.objects.create(username='reader'))
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    assert PRIMARY_COOKIE_NAME not in client.get(url).cookies
+    response = client.post(url, {'text': 'Комментарий'})
+    assert PRIMARY_COOKIE_NAME in response.cookies
+
+
+@pytest.fixture
+def primary_and_replica(tmp_path, django_db_blocker):
+    """
+    Фикстура подменяет основную базу и реплику двумя файлами SQLite.
+
+    Возвращает функцию, которая копирует основную базу в реплику,
+    имитируя репликацию; до её вызова реплика отстаёт.
+    """
+    originals = {alias: connections[alias] for alias in ('default', 'replica')}
+    paths = {alias: tmp_path / f'{alias}.sqlite3' for alias in originals}
+    for alias, original in originals.items():
+        connections[alias] = original.__class__(
+            {**original.settings_dict, 'NAME': str(paths[alias])}, alias)
+
+    def replicate():
+        with closing(sqlite3.connect(paths['default'])) as primary, \
+                closing(sqlite3.connect(paths['replica'])) as replica:
+            primary.backup(replica)
+
+    with django_db_blocker.unblock():
+        call_command('migrate', verbosity=0)
+        replicate()
+        yield replicate
+        for alias, original in originals.items():
+            connections[alias].close()
+            connections[alias] = original
+
+
+def test_session_reads_own_comment_while_replica_lags(primary_and_replica):
+    """
+    Тест проверяет, что автор сразу видит свой комментарий,
+      пока реплика отстаёт, а остальные читают с реплики.
+    """
+    news = News.objects.create(title='Новость', text='Текст')
+    client = Client()
+    client.force_login(User.objects.create(username='reader'))
+    primary_and_replica()
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    response = client.post(url, {'text': 'Свежий комментарий'})
+    assert response.status_code == HTTPStatus.FOUND
+    assert 'Свежий комментарий' in client.get(url).content.decode()
+    assert 'Свежий комментарий' not in Client().get(url).content.decode()
+    primary_and_replica()
+    assert 'Свежий комментарий' in Client().get(url).content.decode()
+
+
+def test_primary_stickiness_middleware_supports_async():
+    """
+    Тест проверяет, что под ASGI промежуточный слой работает
+      без перехода в поток и закрепляет сеанс после записи.
+    """
+    async def get_response(request):
+        ReplicaRouter().db_for_write(News)
+        return HttpResponse()
+
+    middleware = PrimaryStickinessMiddleware(get_response)
+    assert asyncio.iscoroutinefunction(middleware)
+    response = async_to_sync(middleware)(RequestFactory().get('/'))
+    assert PRIMARY_COOKIE_NAME in response.cookies
+
+
+@pytest.fixture
+def profiled(settings):
+    settings.PROFILING_SAMPLE_RATE = 1
+    profiling.store.reset()
+    yield settings
+    profiling.store.reset()
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_reports_server_timing(
+    client, profiled, django_assert_num_queries
+):
+    """
+    Тест проверяет, что попавший в выборку запрос получает
+      заголовок Server-Timing и попадает в гистограммы представления.
+    """
+    news = News.objects.create(title='Новость', text='Текст')
+    url = reverse('news:detail', kwargs={'pk': news.pk})
+    with django_assert_num_queries(6):
+        response = client.get(url)
+    timing = response['Server-Timing']
+    for metric in ('db;', 'session;', 'tpl;', 'total;'):
+        assert metric in timing
+    assert 'desc="6 SQL"' in timing
+    stats = profiling.store.snapshot()['news:detail']
+    assert stats['total_ms']['count'] == 1
+    assert stats['queries']['count'] == 1
+    assert stats['templates_ms']['mean'] > 0
+
+
+@pytest.mark.django_db
+def test_profiling_keeps_enclosing_execute_wrapper(client, profiled):
+    """
+    Тест проверяет, что замер запроса внутри чужого execute_wrapper()
+      не меняет список обёрток соединения после выхода из него.
+    """
+    news = News.objects.create(title='Новость', text='Текст')
+    before = list(connection.execute_wrappers)
+    seen = []
+
+    def outer(execute, sql, params, many, context):
+        seen.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(outer):
+        response = client.get(
+            reverse('news:detail', kwargs={'pk': news.pk})
+        )
+    assert f'desc="{len(seen)} SQL"' in response['Server-Timing']
+    assert connection.execute_wrappers == before
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_skips_unsampled_requests(client, profiled):
+    """Тест проверяет, что запросы вне выборки не замеряются."""
+    profiled.PROFILING_SAMPLE_RATE = 0
+    response = client.get(reverse('news:home'))
+    assert 'Server-Timing' not in response
+    assert profiling.store.snapshot() == {}
+
+
+@pytest.mark.django_db
+def test_profiling_keeps_slowest_cprofile_dumps(client, profiled, tmp_path):
+    """
+    Тест проверяет, что на диске остаются профили cProfile
+      только PROFILING_CPROFILE_SLOWEST самых медленных запросов.
+    """
+    profiled.PROFILING_CPROFILE_SLOWEST = 2
+    profiled.PROFILING_CPROFILE_DIR = tmp_path
+    for _ in range(5):
+        client.get(reverse('news:home'))
+    dumps = sorted(path.name for path in tmp_path.glob('*.prof'))
+    assert dumps == sorted(name for _, name, _ in profiling.store.slowest)
+    assert len(dumps) == 2
+
+
+def test_rolling_histogram_forgets_old_values():
+    """
+    Тест проверяет, что гистограмма учитывает только значения
+      за последнее окно и считает квантили по корзинам.
+    """
+    histogram = profiling.RollingHistogram(10, profiling.TIME_BUCKETS)
+    for value in (0.02, 0.02, 0.02, 0.3):
+        histogram.add(value, now=100)
+    summary = histogram.summary(now=105, scale=1000)
+    assert summary['count'] == 4
+    assert 10 < summary['p50'] <= 25
+    assert 250 < summary['p99'] <= 500
+    assert histogram.summary(now=111) == {'count': 0}
+
+
+@pytest.mark.django_db
+def test_profiling_middleware_supports_async(profiled):
+    """
+    Тест проверяет, что под ASGI промежуточный слой
+      замеряет запрос без перехода в поток.
+    """
+    async def get_response(request):
+        return HttpResponse()
+
+    middleware = profiling.ProfilingMiddleware(get_response)
+    assert asyncio.iscoroutinefunction(middleware)
+    response = async_to_sync(middleware)(RequestFactory().get('/'))
+    assert 'total;dur=' in response['Server-Timing']
+    assert '<unresolved>' in profiling.store.snapshot()
+
+
+def scrape(client):
+    """Значения метрик из /metrics по строке «имя{метки}»."""
+    response = client.get(reverse('metrics'))
+    assert response['Content-Type'].startswith('text/plain')
+    return {
+        sample: float(value)
+        for sample, _, value in (
+            line.rpartition(' ')
+            for line in response.content.decode().splitlines()
+            if not line.startswith('#')
+        )
+    }
+
+
+@pytest.mark.django_db
+def test_metrics_count_requests_queries_writes_and_cache(comment_author):
+    """
+    Тест проверяет, что /metrics показывает ответы и время ответа
+      по маршруту, SQL-запросы, записи комментариев и чтения кэша.
+    """
+    client, comment = comment_author
+    before = scrape(client)
+    client.get(reverse('news:home'))
+    client.get(reverse('news:home'))
+    client.post(
+        reverse('news:detail', kwargs={'pk': comment.news_id}),
+        {'text': 'Новый комментарий'},
+    )
+    after = scrape(client)
+
+    def delta(sample):
+        return after.get(sample, 0) - before.get(sample, 0)
+
+    assert delta(
+        'http_requests_total{view="news:home",method="GET",status="200"}'
+    ) == 2
+    assert delta(
+        'http_requests_total{view="news:detail",method="POST",status="302"}'
+    ) == 1
+    assert delta(
+        'http_request_duration_seconds_count{view="news:home"}'
+    ) == 2
+    assert delta(
+        'http_request_duration_seconds_bucket{view="news:home",le="+Inf"}'
+    ) == 2
+    assert delta('db_queries_total{alias="default"}') > 0
+    assert delta(
+        'model_writes_total{model="news.Comment",action="created"}'
+    ) == 1
+    assert delta('cache_requests_total{cache="default",result="hit"}') > 0
+
+
+@pytest.mark.django_db
+def test_metrics_wrapper_survives_enclosing_execute_wrapper():
+    """
+    Тест проверяет, что соединение, открытое внутри чужого
+      execute_wrapper(), после выхода из него продолжает считать
+      запросы, а чужая обёртка снимается.
+    """
+    fresh = connections.create_connection('default')
+
+    def outer(execute, sql, params, many, context):
+        return execute(sql, params, many, context)
+
+    try:
+        with fresh.execute_wrapper(outer):
+            with fresh.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        assert fresh.execute_wrappers == [metrics.count_query]
+        before = metrics.registry.snapshot()
+        with fresh.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        key = (metrics.QUERIES.name, ('default',))
+        assert metrics.registry.snapshot()[key] == before[key] + 1
+    finally:
+        fresh.close()
+
+
+@pytest.mark.django_db
+def test_metrics_forbidden_for_other_addresses(client):
+    """Тест проверяет, что метрики недоступны с чужих адресов."""
+    response = client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+    assert response.status_code == HTTPStatus.FORBIDDEN
+
+
+@pytest.mark.django_db
+def test_metrics_use_client_address_from_proxy_header(client, settings):
+    """
+    Тест проверяет, что за прокси доступ проверяется по адресу,
+      который прокси дописал последним в METRICS_CLIENT_IP_HEADER.
+    """
+    settings.METRICS_CLIENT_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+    url = reverse('metrics')
+    proxy = {'REMOTE_ADDR': '10.0.0.2'}
+    assert client.get(url, **proxy).status_code == HTTPStatus.FORBIDDEN
+    response = client.get(
+        url, HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.7', **proxy
+    )
+    assert response.status_code == HTTPStatus.FORBIDDEN
+    response = client.get(url, HTTP_X_FORWARDED_FOR='127.0.0.1', **proxy)
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.django_db
+def test_metrics_sum_values_of_all_processes(client, settings, tmp_path):
+    """
+    Тест проверяет, что в многопроцессном режиме /metrics
+      складывает значения из файлов всех процессов.
+    """
+    settings.METRICS_MULTIPROCESS_DIR = tmp_path
+    sample = 'model_writes_total{model="news.News",action="deleted"}'
+    own = scrape(client).get(sample, 0)
+    (tmp_path / 'metrics-1-1.json').write_text(json.dumps([
+        ['model_writes_total', ['news.News', 'deleted'], 3],
+    ]))
+    assert scrape(client)[sample] == own + 3
+    assert list(tmp_path.glob(f'metrics-{os.getpid()}-*.json'))
+
+
+@pytest.mark.django_db
+def test_metrics_keep_fast_delete_for_other_models():
+    """
+    Тест проверяет, что счётчики записей подключены только
+      к моделям METRICS_WRITE_MODELS и не отключают быстрое
+      удаление остальных.
+    """
+    collector = Collector(using='default')
+    assert collector.can_fast_delete(Session.objects.all())
+    assert collector.can_fast_delete(TrendingScore.objects.all())
+
+
+def test_metrics_registry_writes_without_locks_per_thread():
+    """
+    Тест проверяет, что значения, увеличенные в разных потоках,
+      складываются при чтении, а словари завершившихся потоков
+      переносятся в общий итог.
+    """
+    registry = metrics.Registry()
+    key = ('test_total', ())
+
+    def work():
+        for _ in range(1000):
+            registry.inc(key)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.snapshot()[key] == 4000
+    assert len(registry.shards) == 4
+    del threads, thread
+    gc.collect()
+    assert registry.shards == {}
+    assert registry.snapshot()[key] == 4000
+    for _ in range(200):
+        thread = threading.Thread(target=registry.inc, args=(key,))
+        thread.start()
+        thread.join()
+    del thread
+    gc.collect()
+    assert registry.shards == {}
+    assert registry.snapshot()[key] == 4200
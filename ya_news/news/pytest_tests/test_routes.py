@@ -1,3 +1,5 @@
+import datetime
+
 import pytest
 from django.contrib.auth.models import User
 from django.test import Client
@@ -164,3 +166,31 @@ def test_registration_login_logout_pages_accessible_to_anonymous_user():
     response = client.get(reverse_lazy('users:logout'), follow=True)
     assert response.status_code == 200
     assert response.redirect_chain == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, args', [
+    ('news:archive_year', (2023,)),
+    ('news:archive_month', (2023, 5)),
+    ('news:archive_day', (2023, 5, 25)),
+])
+def test_anonymous_user_can_access_archive_pages(name, args):
+    """
+    Проверяем, что анонимный пользователь может получить
+      доступ к архиву новостей за год, месяц и день.
+    """
+    News.objects.create(title='Test News', text='This is a test news',
+                        date=datetime.date(2023, 5, 25))
+    client = Client()
+    response = client.get(reverse_lazy(name, args=args))
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_empty_archive_page_not_found():
+    """
+    Проверяем, что архив за период без новостей недоступен.
+    """
+    client = Client()
+    response = client.get(reverse_lazy('news:archive_year', args=(1999,)))
+    assert response.status_code == 404
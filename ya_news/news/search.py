@@ -0,0 +1,124 @@
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import News
+
+NEWS_FTS = 'news_news_fts'
+COMMENT_FTS = 'news_comment_fts'
+# Совпадение в комментарии весит меньше совпадения в самой новости.
+COMMENT_WEIGHT = 0.5
+# Сколько лучших комментариев просматривать на одну найденную новость.
+COMMENTS_PER_RESULT = 10
+SNIPPET_WORDS = 16
+# Маркеры подсветки, которых не бывает в тексте; заменяются на <mark>.
+MARK_START, MARK_END = '\x02', '\x03'
+WORDS = re.compile(r'\w+')
+
+NEWS_SQL = f"""
+    SELECT rowid, rank,
+           snippet({NEWS_FTS}, -1, %s, %s, '…', {SNIPPET_WORDS})
+    FROM {NEWS_FTS}
+    WHERE {NEWS_FTS} MATCH %s
+    ORDER BY rank
+    LIMIT %s
+"""
+
+COMMENT_SQL = f"""
+    SELECT news_comment.news_id, MIN(hits.rank), hits.snippet
+    FROM (
+        SELECT rowid, rank,
+               snippet({COMMENT_FTS}, 0, %s, %s, '…', {SNIPPET_WORDS})
+               AS snippet
+        FROM {COMMENT_FTS}
+        WHERE {COMMENT_FTS} MATCH %s
+        ORDER BY rank
+        LIMIT %s
+    ) AS hits
+    JOIN news_comment ON news_comment.id = hits.rowid
+    GROUP BY news_comment.news_id
+"""
+
+
+def fts_query(query):
+    """
+    Запрос FTS5 из пользовательской строки.
+
+    Каждое слово ищется как префикс, спецсимволы синтаксиса FTS5
+    отбрасываются, поэтому любой ввод даёт корректный запрос.
+    """
+    return ' '.join(f'"{word}"*' for word in WORDS.findall(query))
+
+
+def highlight(snippet):
+    """Экранируем фрагмент текста и подсвечиваем найденные слова."""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(
+            MARK_END, '</mark>')
+    )
+
+
+def search_news_fts(query, limit, with_comments=False):
+    """
+    Поиск по индексам FTS5 новостей и, по желанию, комментариев.
+
+    Каждый индекс возвращает не больше limit лучших совпадений,
+    поэтому время поиска не зависит от размера архива.
+    Новость, найденная и по тексту, и по комментариям,
+    получает лучший из двух рангов.
+    Индекс и новости читаются из одной базы, которую выбирает
+    маршрутизатор: реплика с задержкой не должна отдать id новости,
+    которой нет в основной базе, и наоборот. Новость, удалённая
+    между запросами, пропускается.
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+    using = router.db_for_read(News)
+    hits = {}
+    with connections[using].cursor() as cursor:
+        cursor.execute(NEWS_SQL, (MARK_START, MARK_END, match, limit))
+        for news_id, rank, snippet in cursor.fetchall():
+            hits[news_id] = (rank, snippet)
+        if with_comments:
+            cursor.execute(COMMENT_SQL, (
+                MARK_START, MARK_END, match, limit * COMMENTS_PER_RESULT
+            ))
+            for news_id, rank, snippet in cursor.fetchall():
+                rank *= COMMENT_WEIGHT
+                if news_id not in hits or rank < hits[news_id][0]:
+                    hits[news_id] = (rank, snippet)
+    best = sorted(hits, key=lambda news_id: hits[news_id][0])[:limit]
+    found = News.objects.using(using).in_bulk(best)
+    results = []
+    for news_id in best:
+        news = found.get(news_id)
+        if news is None:
+            continue
+        news.snippet = highlight(hits[news_id][1])
+        results.append(news)
+    return results
+
+
+def search_news_fallback(query, limit, with_comments=False):
+    """Поиск для баз данных без FTS5: все слова запроса через icontains."""
+    words = WORDS.findall(query)
+    if not words:
+        return []
+    condition = Q()
+    for word in words:
+        word_condition = Q(title__icontains=word) | Q(text__icontains=word)
+        if with_comments:
+            word_condition |= Q(comments__text__icontains=word)
+        condition &= word_condition
+    return list(News.objects.filter(condition).distinct()[:limit])
+
+
+def search_news(query, limit, with_comments=False):
+    """Новости, подходящие под запрос, в порядке релевантности."""
+    if connections[router.db_for_read(News)].vendor == 'sqlite':
+        return search_news_fts(query, limit, with_comments)
+    return search_news_fallback(query, limit, with_comments)
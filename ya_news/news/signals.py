@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_comments, invalidate_feed, invalidate_pages
+from .models import Comment, News
+from .stream import publish_comment
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_feed_cache(sender, **kwargs):
+    """Любое изменение новости или комментария сбрасывает кэш ленты."""
+    invalidate_feed()
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def reset_pages_version(sender, **kwargs):
+    """Новость меняет ссылки на соседние новости на других страницах."""
+    invalidate_pages()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def reset_comments_version(sender, instance, **kwargs):
+    """Комментарий меняет только страницу своей новости."""
+    invalidate_comments(instance.news_id)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    """Счётчик комментариев новости увеличивается F()-выражением."""
+    if created:
+        News.objects.filter(pk=instance.news_id).comment_added(
+            instance.created
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    """Счётчик уменьшается, время последнего комментария перечитывается."""
+    News.objects.filter(pk=instance.news_id).comment_removed()
+
+
+@receiver(post_save, sender=Comment)
+def stream_new_comment(sender, instance, created, using, **kwargs):
+    """Новый комментарий уходит подписчикам после фиксации транзакции."""
+    if created:
+        transaction.on_commit(lambda: publish_comment(instance), using=using)
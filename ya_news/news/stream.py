@@ -0,0 +1,294 @@
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.http import Http404
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from .models import Comment, News
+from .pagination import decode_cursor, encode_cursor, get_comments_page
+
+STREAM_PATH = re.compile(r'^/news/(?P<pk>\d+)/stream/$')
+STREAM_CONTENT_TYPE = 'text/event-stream; charset=utf-8'
+# Отметка в scope запросов, прошедших через CommentStreamApp.
+STREAM_SCOPE_KEY = 'news.comment_stream'
+HEARTBEAT = b': ping\n\n'
+# Подписчик не успевает читать: поток закрывается, а пропущенные
+# комментарии клиент получит после переподключения по Last-Event-ID.
+OVERFLOW = None
+
+
+def comment_event(comment):
+    """
+    Событие SSE о новом комментарии.
+
+    Возвращает ключ (created, id) для сравнения с курсором
+    и готовый к отправке текст события, общий для всех подписчиков.
+    """
+    data = json.dumps({
+        'id': comment.pk,
+        'author': str(comment.author) if comment.author_id else '',
+        'created': date_format(
+            timezone.localtime(comment.created), 'DATETIME_FORMAT'
+        ),
+        'text': comment.text,
+    }, ensure_ascii=False)
+    chunk = f'id: {encode_cursor(comment)}\ndata: {data}\n\n'.encode()
+    return (comment.created, comment.pk), chunk
+
+
+def stream_preamble():
+    """Интервал переподключения EventSource в миллисекундах."""
+    return f'retry: {settings.NEWS_COMMENT_STREAM_RETRY}\n\n'.encode()
+
+
+def get_backlog(news_id, cursor):
+    """
+    Одна порция событий о комментариях к новости после курсора.
+
+    Без курсора обсуждение отдаётся с начала. Возвращает события
+    и признак того, что после них комментариев нет: следующую порцию
+    клиент запросит с курсором последнего полученного комментария.
+    """
+    comments, cursor = get_comments_page(news_id, cursor)
+    if not comments and not News.objects.filter(pk=news_id).exists():
+        raise Http404
+    return [comment_event(comment) for comment in comments], cursor is None
+
+
+def get_stream_start(news_id, cursor):
+    """
+    Первые события потока и признак того, что пропущенного больше нет.
+
+    С курсором это порция комментариев после него. Без курсора поток
+    начинается с последнего комментария: отдаётся только его курсор
+    в поле id, без данных, и EventSource переподключится с ним.
+    """
+    if cursor:
+        return get_backlog(news_id, cursor)
+    latest = Comment.objects.filter(news_id=news_id).order_by(
+        '-created', '-pk'
+    ).only('created').first()
+    if latest is None:
+        if not News.objects.filter(pk=news_id).exists():
+            raise Http404
+        return [], True
+    key = (latest.created, latest.pk)
+    return [(key, f'id: {encode_cursor(latest)}\n\n'.encode())], True
+
+
+def stream_served(request):
+    """Запрос пришёл через CommentStreamApp, и поток держит соединение."""
+    return getattr(request, 'scope', {}).get(STREAM_SCOPE_KEY, False)
+
+
+class Subscription:
+    """Очередь событий одного подключения."""
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        """Вызывается только в цикле событий подписчика."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+
+class CommentBroker:
+    """
+    Рассылка новых комментариев подписчикам в пределах процесса.
+
+    Подписчики живут в цикле событий ASGI, а комментарии сохраняются
+    в синхронных потоках, поэтому события передаются в цикл через
+    call_soon_threadsafe — один вызов на цикл, а не на подписчика.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    @contextmanager
+    def subscribe(self, news_id):
+        subscription = Subscription(
+            asyncio.get_running_loop(),
+            settings.NEWS_COMMENT_STREAM_QUEUE_SIZE,
+        )
+        with self._lock:
+            self._subscriptions[news_id].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[news_id].discard(subscription)
+                if not self._subscriptions[news_id]:
+                    del self._subscriptions[news_id]
+
+    def has_subscribers(self, news_id):
+        return news_id in self._subscriptions
+
+    def publish(self, news_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(news_id, ()))
+        by_loop = defaultdict(list)
+        for subscription in subscriptions:
+            by_loop[subscription.loop].append(subscription)
+        for loop, subscriptions in by_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._deliver, subscriptions, event)
+
+    @staticmethod
+    def _deliver(subscriptions, event):
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+broker = CommentBroker()
+
+
+def publish_comment(comment):
+    """Отправляем комментарий подписчикам, если они есть."""
+    if broker.has_subscribers(comment.news_id):
+        broker.publish(comment.news_id, comment_event(comment))
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_status(send, status):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+    })
+    await send({
+        'type': 'http.response.body',
+        'body': HTTPStatus(status).phrase.encode(),
+    })
+
+
+class CommentStreamApp:
+    """
+    ASGI-приложение с потоком новых комментариев к новости (SSE).
+
+    В Django 3.2 StreamingHttpResponse под ASGI читается синхронно
+    и занимает цикл событий, поэтому поток обслуживается здесь,
+    а остальные запросы передаются приложению Django.
+    Подключение — это корутина и очередь, а не поток ОС,
+    поэтому процесс удерживает тысячи открытых потоков.
+
+    Без курсора поток начинается с последнего комментария. С курсором
+    сначала отдаётся одна порция пропущенного; если за ней есть ещё,
+    поток закрывается, и EventSource переподключится за следующей
+    с Last-Event-ID, не загружая всё обсуждение за один раз.
+    Остальные запросы получают в scope отметку STREAM_SCOPE_KEY:
+    по ней страница новости подключает EventSource.
+    """
+
+    def __init__(self, application, comment_broker=broker):
+        self.application = application
+        self.broker = comment_broker
+
+    async def __call__(self, scope, receive, send):
+        match = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = STREAM_PATH.match(scope['path'])
+        if match is None:
+            return await self.application(
+                {**scope, STREAM_SCOPE_KEY: True}, receive, send
+            )
+        await self.stream(int(match['pk']), scope, receive, send)
+
+    @staticmethod
+    def get_cursor(scope):
+        """Курсор из Last-Event-ID при переподключении или из ?after."""
+        headers = dict(scope['headers'])
+        if b'last-event-id' in headers:
+            return headers[b'last-event-id'].decode('latin-1')
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        return query.get('after', [''])[0]
+
+    async def stream(self, news_id, scope, receive, send):
+        cursor = self.get_cursor(scope)
+        # Подписываемся до загрузки пропущенного, чтобы не потерять
+        # комментарии, сохранённые между запросом и подпиской.
+        with self.broker.subscribe(news_id) as subscription:
+            try:
+                last = decode_cursor(cursor) if cursor else None
+                backlog, complete = await sync_to_async(get_stream_start)(
+                    news_id, cursor
+                )
+            except Http404:
+                return await send_status(send, HTTPStatus.NOT_FOUND)
+            except BadRequest:
+                return await send_status(send, HTTPStatus.BAD_REQUEST)
+            await send({
+                'type': 'http.response.start',
+                'status': HTTPStatus.OK,
+                'headers': [
+                    (b'content-type', STREAM_CONTENT_TYPE.encode()),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            chunks = [stream_preamble()]
+            for last, chunk in backlog:
+                chunks.append(chunk)
+            await send({
+                'type': 'http.response.body',
+                'body': b''.join(chunks),
+                'more_body': complete,
+            })
+            if complete:
+                await self.relay(subscription, last, receive, send)
+
+    async def relay(self, subscription, last, receive, send):
+        """Пересылаем события из очереди, пока клиент подключён."""
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        event = None
+        try:
+            while True:
+                if event is None:
+                    event = asyncio.ensure_future(subscription.queue.get())
+                done, _ = await asyncio.wait(
+                    {event, disconnect},
+                    timeout=settings.NEWS_COMMENT_STREAM_HEARTBEAT,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    return
+                if event not in done:
+                    chunk = HEARTBEAT
+                else:
+                    item, event = event.result(), None
+                    if item is OVERFLOW:
+                        break
+                    key, chunk = item
+                    if last is not None and key <= last:
+                        continue
+                    last = key
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        finally:
+            disconnect.cancel()
+            if event is not None:
+                event.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
@@ -0,0 +1,93 @@
+import datetime
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Comment, News, TrendingScore, TrendingState
+
+
+def decay(seconds):
+    """Во сколько раз уменьшается вес комментария за это время."""
+    return 0.5 ** (max(seconds, 0) / settings.NEWS_TRENDING_HALF_LIFE)
+
+
+def get_horizon():
+    """
+    Возраст, после которого комментарий весит меньше
+    NEWS_TRENDING_MIN_SCORE и на рейтинг не влияет.
+    """
+    return settings.NEWS_TRENDING_HALF_LIFE * math.log2(
+        1 / settings.NEWS_TRENDING_MIN_SCORE
+    )
+
+
+def update_trending(now=None, rebuild=False, chunk_size=2000):
+    """
+    Пополняем рейтинг комментариями, добавленными после прошлого запуска.
+
+    Сохранённые оценки сначала уменьшаются пропорционально прошедшему
+    времени одним запросом UPDATE, затем к ним прибавляются веса новых
+    комментариев. Новости, оценка которых опустилась ниже
+    NEWS_TRENDING_MIN_SCORE, из таблицы удаляются, поэтому она
+    содержит только новости с недавними обсуждениями.
+    Удалённые комментарии не вычитаются: их учитывает rebuild.
+    Возвращает количество учтённых комментариев.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        state = TrendingState.objects.select_for_update().first()
+        if state is None:
+            state = TrendingState()
+        if rebuild:
+            TrendingScore.objects.all().delete()
+            state.last_comment_id = 0
+        elif state.computed_at is not None:
+            elapsed = (now - state.computed_at).total_seconds()
+            TrendingScore.objects.update(score=F('score') * decay(elapsed))
+        last_comment_id = Comment.objects.aggregate(last=Max('pk'))['last']
+        comments = Comment.objects.filter(
+            pk__gt=state.last_comment_id,
+            pk__lte=last_comment_id or 0,
+            created__gte=now - datetime.timedelta(seconds=get_horizon()),
+        ).order_by().values_list('news_id', 'created')
+        gains = defaultdict(float)
+        counted = 0
+        for news_id, created in comments.iterator(chunk_size=chunk_size):
+            gains[news_id] += decay((now - created).total_seconds())
+            counted += 1
+        if last_comment_id is not None:
+            state.last_comment_id = last_comment_id
+        add_scores(gains)
+        TrendingScore.objects.filter(
+            score__lt=settings.NEWS_TRENDING_MIN_SCORE
+        ).delete()
+        state.computed_at = now
+        state.save()
+    return counted
+
+
+def add_scores(gains):
+    """Прибавляем веса к оценкам новостей, создавая недостающие."""
+    scores = TrendingScore.objects.in_bulk(list(gains))
+    for news_id, score in scores.items():
+        score.score += gains.pop(news_id)
+    TrendingScore.objects.bulk_update(scores.values(), ('score',))
+    TrendingScore.objects.bulk_create(
+        TrendingScore(news_id=news_id, score=score)
+        for news_id, score in gains.items()
+    )
+
+
+def get_trending_state():
+    return TrendingState.objects.only('computed_at').first()
+
+
+def get_trending_news():
+    """Самые обсуждаемые новости одним запросом по индексу рейтинга."""
+    return News.objects.filter(trending__isnull=False).order_by(
+        '-trending__score', 'trending__news_id'
+    )[:settings.NEWS_COUNT_ON_TRENDING_PAGE]
@@ -1,16 +1,58 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
 app_name = 'news'
 
+if settings.NEWS_ASYNC_VIEWS:
+    news_list = views.AsyncNewsList
+    news_detail = views.AsyncNewsDetailView
+    news_comments = views.AsyncNewsCommentsPage
+else:
+    news_list = views.NewsList
+    news_detail = views.NewsDetailView
+    news_comments = views.NewsCommentsPage
+
 urlpatterns = [
-    path('', views.NewsList.as_view(), name='home'),
-    path('news/<int:pk>/', views.NewsDetailView.as_view(), name='detail'),
+    path('', news_list.as_view(), name='home'),
+    path('search/', views.NewsSearch.as_view(), name='search'),
+    path('trending/', views.NewsTrending.as_view(), name='trending'),
+    path(
+        'archive/<int:year>/',
+        views.NewsYearArchive.as_view(),
+        name='archive_year'
+    ),
+    path(
+        'archive/<int:year>/<int:month>/',
+        views.NewsMonthArchive.as_view(),
+        name='archive_month'
+    ),
+    path(
+        'archive/<int:year>/<int:month>/<int:day>/',
+        views.NewsDayArchive.as_view(),
+        name='archive_day'
+    ),
+    path('news/<int:pk>/', news_detail.as_view(), name='detail'),
+    path(
+        'news/<int:pk>/comments/',
+        news_comments.as_view(),
+        name='comments'
+    ),
+    path(
+        'news/<int:pk>/stream/',
+        views.NewsCommentStream.as_view(),
+        name='stream'
+    ),
     path(
         'delete_comment/<int:pk>/',
         views.CommentDelete.as_view(),
         name='delete'
     ),
     path('edit_comment/<int:pk>/', views.CommentUpdate.as_view(), name='edit'),
+    path(
+        'moderate_comments/',
+        views.CommentModeration.as_view(),
+        name='moderate'
+    ),
 ]
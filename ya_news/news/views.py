@@ -1,14 +1,89 @@
+import asyncio
+import functools
+import hashlib
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.shortcuts import get_object_or_404
+from django.contrib.auth.mixins import (
+    LoginRequiredMixin, PermissionRequiredMixin
+)
+from django.db import transaction
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django.views import generic
 
-from .forms import CommentForm
+from . import comment_queue
+from .cache import get_detail_version, get_feed_version
+from .forms import CommentForm, CommentModerationForm
 from .models import Comment, News
+from .pagination import get_comments_page, get_stream_cursor
+from .search import search_news
+from .stream import (
+    STREAM_CONTENT_TYPE, get_stream_start, stream_preamble, stream_served
+)
+from .trending import get_trending_news, get_trending_state
+
+
+def add_validators(response, etag, last_modified):
+    """Заголовки ETag и Last-Modified, если представление их не задало."""
+    if etag and not response.has_header('ETag'):
+        response.headers['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Ответ 304 Not Modified без отрисовки шаблона.
+
+    Валидаторы вычисляются до обработки запроса, поэтому
+    get_etag() и get_last_modified() должны быть дешёвыми.
+    Работает и с асинхронными представлениями.
+    """
+
+    def get_etag(self):
+        return None
+
+    def get_last_modified(self):
+        return None
+
+    def get_session_tag(self):
+        """
+        Страницы отличаются для разных пользователей. Берём хеш cookie
+        сессии, а не пользователя: это не требует запросов к базе.
+        """
+        session_key = self.request.COOKIES.get(
+            settings.SESSION_COOKIE_NAME, ''
+        )
+        return hashlib.sha256(session_key.encode()).hexdigest()[:16]
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag()
+        etag = quote_etag(etag) if etag else None
+        last_modified = self.get_last_modified()
+        if last_modified:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            return self.add_validators_async(response, etag, last_modified)
+        return add_validators(response, etag, last_modified)
+
+    @staticmethod
+    async def add_validators_async(response, etag, last_modified):
+        return add_validators(await response, etag, last_modified)
 
 
-class NewsList(generic.ListView):
+class NewsList(ConditionalGetMixin, generic.ListView):
     """Список новостей."""
     model = News
     template_name = 'news/home.html'
@@ -19,30 +94,176 @@ class NewsList(generic.ListView):
         Выводим только несколько последних новостей.
 
         Их количество определяется в настройках проекта.
+        Количество комментариев хранится в самой новости,
+        комментарии не загружаются и не считаются.
+        Новости за один день идут в порядке добавления.
         """
-        return self.model.objects.prefetch_related(
-            'comments'
+        return self.model.objects.order_by(
+            '-date', 'pk'
         )[:settings.NEWS_COUNT_ON_HOME_PAGE]
 
+    def get_context_data(self, **kwargs):
+        """
+        Передаём в шаблон параметры кэширования ленты.
+
+        Queryset ленты ленивый: если фрагмент найден в кэше,
+        запрос к базе данных не выполняется.
+        """
+        context = super().get_context_data(**kwargs)
+        context['feed_cache'] = settings.NEWS_FEED_CACHE
+        context['feed_cache_timeout'] = settings.NEWS_FEED_CACHE_TIMEOUT
+        context['feed_version'] = get_feed_version()
+        return context
+
+    def get_etag(self):
+        """Лента меняется вместе с её версией в кэше."""
+        return f'feed-{get_feed_version()}-{self.get_session_tag()}'
 
-class NewsDetail(generic.DetailView):
+
+class NewsArchiveMixin:
+    """Общие настройки архива новостей."""
+    model = News
+    date_field = 'date'
+    month_format = '%m'
+    ordering = ('-date', '-id')
+    template_name = 'news/archive.html'
+
+    def get_paginate_by(self, queryset):
+        return settings.NEWS_COUNT_ON_ARCHIVE_PAGE
+
+
+class NewsYearArchive(NewsArchiveMixin, generic.YearArchiveView):
+    """Новости за год."""
+    make_object_list = True
+
+
+class NewsMonthArchive(NewsArchiveMixin, generic.MonthArchiveView):
+    """Новости за месяц."""
+
+
+class NewsDayArchive(NewsArchiveMixin, generic.DayArchiveView):
+    """Новости за день."""
+
+
+class NewsTrending(ConditionalGetMixin, generic.ListView):
+    """
+    Самые обсуждаемые новости.
+
+    Рейтинг заранее рассчитывает команда news_trending,
+    страница только читает его по индексу.
+    """
+    template_name = 'news/trending.html'
+    context_object_name = 'news_feed'
+
+    def get_queryset(self):
+        return get_trending_news()
+
+    def get_etag(self):
+        """Рейтинг меняется при пересчёте, заголовки — вместе с лентой."""
+        state = get_trending_state()
+        computed_at = state.computed_at.timestamp() if state else 0
+        return (
+            f'trending-{computed_at}-{get_feed_version()}-'
+            f'{self.get_session_tag()}'
+        )
+
+
+class NewsSearch(generic.ListView):
+    """Поиск по новостям и, по желанию, по комментариям к ним."""
+    template_name = 'news/search.html'
+    context_object_name = 'results'
+
+    def get_queryset(self):
+        return search_news(
+            self.request.GET.get('q', ''),
+            settings.NEWS_SEARCH_LIMIT,
+            with_comments=bool(self.request.GET.get('comments')),
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        context['with_comments'] = bool(self.request.GET.get('comments'))
+        return context
+
+
+class NewsDetail(ConditionalGetMixin, generic.DetailView):
     model = News
     template_name = 'news/detail.html'
 
-    def get_object(self, queryset=None):
-        obj = get_object_or_404(
-            self.model.objects.prefetch_related('comments__author'),
-            pk=self.kwargs['pk']
+    def get_etag(self):
+        """Версия страницы хранится в кэше, запросов к базе нет."""
+        return (
+            f'news-{self.kwargs["pk"]}-'
+            f'{get_detail_version(self.kwargs["pk"])}-'
+            f'{self.get_session_tag()}'
         )
-        return obj
+
+    def get_object(self, queryset=None):
+        return get_object_or_404(self.model, pk=self.kwargs['pk'])
 
     def get_context_data(self, **kwargs):
+        """На странице выводится только первая порция комментариев."""
         context = super().get_context_data(**kwargs)
+        context['comments'], context['next_cursor'] = get_comments_page(
+            self.object.pk
+        )
+        context['live_comments'] = stream_served(self.request)
+        if context['live_comments']:
+            context['stream_cursor'] = get_stream_cursor(
+                self.object.pk, context['comments'], context['next_cursor']
+            )
+        context['previous_news'], context['next_news'] = (
+            self.object.get_neighbours()
+        )
         if self.request.user.is_authenticated:
             context['form'] = CommentForm()
         return context
 
 
+class NewsCommentsPage(generic.TemplateView):
+    """Следующая порция комментариев к новости («Показать ещё»)."""
+    template_name = 'news/includes/comments.html'
+
+    def get_context_data(self, **kwargs):
+        comments, next_cursor = get_comments_page(
+            self.kwargs['pk'], self.request.GET.get('after')
+        )
+        if not comments and not News.objects.filter(
+                pk=self.kwargs['pk']
+        ).exists():
+            raise Http404
+        return {
+            'news_id': self.kwargs['pk'],
+            'comments': comments,
+            'next_cursor': next_cursor,
+        }
+
+
+class NewsCommentStream(generic.View):
+    """
+    Новые комментарии к новости в формате Server-Sent Events.
+
+    Под ASGI этот адрес обслуживает news.stream.CommentStreamApp,
+    удерживая соединение. Здесь, как и там, отдаётся порция
+    комментариев после курсора или, без курсора, курсор последнего
+    комментария, и соединение закрывается. Страница новости без
+    CommentStreamApp EventSource не подключает, поэтому адрес
+    опрашивают только сторонние клиенты.
+    """
+
+    def get(self, request, *args, **kwargs):
+        cursor = (
+            request.headers.get('Last-Event-ID') or request.GET.get('after')
+        )
+        events, _ = get_stream_start(self.kwargs['pk'], cursor)
+        return HttpResponse(
+            b''.join([stream_preamble(), *(chunk for _, chunk in events)]),
+            content_type=STREAM_CONTENT_TYPE,
+            headers={'Cache-Control': 'no-cache'},
+        )
+
+
 class NewsComment(
     LoginRequiredMixin,
     generic.detail.SingleObjectMixin,
@@ -56,11 +277,35 @@ class NewsComment(
         self.object = self.get_object()
         return super().post(request, *args, **kwargs)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['comments'], context['next_cursor'] = get_comments_page(
+            self.object.pk
+        )
+        context['live_comments'] = stream_served(self.request)
+        if context['live_comments']:
+            context['stream_cursor'] = get_stream_cursor(
+                self.object.pk, context['comments'], context['next_cursor']
+            )
+        return context
+
     def form_valid(self, form):
+        """
+        Комментарий и счётчик новости, который обновляет сигнал
+        post_save, сохраняются в одной транзакции.
+
+        С NEWS_COMMENT_WRITE_QUEUE комментарий записывает поток
+        comment_queue.writer, а ответ отправляется сразу.
+        Переполненная очередь не теряет комментарий:
+        он сохраняется в запросе, как обычно.
+        """
         comment = form.save(commit=False)
         comment.news = self.object
         comment.author = self.request.user
-        comment.save()
+        if not (settings.NEWS_COMMENT_WRITE_QUEUE
+                and comment_queue.writer.submit(comment)):
+            with transaction.atomic():
+                comment.save()
         return super().form_valid(form)
 
     def get_success_url(self):
@@ -79,19 +324,120 @@ class NewsDetailView(generic.View):
         return view(request, *args, **kwargs)
 
 
-class CommentBase(LoginRequiredMixin):
+class AsyncViewMixin:
+    """
+    Асинхронная версия представления для чтения под ASGI.
+
+    В Django 3.2 нет асинхронного ORM, поэтому все запросы к базе,
+    включая загрузку пользователя, выполняются за один переход
+    в синхронный поток, а шаблон отрисовывается уже в цикле событий.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        """
+        Django 3.2 определяет асинхронное представление по функции,
+        которую возвращает as_view(), поэтому оборачиваем её в корутину.
+        """
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+            return response
+
+        functools.update_wrapper(async_view, view)
+        return async_view
+
+    async def get(self, request, *args, **kwargs):
+        context = await sync_to_async(self.load_context)()
+        return render(request, self.get_template_names(), context)
+
+    def load_context(self):
+        """Контекст шаблона без ленивых обращений к базе."""
+        # Ленивый request.user загружается из базы здесь,
+        # а не при отрисовке шаблона.
+        self.request.user.is_authenticated
+        return self.get_context_data(**self.kwargs)
+
+
+class AsyncNewsList(AsyncViewMixin, NewsList):
+    """
+    Список новостей для ASGI.
+
+    Лента загружается всегда: обратиться к базе во время
+    отрисовки, при промахе кэша фрагмента, здесь уже нельзя.
+    """
+
+    def load_context(self):
+        self.object_list = list(self.get_queryset())
+        return super().load_context()
+
+
+class AsyncNewsDetail(AsyncViewMixin, NewsDetail):
+    """Страница новости для ASGI."""
+
+    def load_context(self):
+        self.object = self.get_object()
+        return super().load_context()
+
+
+class AsyncNewsCommentsPage(AsyncViewMixin, NewsCommentsPage):
+    """Порция комментариев к новости для ASGI."""
+
+
+class AsyncNewsDetailView(AsyncViewMixin, NewsDetailView):
+    """Страница новости для ASGI; комментарий сохраняется синхронно."""
+
+    async def get(self, request, *args, **kwargs):
+        view = AsyncNewsDetail.as_view()
+        return await view(request, *args, **kwargs)
+
+    async def post(self, request, *args, **kwargs):
+        view = sync_to_async(NewsComment.as_view())
+        return await view(request, *args, **kwargs)
+
+
+class SingleFetchMixin:
+    """
+    Объект загружается из базы один раз за запрос.
+
+    Повторный вызов get_object() возвращает уже загруженный объект.
+    Связанные объекты из display_related нужны только шаблону,
+    поэтому присоединяются через select_related лишь при показе
+    страницы, а не при сохранении или удалении.
+    """
+    display_related = ()
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if '_fetched_object' not in self.__dict__:
+            self._fetched_object = super().get_object()
+        return self._fetched_object
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.display_related and self.request.method in ('GET', 'HEAD'):
+            queryset = queryset.select_related(*self.display_related)
+        return queryset
+
+
+class CommentBase(LoginRequiredMixin, SingleFetchMixin):
     """Базовый класс для работы с комментариями."""
     model = Comment
+    display_related = ('news',)
 
     def get_success_url(self):
-        comment = self.get_object()
+        """Новость не загружается: для адреса достаточно news_id."""
         return reverse(
-            'news:detail', kwargs={'pk': comment.news.pk}
+            'news:detail', kwargs={'pk': self.object.news_id}
         ) + '#comments'
 
     def get_queryset(self):
         """Пользователь может работать только со своими комментариями."""
-        return self.model.objects.filter(author=self.request.user)
+        return super().get_queryset().filter(author=self.request.user)
 
 
 class CommentUpdate(CommentBase, generic.UpdateView):
@@ -103,3 +449,23 @@ class CommentUpdate(CommentBase, generic.UpdateView):
 class CommentDelete(CommentBase, generic.DeleteView):
     """Удаление комментария."""
     template_name = 'news/delete.html'
+
+    def delete(self, request, *args, **kwargs):
+        """
+        Счётчик комментариев новости уменьшается сигналом post_delete
+        в той же транзакции, что и удаление.
+        """
+        with transaction.atomic():
+            return super().delete(request, *args, **kwargs)
+
+
+class CommentModeration(PermissionRequiredMixin, generic.FormView):
+    """Массовое удаление или скрытие комментариев."""
+    template_name = 'news/moderation.html'
+    form_class = CommentModerationForm
+    permission_required = ('news.change_comment', 'news.delete_comment')
+
+    def form_valid(self, form):
+        return self.render_to_response(
+            self.get_context_data(form=form, affected=form.moderate())
+        )
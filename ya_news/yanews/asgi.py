@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanews.settings')
 
 application = get_asgi_application()
+
+# Поток новых комментариев обслуживается в обход обработчика Django.
+from news.stream import CommentStreamApp  # noqa: E402
+
+application = CommentStreamApp(application)
@@ -0,0 +1,346 @@
+# Копия этого модуля — ya_note/yanote/profiling.py:
+# проекты запускаются отдельно, поэтому исправления вносятся
+# и проверяются тестами в обоих.
+
+import asyncio
+import bisect
+import cProfile
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+SESSION_TABLE = 'django_session'
+# Границы корзин гистограмм времени, с, и числа SQL-запросов.
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'),
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, float('inf'))
+HISTOGRAM_SLOTS = 10
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Замеры одного запроса: SQL, отрисовка шаблонов и общее время."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.session_time = 0.0
+        self.template_time = 0.0
+        self.template_started = None
+        self.total = None
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing, длительности в мс."""
+        return ', '.join((
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} SQL"',
+            f'session;dur={self.session_time * 1000:.1f}',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обёртка курсора на время запроса, попавшего в выборку.
+    Вложенные запросы без выборки её не видят: профиль берётся
+    из контекста запроса.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        profile.queries += 1
+        profile.sql_time += elapsed
+        if SESSION_TABLE in sql:
+            profile.session_time += elapsed
+
+
+def wrap_connections():
+    """
+    Ставит record_query на соединения текущего потока через
+    execute_wrapper: обёртка снимается при закрытии стека, не нарушая
+    порядок обёрток, поставленных вызывающим кодом.
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record_query))
+    return stack
+
+
+class RollingHistogram:
+    """
+    Гистограмма за последние window секунд.
+
+    Окно разбито на HISTOGRAM_SLOTS интервалов; устаревший интервал
+    обнуляется при первой записи в него, поэтому старые значения
+    вытесняются без отдельного таймера.
+    """
+
+    def __init__(self, window, buckets):
+        self.buckets = buckets
+        self.slot_seconds = window / HISTOGRAM_SLOTS
+        self.epochs = [None] * HISTOGRAM_SLOTS
+        self.counts = [[0] * len(buckets) for _ in range(HISTOGRAM_SLOTS)]
+        self.sums = [0.0] * HISTOGRAM_SLOTS
+
+    def add(self, value, now):
+        epoch = int(now // self.slot_seconds)
+        index = epoch % HISTOGRAM_SLOTS
+        if self.epochs[index] != epoch:
+            self.epochs[index] = epoch
+            self.counts[index] = [0] * len(self.buckets)
+            self.sums[index] = 0.0
+        self.counts[index][bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[index] += value
+
+    def merged(self, now):
+        """Корзины и сумма значений по интервалам внутри окна."""
+        oldest = int(now // self.slot_seconds) - HISTOGRAM_SLOTS
+        counts = [0] * len(self.buckets)
+        total = 0.0
+        for index, epoch in enumerate(self.epochs):
+            if epoch is not None and epoch > oldest:
+                counts = [a + b for a, b in zip(counts, self.counts[index])]
+                total += self.sums[index]
+        return counts, total
+
+    def summary(self, now, scale=1):
+        """Число значений, среднее и квантили, умноженные на scale."""
+        counts, total = self.merged(now)
+        count = sum(counts)
+        if not count:
+            return {'count': 0}
+        return {
+            'count': count,
+            'mean': round(total / count * scale, 2),
+            **{
+                f'p{int(share * 100)}': round(
+                    self.quantile(counts, count, share) * scale, 2
+                )
+                for share in (0.5, 0.95, 0.99)
+            },
+        }
+
+    def quantile(self, counts, count, share):
+        """Квантиль с линейной интерполяцией внутри корзины."""
+        rank = share * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-2]
+
+
+class ViewStats:
+    """Скользящие гистограммы одного представления."""
+
+    def __init__(self, window):
+        self.total = RollingHistogram(window, TIME_BUCKETS)
+        self.sql = RollingHistogram(window, TIME_BUCKETS)
+        self.templates = RollingHistogram(window, TIME_BUCKETS)
+        self.queries = RollingHistogram(window, QUERY_BUCKETS)
+
+    def add(self, profile, now):
+        self.total.add(profile.total, now)
+        self.sql.add(profile.sql_time, now)
+        self.templates.add(profile.template_time, now)
+        self.queries.add(profile.queries, now)
+
+    def summary(self, now):
+        """Время в миллисекундах, число SQL-запросов — штуками."""
+        return {
+            'total_ms': self.total.summary(now, scale=1000),
+            'sql_ms': self.sql.summary(now, scale=1000),
+            'templates_ms': self.templates.summary(now, scale=1000),
+            'queries': self.queries.summary(now),
+        }
+
+
+class ProfileStore:
+    """Статистика представлений процесса и самые медленные запросы."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+        self.slowest = []
+        self.sequence = itertools.count()
+
+    def add(self, view_name, profile):
+        now = time.monotonic()
+        with self.lock:
+            stats = self.views.get(view_name)
+            if stats is None:
+                stats = self.views[view_name] = ViewStats(
+                    settings.PROFILING_HISTOGRAM_WINDOW
+                )
+            stats.add(profile, now)
+
+    def snapshot(self):
+        """Сводка по представлениям за окно гистограмм."""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                name: stats.summary(now)
+                for name, stats in sorted(self.views.items())
+            }
+
+    def keep_profile(self, view_name, profile, profiler):
+        """
+        Сохраняет профиль cProfile, если запрос входит
+        в PROFILING_CPROFILE_SLOWEST самых медленных.
+        """
+        limit = settings.PROFILING_CPROFILE_SLOWEST
+        with self.lock:
+            if len(self.slowest) >= limit:
+                if profile.total <= self.slowest[0][0]:
+                    return None
+                _, _, evicted = heapq.heappop(self.slowest)
+            else:
+                evicted = None
+            directory = Path(settings.PROFILING_CPROFILE_DIR)
+            path = directory / (
+                f'{profile.total * 1000:09.1f}ms-'
+                f'{view_name.replace(":", "-")}-{os.getpid()}-'
+                f'{next(self.sequence)}.prof'
+            )
+            heapq.heappush(self.slowest, (profile.total, path.name, path))
+        if evicted is not None:
+            evicted.unlink(missing_ok=True)
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
+        return path
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+            self.slowest.clear()
+
+
+store = ProfileStore()
+# cProfile профилирует один запрос за раз: профилировщик
+# в Python один на интерпретатор.
+_profiler_lock = threading.Lock()
+
+
+class ProfilingMiddleware:
+    """
+    Замеряет долю PROFILING_SAMPLE_RATE запросов.
+
+    Для попавших в выборку запросов считает SQL-запросы и их время,
+    время отрисовки шаблонов и общее время, добавляет их в заголовок
+    Server-Timing и в скользящие гистограммы представления. Остальные
+    запросы проходят без замеров. Ставится первым в MIDDLEWARE,
+    чтобы общее время включало остальные промежуточные слои.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile, token = self.start()
+        profiler = self.start_profiler()
+        try:
+            with wrap_connections():
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _profiler_lock.release()
+            _current.reset(token)
+        return self.finish(request, response, profile, profiler)
+
+    async def __acall__(self, request):
+        # cProfile под ASGI не включается: он видит только поток
+        # цикла событий, а представления работают в других потоках.
+        if not self.sampled():
+            return await self.get_response(request)
+        profile, token = self.start()
+        # ORM под ASGI работает в потоке sync_to_async со своими
+        # соединениями: обёртки ставятся и снимаются в нём же.
+        stack = await sync_to_async(wrap_connections)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            _current.reset(token)
+        return self.finish(request, response, profile, None)
+
+    def process_template_response(self, request, response):
+        """Шаблон отрисовывается сразу после этого вызова."""
+        profile = _current.get()
+        if profile is not None:
+            profile.template_started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: self.rendered(profile)
+            )
+        return response
+
+    @staticmethod
+    def rendered(profile):
+        profile.template_time += (
+            time.perf_counter() - profile.template_started
+        )
+
+    @staticmethod
+    def sampled():
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @staticmethod
+    def start():
+        profile = RequestProfile()
+        return profile, _current.set(profile)
+
+    @staticmethod
+    def start_profiler():
+        if not (
+            settings.PROFILING_CPROFILE_SLOWEST
+            and _profiler_lock.acquire(blocking=False)
+        ):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    @staticmethod
+    def finish(request, response, profile, profiler):
+        profile.total = time.perf_counter() - profile.started
+        match = request.resolver_match
+        view_name = match.view_name if match else '<unresolved>'
+        store.add(view_name, profile)
+        if profiler is not None:
+            store.keep_profile(view_name, profile, profiler)
+        response['Server-Timing'] = profile.server_timing()
+        return response
@@ -0,0 +1,112 @@
+# Копия этого модуля — ya_note/yanote/routers.py:
+# проекты запускаются отдельно, поэтому исправления вносятся
+# и проверяются тестами в обоих.
+
+import asyncio
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+PRIMARY_COOKIE_NAME = 'use_primary_db'
+
+_request_state = ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    """Состояние маршрутизации запросов к базе в рамках одного запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+class ReplicaRouter:
+    """
+    Чтение идёт с реплики, запись — в основную базу.
+
+    Чтение остаётся на основной базе внутри транзакции, чтобы видеть
+    собственные незафиксированные изменения, и в течение
+    DATABASE_PRIMARY_STICKY_SECONDS после записи в том же сеансе,
+    чтобы реплика с задержкой не «теряла» только что созданные данные.
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        state = _request_state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Закрепляет чтение сеанса за основной базой после записи.
+
+    Срок закрепления хранится в cookie, а не в сессии: сессия сама
+    читается из базы и могла ещё не дойти до реплики.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState(pinned=self.is_pinned(request))
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = RoutingState(pinned=self.is_pinned(request))
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    @staticmethod
+    def process_response(state, response):
+        if state.wrote:
+            sticky_seconds = settings.DATABASE_PRIMARY_STICKY_SECONDS
+            response.set_cookie(
+                PRIMARY_COOKIE_NAME,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+    @staticmethod
+    def is_pinned(request):
+        try:
+            return float(request.COOKIES[PRIMARY_COOKIE_NAME]) > time.time()
+        except (KeyError, ValueError):
+            return False
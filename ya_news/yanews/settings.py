@@ -21,7 +21,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yanews.metrics.MetricsMiddleware',
+    'yanews.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yanews.routers.PrimaryStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,10 +53,47 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yanews.wsgi.application'
 
+# Каждое соединение с SQLite настраивается через PRAGMA:
+# WAL позволяет читать во время записи, busy_timeout — ждать
+# освобождения блокировки, а не сразу получать «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yanews.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TRANSACTION_MODE': 'IMMEDIATE',
+    },
+    # Реплика для чтения. По умолчанию это тот же файл, открытый
+    # только для чтения; для настоящей реплики укажите в NAME
+    # копию базы, которую поддерживает репликация (например, Litestream).
+    'replica': {
+        'ENGINE': 'yanews.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'PRAGMAS': {**SQLITE_PRAGMAS, 'query_only': 'ON'},
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['yanews.routers.ReplicaRouter']
+
+# Сколько секунд после записи сеанс читает из основной базы.
+DATABASE_PRIMARY_STICKY_SECONDS = 5
+
+# LocMemCache из yanews.metrics считает попадания и промахи
+# для /metrics. Для нескольких процессов подойдёт общий бэкенд,
+# например django.core.cache.backends.filebased.FileBasedCache
+# или django.core.cache.backends.db.DatabaseCache.
+CACHES = {
+    'default': {
+        'BACKEND': 'yanews.metrics.LocMemCache',
     }
 }
 
@@ -77,3 +117,73 @@ LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('news:home')
 
 NEWS_COUNT_ON_HOME_PAGE = 10
+COMMENTS_COUNT_ON_DETAIL_PAGE = 50
+NEWS_SEARCH_LIMIT = 20
+NEWS_COUNT_ON_ARCHIVE_PAGE = 20
+
+# Асинхронные представления ленты, новости и комментариев.
+# Включайте при запуске под ASGI (yanews.asgi): под WSGI каждый
+# такой запрос потребует отдельного цикла событий.
+NEWS_ASYNC_VIEWS = False
+
+# Поток новых комментариев: пауза между пустыми событиями, с;
+# интервал переподключения клиента, мс; очередь подписчика, событий.
+NEWS_COMMENT_STREAM_HEARTBEAT = 15
+NEWS_COMMENT_STREAM_RETRY = 3000
+NEWS_COMMENT_STREAM_QUEUE_SIZE = 100
+
+NEWS_FEED_CACHE = 'default'
+NEWS_FEED_CACHE_TIMEOUT = 60 * 15
+
+# Алгоритм поиска запрещённых слов: ключ news.matching.MATCHERS.
+NEWS_BAD_WORDS_MATCHER = 'aho_corasick'
+# Файл с дополнительными запрещёнными словами, по одному в строке.
+NEWS_BAD_WORDS_FILE = None
+
+# Рейтинг обсуждаемых новостей: вес комментария уменьшается вдвое
+# за NEWS_TRENDING_HALF_LIFE секунд, новости с оценкой ниже
+# NEWS_TRENDING_MIN_SCORE в рейтинг не попадают.
+NEWS_TRENDING_HALF_LIFE = 60 * 60 * 6
+NEWS_TRENDING_MIN_SCORE = 0.05
+NEWS_COUNT_ON_TRENDING_PAGE = 10
+
+# Запись комментариев через очередь: запрос не ждёт базу, поток
+# записывает комментарии пачками по размеру или по времени, с.
+# Журнал в NEWS_COMMENT_QUEUE_JOURNAL_DIR сохраняет принятые
+# комментарии при аварийном завершении процесса; с FSYNC — и при
+# сбое ОС, ценой fsync на каждый комментарий. Журнал блокирует
+# файлы через flock и работает только в POSIX.
+NEWS_COMMENT_WRITE_QUEUE = False
+NEWS_COMMENT_QUEUE_BATCH_SIZE = 100
+NEWS_COMMENT_QUEUE_FLUSH_INTERVAL = 0.05
+NEWS_COMMENT_QUEUE_MAX_SIZE = 10000
+NEWS_COMMENT_QUEUE_JOURNAL_DIR = None
+NEWS_COMMENT_QUEUE_FSYNC = True
+# Сколько раз повторить запись пачки при ошибке базы, прежде чем
+# писать комментарии по одному; незаписанные остаются в журнале.
+NEWS_COMMENT_QUEUE_RETRIES = 3
+
+# Профилирование запросов: замеряется доля PROFILING_SAMPLE_RATE
+# запросов, гистограммы представлений хранятся за последние
+# PROFILING_HISTOGRAM_WINDOW секунд. При PROFILING_CPROFILE_SLOWEST > 0
+# профили cProfile стольких самых медленных запросов под WSGI
+# сохраняются в PROFILING_CPROFILE_DIR.
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_HISTOGRAM_WINDOW = 60 * 5
+PROFILING_CPROFILE_SLOWEST = 0
+PROFILING_CPROFILE_DIR = BASE_DIR / 'profiles'
+
+# Метрики Prometheus на /metrics: адреса, с которых их можно читать
+# (None — с любых), и модели, записи которых считаются. Адрес берётся
+# из REMOTE_ADDR; за обратным прокси это адрес прокси, поэтому задайте
+# METRICS_CLIENT_IP_HEADER — заголовок, в который прокси пишет адрес
+# клиента (например 'HTTP_X_FORWARDED_FOR'), — или впишите адрес
+# прокси в METRICS_ALLOWED_IPS. Если обработчиков несколько, каждый
+# процесс раз в METRICS_FLUSH_INTERVAL секунд сохраняет свои значения
+# в METRICS_MULTIPROCESS_DIR, а /metrics складывает файлы всех
+# процессов. Директорию очищают перед запуском сервера.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_CLIENT_IP_HEADER = None
+METRICS_WRITE_MODELS = ['news.News', 'news.Comment']
+METRICS_MULTIPROCESS_DIR = None
+METRICS_FLUSH_INTERVAL = 1
@@ -0,0 +1,24 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite с настройкой каждого нового соединения.
+
+    В настройках базы данных дополнительно можно указать:
+    PRAGMAS — словарь PRAGMA, выполняемых при открытии соединения;
+    TRANSACTION_MODE — режим BEGIN для транзакций, например IMMEDIATE,
+    чтобы транзакция сразу брала блокировку записи и ждала её
+    по busy_timeout, а не падала с «database is locked» при попытке
+    повысить блокировку чтения.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
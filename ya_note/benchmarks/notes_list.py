@@ -0,0 +1,46 @@
+"""
+Замер времени открытия списка заметок при росте их числа.
+
+Запуск из директории ya_note:
+    python -m benchmarks.notes_list
+"""
+from benchmarks.utils import measure, setup_django
+
+SIZES = (100, 1000, 10000, 100000)
+BATCH_SIZE = 5000
+
+
+def main():
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+    from django.urls import reverse
+
+    from notes.models import Note
+
+    user = get_user_model().objects.create_user(username='power_user')
+    # Заметки другого пользователя, чтобы индекс работал не на пустой базе.
+    other = get_user_model().objects.create_user(username='other_user')
+    client = Client()
+    client.force_login(user)
+    url = reverse('notes:list')
+    text = 'Длинный текст заметки. ' * 200
+    created = 0
+    print('заметок', 'первая стр., мс', 'последняя стр., мс', sep='\t')
+    for size in SIZES:
+        for author in (user, other):
+            Note.objects.bulk_create(
+                (Note(title=f'Note {i}', text=text, slug=f'{author.pk}-{i}',
+                      author=author)
+                 for i in range(created, size)),
+                batch_size=BATCH_SIZE,
+            )
+        created = size
+        first_page = measure(lambda: client.get(url), number=20)
+        last_page = measure(lambda: client.get(url, {'page': 'last'}),
+                            number=20)
+        print(size, f'{first_page:.2f}', f'{last_page:.2f}', sep='\t')
+
+
+if __name__ == '__main__':
+    main()
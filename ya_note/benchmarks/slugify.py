@@ -0,0 +1,31 @@
+"""
+Замер стоимости одного вызова slugify.
+
+Запуск из директории ya_note:
+    python -m benchmarks.slugify
+"""
+from pytils.translit import slugify as pytils_slugify
+
+from benchmarks.utils import measure
+from notes.slugs import slugify
+
+TITLES = (
+    'Заметка',
+    'Список покупок на неделю: молоко, хлеб, яйца',
+    'Съешь же ещё этих мягких французских булок, да выпей чаю! ' * 2,
+)
+NUMBER = 20000
+
+
+def main():
+    print('длина', 'pytils, мкс', 'без кэша, мкс', 'из кэша, мкс', sep='\t')
+    for title in TITLES:
+        pytils_time = measure(lambda: pytils_slugify(title), NUMBER)
+        uncached = measure(lambda: slugify.__wrapped__(title), NUMBER)
+        cached = measure(lambda: slugify(title), NUMBER)
+        print(len(title), *(f'{timing * 1e3:.2f}' for timing in (
+            pytils_time, uncached, cached)), sep='\t')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import os
+import timeit
+
+
+def setup_django():
+    """
+    Настраиваем Django и создаём тестовую базу данных.
+
+    Замеры не должны трогать рабочую базу проекта. Реплика
+    подключается к той же тестовой базе, как в тестах (TEST MIRROR),
+    иначе чтение через ReplicaRouter ушло бы в пустую базу.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanote.settings')
+    import django
+    django.setup()
+    from django.db import connections
+    from django.test.utils import setup_databases, setup_test_environment
+    setup_test_environment()
+    setup_databases(
+        verbosity=0, interactive=False, aliases=set(connections),
+    )
+
+
+def measure(func, number, repeat=5):
+    """Лучшее среднее время одного вызова в миллисекундах."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e3
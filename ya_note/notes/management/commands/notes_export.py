@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from notes.models import Note
+from notes.transfer import FORMATS, detect_format, write_notes
+
+
+class Command(BaseCommand):
+    help = 'Выгружает заметки в файл JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию стандартный вывод.'
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--author', help='Выгрузить заметки автора.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько заметок читать из базы за один раз.'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        notes = Note.objects.order_by('pk')
+        if options['author']:
+            notes = notes.filter(author__username=options['author'])
+        rows = notes.values_list(
+            'title', 'text', 'slug', 'author__username'
+        ).iterator(chunk_size=options['chunk_size'])
+        file_format = options['format'] or detect_format(output)
+        if output == '-':
+            exported = self.export(self.stdout, file_format, rows, options)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as file:
+                exported = self.export(file, file_format, rows, options)
+        if options['verbosity']:
+            self.stderr.write(f'Выгружено заметок: {exported}')
+
+    def export(self, file, file_format, rows, options):
+        """Пишем заметки и сообщаем о ходе выгрузки после каждой пачки."""
+        exported = 0
+        for exported in write_notes(file, file_format, rows):
+            if options['verbosity'] and (
+                    exported % options['chunk_size'] == 0):
+                self.stderr.write(f'Выгружено: {exported}…')
+        return exported
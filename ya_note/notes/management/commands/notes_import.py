@@ -0,0 +1,77 @@
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from notes.models import Note
+from notes.slugs import allocate_slugs
+from notes.transfer import FORMATS, detect_format, read_notes
+
+
+class Command(BaseCommand):
+    help = 'Загружает заметки из файла JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл с заметками.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument(
+            '--author',
+            help='Записать все заметки на этого пользователя.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько заметок сохранять одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        self.authors = {}
+        self.default_author = (
+            self.get_author(options['author']) if options['author'] else None
+        )
+        file_format = options['format'] or detect_format(options['input'])
+        with open(options['input'], encoding='utf-8', newline='') as file:
+            rows = read_notes(file, file_format)
+            imported = 0
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                imported += self.import_batch(batch)
+                if options['verbosity']:
+                    self.stderr.write(f'Загружено: {imported}…')
+        if options['verbosity']:
+            self.stderr.write(f'Загружено заметок: {imported}')
+
+    def get_author(self, username):
+        """Автор по логину; найденные авторы запоминаются."""
+        if username not in self.authors:
+            try:
+                self.authors[username] = get_user_model().objects.get(
+                    username=username
+                )
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'Пользователь {username} не найден.')
+        return self.authors[username]
+
+    def import_batch(self, batch):
+        """
+        Сохраняем пачку заметок одним bulk_create.
+
+        Совпадающие slug получают суффикс, чтобы импорт
+        не прерывался на уникальном индексе.
+        """
+        notes = [
+            Note(
+                title=row['title'],
+                text=row['text'],
+                slug=row.get('slug') or '',
+                author=self.default_author or self.get_author(row['author']),
+            )
+            for row in batch
+        ]
+        max_length = Note._meta.get_field('slug').max_length
+        with transaction.atomic():
+            allocate_slugs(notes, Note.objects, max_length, rename_taken=True)
+            Note.objects.bulk_create(notes)
+        return len(notes)
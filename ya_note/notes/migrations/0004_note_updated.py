@@ -0,0 +1,36 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:02
+
+from importlib import import_module
+
+from django.db import migrations, models
+import django.utils.timezone
+
+# SQLite пересоздаёт таблицу при добавлении поля и теряет триггеры
+# полнотекстового индекса, поэтому индекс создаётся заново.
+fts = import_module('notes.migrations.0003_note_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_note_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fts.run_on_sqlite(fts.DROP_SQL), fts.run_on_sqlite(fts.CREATE_SQL)
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Изменена'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['author', 'updated'], name='note_author_updated_idx'),
+        ),
+        migrations.RunPython(
+            fts.run_on_sqlite(fts.CREATE_SQL), fts.run_on_sqlite(fts.DROP_SQL)
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
 
-from pytils.translit import slugify
+from .slugs import SLUG_ATTEMPTS, free_slugs, make_slug, taken_slugs
 
 
 class Note(models.Model):
@@ -27,12 +27,45 @@ class Note(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated = models.DateTimeField('Изменена', auto_now=True)
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('author', 'id'), name='note_author_id_idx'),
+            models.Index(
+                fields=('author', 'updated'), name='note_author_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        """
+        Если slug не указан, он формируется из заголовка.
+
+        Уникальность slug проверяет уникальный индекс базы данных:
+        при конфликте к slug добавляется свободный суффикс -2, -3, …
+        Явно указанный занятый slug приводит к IntegrityError.
+        """
+        if self.slug:
+            return super().save(*args, **kwargs)
+        max_length = self._meta.get_field('slug').max_length
+        base = make_slug(self.title, max_length)
+        self.slug = base
+        try:
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except IntegrityError:
+            pass
+        taken = taken_slugs(type(self).objects, base, max_length)
+        for _, slug in zip(range(SLUG_ATTEMPTS), free_slugs(
+                base, taken, max_length)):
+            self.slug = slug
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                continue
+        self.slug = ''
+        raise IntegrityError(f'Не удалось подобрать slug для «{base}».')
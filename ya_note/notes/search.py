@@ -0,0 +1,69 @@
+import re
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Note
+
+FTS_TABLE = 'notes_note_fts'
+# Вес совпадения в заголовке относительно совпадения в тексте.
+TITLE_WEIGHT = 10.0
+WORDS = re.compile(r'\w+')
+
+FTS_SQL = f"""
+    SELECT notes_note.id, notes_note.title, notes_note.slug,
+           snippet({FTS_TABLE}, 1, '', '', '…', 12) AS snippet
+    FROM {FTS_TABLE}
+    JOIN notes_note ON notes_note.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s AND notes_note.author_id = %s
+    ORDER BY bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0)
+    LIMIT %s
+"""
+
+
+def fts_query(query):
+    """
+    Запрос FTS5 из пользовательской строки.
+
+    Каждое слово ищется как префикс, спецсимволы синтаксиса FTS5
+    отбрасываются, поэтому любой ввод даёт корректный запрос.
+    """
+    return ' '.join(f'"{word}"*' for word in WORDS.findall(query))
+
+
+def search_notes_fts(author, query, limit):
+    """Поиск по индексу FTS5 с ранжированием bm25."""
+    match = fts_query(query)
+    if not match:
+        return []
+    return list(Note.objects.raw(FTS_SQL, (match, author.pk, limit)))
+
+
+def search_notes_fallback(author, query, limit):
+    """
+    Поиск для баз данных без FTS5.
+
+    Заметки, в заголовке которых есть все слова запроса,
+    выводятся раньше заметок, где слова найдены только в тексте.
+    """
+    words = WORDS.findall(query)
+    if not words:
+        return []
+    in_title = Q()
+    condition = Q()
+    for word in words:
+        in_title &= Q(title__icontains=word)
+        condition &= Q(title__icontains=word) | Q(text__icontains=word)
+    return list(
+        Note.objects.filter(condition, author=author).annotate(
+            rank=Case(When(in_title, then=Value(0)), default=Value(1),
+                      output_field=IntegerField())
+        ).order_by('rank', '-pk').only('id', 'title', 'slug')[:limit]
+    )
+
+
+def search_notes(author, query, limit):
+    """Заметки автора, подходящие под запрос, в порядке релевантности."""
+    if connection.vendor == 'sqlite':
+        return search_notes_fts(author, query, limit)
+    return search_notes_fallback(author, query, limit)
@@ -0,0 +1,123 @@
+import re
+from functools import lru_cache
+from itertools import count
+
+from pytils.translit import ALPHABET, TRANSTABLE
+
+# Сколько символов slug оставляем под суффикс вида -123.
+SUFFIX_RESERVE = 8
+# Сколько раз пробуем занять свободный slug, если его перехватили.
+SLUG_ATTEMPTS = 10
+# Сколько последних заголовков помнит кэш транслитерации.
+SLUG_CACHE_SIZE = 4096
+# Символ больше любого допустимого в slug: slug состоит из ASCII.
+SLUG_CHARS_END = '\x7f'
+
+AMPERSAND = re.compile(r'\&amp\;|\&')
+SEPARATORS = re.compile(r'[-\s]+')
+# Символы, которые pytils удаляет после транслитерации.
+NON_SLUG = re.compile(r'[^\w\s-]')
+
+
+class _TranslitTable(dict):
+    """Таблица для str.translate, удаляющая символы вне таблицы."""
+
+    def __missing__(self, key):
+        return None
+
+
+def _build_table():
+    """
+    Таблица транслитерации, равносильная pytils.translit.slugify.
+
+    Как и в pytils, для символа действует первая подходящая замена
+    из TRANSTABLE, символы вне алфавита удаляются, а знаки, которые
+    pytils убирает после транслитерации, удаляются сразу.
+    """
+    table = _TranslitTable()
+    for char in ALPHABET:
+        if len(char) == 1:
+            table.setdefault(ord(char), char)
+    for char_in, char_out in reversed(TRANSTABLE):
+        if ord(char_in) in table:
+            table[ord(char_in)] = char_out
+    for key, value in table.items():
+        table[key] = NON_SLUG.sub('', value)
+    return table
+
+
+TRANSLIT_TABLE = _build_table()
+
+
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
+def slugify(title):
+    """
+    Slug из произвольной строки, совпадающий с pytils.translit.slugify.
+
+    Транслитерация выполняется одним вызовом str.translate,
+    а результаты для повторяющихся заголовков берутся из кэша.
+    """
+    title = SEPARATORS.sub('-', AMPERSAND.sub(' and ', str(title).lower()))
+    return title.translate(TRANSLIT_TABLE)
+
+
+def make_slug(title, max_length):
+    """Slug из заголовка заметки."""
+    return slugify(title)[:max_length]
+
+
+def with_suffix(base, number, max_length):
+    """Slug с числовым суффиксом, не длиннее max_length."""
+    suffix = f'-{number}'
+    return base[:max_length - len(suffix)] + suffix
+
+
+def taken_slugs(queryset, base, max_length):
+    """
+    Уже занятые slug, которые могут совпасть с вариантами base.
+
+    Выборка задаётся диапазоном, а не LIKE, чтобы использовать
+    уникальный индекс по slug.
+    """
+    if len(base) > max_length - SUFFIX_RESERVE:
+        prefix = base[:max_length - SUFFIX_RESERVE]
+    else:
+        prefix = f'{base}-'
+    return set(queryset.filter(
+        slug__gte=prefix, slug__lt=prefix + SLUG_CHARS_END
+    ).values_list('slug', flat=True))
+
+
+def free_slugs(base, taken, max_length):
+    """Варианты base с суффиксами -2, -3, …, которых нет среди taken."""
+    for number in count(2):
+        slug = with_suffix(base, number, max_length)
+        if slug not in taken:
+            yield slug
+
+
+def allocate_slugs(notes, queryset, max_length, rename_taken=False):
+    """
+    Заполняем slug у пачки заметок перед bulk_create.
+
+    Занятые slug запрашиваются одним запросом на всю пачку и ещё
+    одним запросом на каждый совпавший slug, повторы внутри
+    пачки разрешаются в памяти. Указанные slug не меняются,
+    если не передан rename_taken: тогда занятые получают суффикс.
+    """
+    bases = [(note, note.slug or make_slug(note.title, max_length))
+             for note in notes if rename_taken or not note.slug]
+    taken = set() if rename_taken else {
+        note.slug for note in notes if note.slug
+    }
+    taken |= set(queryset.filter(
+        slug__in={base for _, base in bases}
+    ).values_list('slug', flat=True))
+    suffixes = {}
+    for note, base in bases:
+        if base in taken and base not in suffixes:
+            taken |= taken_slugs(queryset, base, max_length)
+            suffixes[base] = free_slugs(base, taken, max_length)
+        note.slug = next(suffixes[base]) if base in taken else base
+        taken.add(note.slug)
+    return notes
@@ -1,9 +1,12 @@
+from unittest.mock import patch
+
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse_lazy
 
 from notes.models import Note
-from notes.views import NoteCreate, NoteUpdate
+from notes.search import search_notes_fallback
+from notes.views import NoteCreate, NotesList, NoteUpdate
 
 
 class NoteTestCase(TestCase):
@@ -63,3 +66,210 @@ class NoteTestCase(TestCase):
         response = self.client.get(reverse_lazy(
             'notes:edit', args=[self.note1.slug]))
         self.assertFormOnPage(response, NoteUpdate.form_class)
+
+
+class NotesListPaginationTest(TestCase):
+    """
+    Тесты постраничного вывода списка заметок.
+    """
+    NOTES_COUNT = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user',
+                                            password='password')
+        Note.objects.bulk_create(
+            Note(title=f'Note {i}', text='Text', slug=f'note-{i}',
+                 author=cls.user)
+            for i in range(cls.NOTES_COUNT)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_notes_list_is_paginated(self):
+        """
+        Проверка, что на странице выводится не больше
+          NOTES_COUNT_ON_LIST_PAGE заметок в порядке их id.
+        """
+        page_size = NotesList.paginate_by
+        response = self.client.get(reverse_lazy('notes:list'))
+        notes = list(response.context['object_list'])
+        self.assertEqual(len(notes), min(page_size, self.NOTES_COUNT))
+        self.assertEqual([note.pk for note in notes],
+                         sorted(note.pk for note in notes))
+
+    def test_notes_list_pages_cover_all_notes(self):
+        """
+        Проверка, что все заметки доступны на страницах списка.
+        """
+        with patch.object(NotesList, 'paginate_by', 3):
+            seen = []
+            for page in (1, 2, 3):
+                response = self.client.get(reverse_lazy('notes:list'),
+                                           {'page': page})
+                seen += [note.pk for note in response.context['object_list']]
+        self.assertEqual(
+            seen, list(Note.objects.order_by('id').values_list(
+                'pk', flat=True))
+        )
+
+    def test_notes_list_does_not_load_note_text(self):
+        """
+        Проверка, что текст заметок не загружается для списка.
+        """
+        response = self.client.get(reverse_lazy('notes:list'))
+        for note in response.context['object_list']:
+            self.assertIn('text', note.get_deferred_fields())
+
+
+class NoteSearchTest(TestCase):
+    """
+    Тесты поиска по заметкам.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user',
+                                            password='password')
+        cls.other = User.objects.create_user(username='other',
+                                             password='password')
+        cls.in_text = Note.objects.create(
+            title='Покупки', text='Купить молоко и хлеб', author=cls.user)
+        cls.in_title = Note.objects.create(
+            title='Молоко', text='Обезжиренное', author=cls.user)
+        Note.objects.create(title='Молоко соседа', text='Чужая заметка',
+                            author=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, query):
+        response = self.client.get(reverse_lazy('notes:search'),
+                                   {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [note.pk for note in response.context['object_list']]
+
+    def test_search_ranks_title_matches_first(self):
+        """
+        Проверка, что совпадение в заголовке важнее совпадения в тексте,
+          а заметки других пользователей не находятся.
+        """
+        self.assertEqual(self.search('молоко'),
+                         [self.in_title.pk, self.in_text.pk])
+
+    def test_search_matches_word_prefix(self):
+        """
+        Проверка, что слово запроса ищется как начало слова.
+        """
+        self.assertEqual(self.search('хле'), [self.in_text.pk])
+
+    def test_search_index_follows_changes(self):
+        """
+        Проверка, что изменение и удаление заметки
+          сразу отражаются в результатах поиска.
+        """
+        self.in_text.text = 'Купить кефир'
+        self.in_text.save()
+        self.assertEqual(self.search('кефир'), [self.in_text.pk])
+        self.assertEqual(self.search('хлеб'), [])
+        self.in_text.delete()
+        self.assertEqual(self.search('кефир'), [])
+
+    def test_search_finds_bulk_created_notes(self):
+        """
+        Проверка, что заметки из массового импорта тоже индексируются.
+        """
+        Note.objects.bulk_create([
+            Note(title='Импорт', text='Огурцы', slug='import',
+                 author=self.user)
+        ])
+        self.assertEqual(len(self.search('огурцы')), 1)
+
+    def test_search_ignores_query_syntax(self):
+        """
+        Проверка, что спецсимволы в запросе не приводят к ошибке.
+        """
+        for query in ('"', 'молоко OR', '*', 'NEAR(', '-молоко', ''):
+            with self.subTest(query=query):
+                self.search(query)
+
+    def test_search_fallback_without_fts(self):
+        """
+        Проверка поиска для баз данных без FTS5.
+
+        LIKE в SQLite не различает регистр только для латиницы,
+        поэтому запрос не зависит от регистра первой буквы.
+        """
+        notes = search_notes_fallback(self.user, 'олоко', 10)
+        self.assertEqual([note.pk for note in notes],
+                         [self.in_title.pk, self.in_text.pk])
+
+
+class ConditionalGetTest(TestCase):
+    """
+    Тесты ответов 304 для списка заметок и страницы заметки.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader',
+                                            password='password')
+        cls.other = User.objects.create_user(username='other',
+                                             password='password')
+        cls.note = Note.objects.create(title='Заметка', text='Текст',
+                                       author=cls.user)
+        Note.objects.create(title='Ещё заметка', text='Текст',
+                            author=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertNotModified(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        self.assertEqual(response.content, b'')
+
+    def test_notes_list_not_modified(self):
+        """
+        Проверка, что неизменённый список заметок не отрисовывается
+          повторно, а изменение или удаление заметки меняет ETag.
+        """
+        url = reverse_lazy('notes:list')
+        etag = self.client.get(url)['ETag']
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=etag)
+        self.note.title = 'Новый заголовок'
+        self.note.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Note.objects.exclude(pk=self.note.pk).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_note_detail_not_modified(self):
+        """
+        Проверка, что неизменённая заметка не отрисовывается повторно
+          ни по ETag, ни по Last-Modified.
+        """
+        url = reverse_lazy('notes:detail', args=(self.note.slug,))
+        response = self.client.get(url)
+        self.assertNotModified(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertNotModified(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.note.text = 'Новый текст'
+        self.note.save()
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_note_detail_of_other_user_is_not_found(self):
+        """
+        Проверка, что чужая заметка не отдаётся и по условному запросу.
+        """
+        url = reverse_lazy('notes:detail', args=(self.note.slug,))
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
@@ -1,8 +1,28 @@
-from django.test import TestCase, Client
+import gc
+import json
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.contrib.sessions.models import Session
+from django.db import connection, connections
+from django.db.models.deletion import Collector
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from notes.forms import WARNING
 from notes.models import Note
+from notes.slugs import allocate_slugs
+from yanote import metrics, profiling
+from yanote.routers import (
+    PRIMARY_COOKIE_NAME, PrimaryStickinessMiddleware, ReplicaRouter
+)
 
 User = get_user_model()
 
@@ -176,3 +196,457 @@ class NoteAuthorizationTest(TestCase):
                          404)
         self.assertEqual(Note.objects.count(),
                          1)
+
+
+class NoteQueryCountTest(TestCase):
+    """
+    Число запросов изменяющих маршрутов: сессия, пользователь,
+      заметка загружается один раз, затем изменение.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpassword')
+        cls.note = Note.objects.create(title='Заметка', text='Текст',
+                                       author=cls.user, slug='note')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_create_query_count(self):
+        # Точки сохранения: form_valid и подбор slug в Note.save().
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('notes:add'), data={
+                'title': 'Новая заметка', 'text': 'Текст',
+            })
+        self.assertEqual(response.status_code, 302)
+
+    def test_edit_query_count(self):
+        url = reverse('notes:edit', args=[self.note.slug])
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(6):
+            response = self.client.post(url, data={
+                'title': 'Новое название', 'text': 'Текст', 'slug': 'note',
+            })
+        self.assertEqual(response.status_code, 302)
+
+    def test_delete_query_count(self):
+        url = reverse('notes:delete', args=[self.note.slug])
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(4):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 302)
+
+
+class NoteSlugAllocationTest(TestCase):
+    """
+    Тесты подбора уникального slug.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpassword')
+
+    def create_note(self, title='Заметка', **kwargs):
+        return Note.objects.create(title=title, text='Текст',
+                                   author=self.user, **kwargs)
+
+    def test_same_titles_get_numbered_slugs(self):
+        """
+        Проверка, что заметки с одинаковым заголовком
+          получают slug с суффиксами -2, -3.
+        """
+        slugs = [self.create_note().slug for _ in range(3)]
+        self.assertEqual(slugs, ['zametka', 'zametka-2', 'zametka-3'])
+
+    def test_slug_taken_by_concurrent_request(self):
+        """
+        Проверка, что slug, занятый параллельным запросом
+          после выбора суффикса, пропускается.
+        """
+        self.create_note()
+        self.create_note(slug='zametka-2')
+        with patch('notes.models.taken_slugs', return_value=set()):
+            note = self.create_note()
+        self.assertEqual(note.slug, 'zametka-3')
+
+    def test_suffix_keeps_slug_max_length(self):
+        """
+        Проверка, что суффикс не делает slug длиннее допустимого.
+        """
+        title = 'a' * 100
+        self.create_note(title)
+        note = self.create_note(title)
+        self.assertEqual(note.slug, 'a' * 98 + '-2')
+
+    def test_duplicate_explicit_slug_is_form_error(self):
+        """
+        Проверка, что занятый slug, указанный пользователем,
+          приводит к ошибке формы, а не к ошибке сервера.
+        """
+        self.create_note(slug='my-note')
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('notes:add'), data={
+            'title': 'Другая заметка',
+            'text': 'Текст',
+            'slug': 'my-note',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertFormError(response, 'form', 'slug', 'my-note' + WARNING)
+        self.assertEqual(Note.objects.count(), 1)
+
+    def test_create_does_not_check_slug_before_insert(self):
+        """
+        Проверка, что при создании заметки нет отдельного запроса
+          на проверку уникальности slug.
+        """
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(reverse('notes:add'), data={
+                'title': 'Заметка',
+                'text': 'Текст',
+            })
+        note_queries = [query['sql'] for query in context.captured_queries
+                        if 'notes_note' in query['sql']]
+        self.assertEqual(len(note_queries), 1)
+        self.assertTrue(note_queries[0].startswith('INSERT'))
+
+    def test_allocate_slugs_for_bulk_import(self):
+        """
+        Проверка, что при массовом импорте slug подбираются
+          с учётом базы данных и повторов внутри пачки.
+        """
+        self.create_note()
+        notes = [Note(title='Заметка', text='Текст', author=self.user)
+                 for _ in range(2)]
+        notes.append(Note(title='Другая', text='Текст', author=self.user,
+                          slug='zametka-4'))
+        notes.append(Note(title='Заметка', text='Текст', author=self.user))
+        with self.assertNumQueries(2):
+            allocate_slugs(notes, Note.objects, 100)
+        Note.objects.bulk_create(notes)
+        self.assertEqual([note.slug for note in notes],
+                         ['zametka-2', 'zametka-3', 'zametka-4', 'zametka-5'])
+
+
+class NotesTransferCommandTest(TestCase):
+    """
+    Тесты команд notes_export и notes_import.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author',
+                                            password='password')
+        cls.reader = User.objects.create_user(username='reader',
+                                              password='password')
+        Note.objects.bulk_create(
+            Note(title=f'Заметка {i}', text=f'Текст, "с кавычками"\n{i}',
+                 slug=f'zametka-{i}', author=cls.user)
+            for i in range(5)
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def export_and_reimport(self, file_name):
+        path = self.directory / file_name
+        call_command('notes_export', path, verbosity=0)
+        exported = list(Note.objects.order_by('pk').values_list(
+            'title', 'text', 'slug', 'author__username'))
+        Note.objects.all().delete()
+        call_command('notes_import', path, verbosity=0)
+        imported = list(Note.objects.order_by('pk').values_list(
+            'title', 'text', 'slug', 'author__username'))
+        self.assertEqual(imported, exported)
+
+    def test_jsonl_round_trip(self):
+        """
+        Проверка выгрузки и загрузки заметок в формате JSON Lines.
+        """
+        self.export_and_reimport('notes.jsonl')
+
+    def test_csv_round_trip(self):
+        """
+        Проверка выгрузки и загрузки заметок в формате CSV.
+        """
+        self.export_and_reimport('notes.csv')
+
+    def test_export_to_stdout(self):
+        """
+        Проверка выгрузки в стандартный вывод с отчётом о ходе работы.
+        """
+        stdout, stderr = StringIO(), StringIO()
+        call_command('notes_export', '--chunk-size', 2,
+                     stdout=stdout, stderr=stderr)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['slug'], 'zametka-0')
+        self.assertIn('Выгружено заметок: 5', stderr.getvalue())
+
+    def test_import_renames_taken_slugs(self):
+        """
+        Проверка, что при загрузке совпадающие slug получают суффикс.
+        """
+        path = self.directory / 'notes.jsonl'
+        call_command('notes_export', path, verbosity=0)
+        call_command('notes_import', path, '--author', 'reader',
+                     verbosity=0)
+        slugs = set(Note.objects.filter(author=self.reader).values_list(
+            'slug', flat=True))
+        self.assertEqual(slugs, {f'zametka-{i}-2' for i in range(5)})
+
+    def test_import_uses_batches(self):
+        """
+        Проверка, что заметки сохраняются пачками заданного размера.
+        """
+        path = self.directory / 'notes.csv'
+        call_command('notes_export', path, verbosity=0)
+        Note.objects.all().delete()
+        stderr = StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command('notes_import', path, '--batch-size', 2,
+                         stderr=stderr)
+        inserts = [query for query in context.captured_queries
+                   if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        self.assertIn('Загружено заметок: 5', stderr.getvalue())
+
+    def test_import_unknown_author(self):
+        """
+        Проверка, что загрузка заметок неизвестного автора прерывается.
+        """
+        path = self.directory / 'notes.jsonl'
+        path.write_text(json.dumps({
+            'title': 'Заметка', 'text': 'Текст', 'author': 'nobody',
+        }), encoding='utf-8')
+        with self.assertRaises(CommandError):
+            call_command('notes_import', path, verbosity=0)
+
+
+class ReplicaRouterTest(TestCase):
+    """
+    Тесты выбора соединения для чтения.
+    """
+    def test_reads_inside_transaction_use_default_connection(self):
+        """
+        Проверка, что внутри транзакции теста чтение идёт
+          через основное соединение.
+        """
+        self.assertEqual(ReplicaRouter().db_for_read(Note), 'default')
+
+    def test_writes_use_default_connection(self):
+        """
+        Проверка, что запись всегда идёт через основное соединение.
+        """
+        self.assertEqual(ReplicaRouter().db_for_write(Note), 'default')
+
+    def test_reads_outside_transaction_use_replica(self):
+        """
+        Проверка, что вне транзакции чтение идёт с реплики.
+        """
+        with patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(ReplicaRouter().db_for_read(Note), 'replica')
+
+    def test_note_create_pins_session_to_primary(self):
+        """
+        Проверка, что после создания заметки сеанс читает
+          из основной базы, а без записи — с реплики.
+        """
+        user = User.objects.create(username='writer')
+        self.client.force_login(user)
+        response = self.client.get(reverse('notes:list'))
+        self.assertNotIn(PRIMARY_COOKIE_NAME, response.cookies)
+        response = self.client.post(reverse('notes:add'), data={
+            'title': 'Заметка', 'text': 'Текст',
+        })
+        self.assertIn(PRIMARY_COOKIE_NAME, response.cookies)
+        pinned = RequestFactory().get('/')
+        pinned.COOKIES = {
+            name: cookie.value for name, cookie in self.client.cookies.items()
+        }
+        routed = []
+
+        def get_response(request):
+            with patch.object(connection, 'in_atomic_block', False):
+                routed.append(ReplicaRouter().db_for_read(Note))
+            return HttpResponse()
+
+        middleware = PrimaryStickinessMiddleware(get_response)
+        middleware(pinned)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(routed, ['default', 'replica'])
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpassword')
+        cls.note = Note.objects.create(title='Заметка', text='Текст',
+                                       author=cls.user, slug='note')
+
+    def setUp(self):
+        profiling.store.reset()
+        self.addCleanup(profiling.store.reset)
+        self.client.force_login(self.user)
+
+    def test_server_timing_and_view_stats(self):
+        """
+        Проверка, что запрос получает заголовок Server-Timing,
+          а его замеры попадают в гистограммы представления.
+        """
+        url = reverse('notes:detail', args=[self.note.slug])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(queries)} SQL"', timing)
+        self.assertIn('session;dur=', timing)
+        self.assertIn('tpl;dur=', timing)
+        stats = profiling.store.snapshot()['notes:detail']
+        self.assertEqual(stats['total_ms']['count'], 1)
+        self.assertEqual(stats['queries']['count'], 1)
+
+    def test_enclosing_execute_wrapper_is_kept(self):
+        """
+        Проверка, что замер запроса внутри чужого execute_wrapper()
+          не меняет список обёрток соединения после выхода из него.
+        """
+        before = list(connection.execute_wrappers)
+        seen = []
+
+        def outer(execute, sql, params, many, context):
+            seen.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(outer):
+            response = self.client.get(
+                reverse('notes:detail', args=[self.note.slug])
+            )
+        self.assertIn(f'desc="{len(seen)} SQL"', response['Server-Timing'])
+        self.assertEqual(connection.execute_wrappers, before)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        response = self.client.get(reverse('notes:list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.store.snapshot(), {})
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='testpassword')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        return {
+            sample: float(value)
+            for sample, _, value in (
+                line.rpartition(' ')
+                for line in response.content.decode().splitlines()
+                if not line.startswith('#')
+            )
+        }
+
+    def test_note_writes_and_slug_cache(self):
+        """
+        Проверка, что /metrics считает ответы, создание заметок
+          и обращения к кэшу транслитерации slug.
+        """
+        before = self.scrape()
+        for title in ('Первая заметка', 'Вторая заметка'):
+            self.client.post(reverse('notes:add'), data={
+                'title': title, 'text': 'Текст',
+            })
+        after = self.scrape()
+
+        def delta(sample):
+            return after.get(sample, 0) - before.get(sample, 0)
+
+        self.assertEqual(delta(
+            'http_requests_total{view="notes:add",method="POST",'
+            'status="302"}'
+        ), 2)
+        self.assertEqual(delta(
+            'model_writes_total{model="notes.Note",action="created"}'
+        ), 2)
+        self.assertGreaterEqual(
+            delta('cache_requests_total{cache="slugify",result="hit"}')
+            + delta('cache_requests_total{cache="slugify",result="miss"}'),
+            2,
+        )
+
+    def test_counter_survives_enclosing_execute_wrapper(self):
+        """
+        Проверка, что соединение, открытое внутри чужого
+          execute_wrapper(), после выхода из него продолжает считать
+          запросы, а чужая обёртка снимается.
+        """
+        fresh = connections.create_connection('default')
+        self.addCleanup(fresh.close)
+
+        def outer(execute, sql, params, many, context):
+            return execute(sql, params, many, context)
+
+        with fresh.execute_wrapper(outer):
+            with fresh.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        self.assertEqual(fresh.execute_wrappers, [metrics.count_query])
+        key = (metrics.QUERIES.name, ('default',))
+        before = metrics.registry.snapshot()[key]
+        with fresh.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertEqual(metrics.registry.snapshot()[key], before + 1)
+
+    def test_registry_folds_values_of_finished_threads(self):
+        """
+        Проверка, что словари завершившихся потоков переносятся
+          в общий итог, а не копятся в реестре.
+        """
+        registry = metrics.Registry()
+        key = ('test_total', ())
+        for _ in range(200):
+            thread = threading.Thread(target=registry.inc, args=(key,))
+            thread.start()
+            thread.join()
+        del thread
+        gc.collect()
+        self.assertEqual(registry.shards, {})
+        self.assertEqual(registry.snapshot()[key], 200)
+
+    def test_write_counters_keep_fast_delete_of_other_models(self):
+        """
+        Проверка, что счётчики записей подключены только к заметкам:
+          сессии по-прежнему удаляются без загрузки строк.
+        """
+        collector = Collector(using='default')
+        self.assertTrue(collector.can_fast_delete(Session.objects.all()))
+        self.assertFalse(collector.can_fast_delete(Note.objects.all()))
+
+    @override_settings(METRICS_ALLOWED_IPS=['192.0.2.1'])
+    def test_forbidden_for_other_addresses(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_client_address_from_proxy_header(self):
+        url = reverse('metrics')
+        response = self.client.get(
+            url, REMOTE_ADDR='10.0.0.2',
+            HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.7',
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(
+            url, REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='127.0.0.1'
+        )
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,98 @@
+import random
+
+from django.test import SimpleTestCase
+from pytils.translit import slugify as pytils_slugify
+
+from notes.slugs import SLUG_CACHE_SIZE, make_slug, slugify
+
+RUSSIAN = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+CORPUS_CHARS = (
+    RUSSIAN + RUSSIAN.upper()
+    + 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+    + ' \t\n-_&;.,:!?\'"«»“”‘’–—‒−…№#@$%^*()[]{}/\\|+=~`'
+    + 'ßİçéüĀĲ😀中'
+)
+CORPUS_SIZE = 20000
+
+
+def make_corpus(size=CORPUS_SIZE, seed=0):
+    """Случайные заголовки из кириллицы, латиницы, знаков и пробелов."""
+    rnd = random.Random(seed)
+    for _ in range(size):
+        title = ''.join(rnd.choices(CORPUS_CHARS, k=rnd.randint(0, 60)))
+        if rnd.random() < 0.1:
+            title = title + ' &amp; ' + title
+        yield title
+
+
+class SlugifyParityTest(SimpleTestCase):
+    """
+    Тесты совпадения slug с pytils.translit.slugify.
+    """
+    def assertSameAsPytils(self, titles):
+        mismatches = [
+            (title, slugify(title), pytils_slugify(title))
+            for title in titles
+            if slugify(title) != pytils_slugify(title)
+        ]
+        self.assertEqual(mismatches, [])
+
+    def test_known_titles(self):
+        """
+        Проверка на типичных заголовках заметок.
+        """
+        self.assertSameAsPytils([
+            '',
+            'Название заметки',
+            'Заметка №1 — «важное»',
+            'Щука, Ёж и Шмель',
+            'Съешь же ещё этих мягких французских булок',
+            'Tom & Jerry &amp; friends',
+            '  пробелы   по краям  ',
+            'multi---dash___under',
+            'Объявление: подъезд…',
+            'ÇA VA? Ünïcode',
+        ])
+
+    def test_random_corpus(self):
+        """
+        Проверка на большом наборе случайных заголовков.
+        """
+        self.assertSameAsPytils(make_corpus())
+
+    def test_non_string_title(self):
+        """
+        Проверка, что заголовок приводится к строке, как в pytils.
+        """
+        self.assertEqual(slugify(123), pytils_slugify(123))
+
+    def test_make_slug_truncates(self):
+        """
+        Проверка, что make_slug обрезает slug до max_length.
+        """
+        self.assertEqual(make_slug('Щ' * 50, 100), 'sch' * 33 + 's')
+
+
+class SlugifyCacheTest(SimpleTestCase):
+    """
+    Тесты кэша транслитерации.
+    """
+    def setUp(self):
+        slugify.cache_clear()
+
+    def test_repeated_title_is_cached(self):
+        """
+        Проверка, что повторный заголовок берётся из кэша.
+        """
+        slugify('Заметка')
+        slugify('Заметка')
+        info = slugify.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_cache_is_bounded(self):
+        """
+        Проверка, что размер кэша ограничен.
+        """
+        for title in make_corpus(SLUG_CACHE_SIZE * 2, seed=1):
+            slugify(title)
+        self.assertLessEqual(slugify.cache_info().currsize, SLUG_CACHE_SIZE)
@@ -0,0 +1,47 @@
+import csv
+import json
+from pathlib import Path
+
+FIELDS = ('title', 'text', 'slug', 'author')
+FORMATS = ('jsonl', 'csv')
+
+
+def detect_format(path, default='jsonl'):
+    """Формат файла по расширению: .csv или JSON Lines."""
+    suffix = Path(path).suffix.lower().lstrip('.')
+    if suffix in FORMATS:
+        return suffix
+    if suffix in ('json', 'ndjson'):
+        return 'jsonl'
+    return default
+
+
+def read_notes(file, file_format):
+    """Построчно читаем заметки из файла, не загружая его целиком."""
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def write_notes(file, file_format, rows):
+    """
+    Построчно записываем заметки в файл.
+
+    rows — итератор кортежей в порядке FIELDS.
+    Возвращает итератор, который отдаёт номер каждой записанной строки.
+    """
+    if file_format == 'csv':
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(FIELDS)
+        for number, row in enumerate(rows, 1):
+            writer.writerow(row)
+            yield number
+        return
+    for number, row in enumerate(rows, 1):
+        file.write(
+            json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+        )
+        yield number
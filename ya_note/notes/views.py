@@ -1,9 +1,16 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
 from django.views import generic
 
 from .forms import NoteForm
 from .models import Note
+from .search import search_notes
 
 
 class Home(generic.TemplateView):
@@ -16,14 +23,84 @@ class NoteSuccess(LoginRequiredMixin, generic.TemplateView):
     template_name = 'notes/success.html'
 
 
-class NoteBase(LoginRequiredMixin):
+class SingleFetchMixin:
+    """
+    Объект загружается из базы один раз за запрос.
+
+    Повторный вызов get_object() возвращает уже загруженный объект.
+    Связанные объекты из display_related нужны только шаблону,
+    поэтому присоединяются через select_related лишь при показе
+    страницы, а не при сохранении или удалении.
+    """
+    display_related = ()
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if '_fetched_object' not in self.__dict__:
+            self._fetched_object = super().get_object()
+        return self._fetched_object
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.display_related and self.request.method in ('GET', 'HEAD'):
+            queryset = queryset.select_related(*self.display_related)
+        return queryset
+
+
+class NoteBase(LoginRequiredMixin, SingleFetchMixin):
     """Базовый класс для остальных CBV."""
     model = Note
     success_url = reverse_lazy('notes:success')
 
     def get_queryset(self):
         """Пользователь может работать только со своими заметками."""
-        return self.model.objects.filter(author=self.request.user)
+        return super().get_queryset().filter(author=self.request.user)
+
+    def form_valid(self, form):
+        """Занятый slug показываем как ошибку формы, а не ошибку 500."""
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except IntegrityError:
+            form.add_slug_error()
+            return self.form_invalid(form)
+
+
+class ConditionalGetMixin:
+    """
+    Ответ 304 Not Modified без отрисовки шаблона.
+
+    Валидаторы вычисляются до обработки запроса, поэтому
+    get_etag() и get_last_modified() должны быть дешёвыми.
+    В списке базовых классов миксин ставится после NoteBase,
+    чтобы анонимный пользователь сначала перенаправлялся на вход.
+    """
+
+    def get_etag(self):
+        return None
+
+    def get_last_modified(self):
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag()
+        etag = quote_etag(etag) if etag else None
+        last_modified = self.get_last_modified()
+        if last_modified:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if etag and not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return response
 
 
 class NoteCreate(NoteBase, generic.CreateView):
@@ -32,9 +109,7 @@ class NoteCreate(NoteBase, generic.CreateView):
     form_class = NoteForm
 
     def form_valid(self, form):
-        new_note = form.save(commit=False)
-        new_note.author = self.request.user
-        new_note.save()
+        form.instance.author = self.request.user
         return super().form_valid(form)
 
 
@@ -49,11 +124,66 @@ class NoteDelete(NoteBase, generic.DeleteView):
     template_name = 'notes/delete.html'
 
 
-class NotesList(NoteBase, generic.ListView):
+class NotesList(NoteBase, ConditionalGetMixin, generic.ListView):
     """Список всех заметок пользователя."""
     template_name = 'notes/list.html'
+    paginate_by = settings.NOTES_COUNT_ON_LIST_PAGE
 
-
-class NoteDetail(NoteBase, generic.DetailView):
+    def get_queryset(self):
+        """
+        Заметки выводятся постранично в порядке индекса (author, id).
+
+        Текст заметок в списке не нужен, поэтому не загружается.
+        """
+        return super().get_queryset().order_by('id').only(
+            'id', 'slug', 'title'
+        )
+
+    def get_etag(self):
+        """
+        Число заметок и время последнего изменения.
+
+        Оба значения читаются из индекса (author, updated): новая,
+        изменённая или удалённая заметка меняет хотя бы одно из них.
+        """
+        stats = super().get_queryset().aggregate(
+            count=Count('id'), updated=Max('updated')
+        )
+        updated = stats['updated'].timestamp() if stats['updated'] else 0
+        return f'notes-{self.request.user.pk}-{stats["count"]}-{updated}'
+
+
+class NoteDetail(NoteBase, ConditionalGetMixin, generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+    @cached_property
+    def updated(self):
+        """Время изменения заметки без загрузки её текста."""
+        return self.get_queryset().filter(
+            slug=self.kwargs['slug']
+        ).values_list('updated', flat=True).first()
+
+    def get_etag(self):
+        if self.updated:
+            return f'note-{self.kwargs["slug"]}-{self.updated.timestamp()}'
+
+    def get_last_modified(self):
+        return self.updated
+
+
+class NoteSearch(NoteBase, generic.ListView):
+    """Поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+
+    def get_queryset(self):
+        return search_notes(
+            self.request.user,
+            self.request.GET.get('q', ''),
+            settings.NOTES_SEARCH_LIMIT,
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        return context
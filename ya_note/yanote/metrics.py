@@ -0,0 +1,416 @@
+# Копия этого модуля — ya_news/yanews/metrics.py:
+# проекты запускаются отдельно, поэтому исправления вносятся
+# и проверяются тестами в обоих.
+
+import asyncio
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+
+from asgiref.sync import markcoroutinefunction
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views import View
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class Registry:
+    """
+    Значения метрик процесса.
+
+    Каждый поток увеличивает значения в своём словаре, поэтому
+    запись не берёт блокировку; словари потоков складываются при
+    чтении. Словарь завершившегося потока переносится в общий итог,
+    чтобы серверы с потоком на запрос не копили словари.
+    Ключ значения — имя метрики и кортеж значений меток.
+    """
+
+    def __init__(self):
+        self.families = {}
+        self.collectors = []
+        self.reset()
+
+    def reset(self):
+        self.local = threading.local()
+        self.shards = {}
+        self.retired = {}
+        self.lock = threading.Lock()
+        self.flusher = None
+        self.started = time.time_ns()
+
+    def register(self, family):
+        self.families[family.name] = family
+        return family
+
+    def inc(self, key, amount=1):
+        try:
+            values = self.local.values
+        except AttributeError:
+            values = self.local.values = {}
+            with self.lock:
+                self.shards[id(values)] = values
+            weakref.finalize(
+                threading.current_thread(), self.retire, self.shards, values
+            )
+        values[key] = values.get(key, 0) + amount
+
+    def retire(self, shards, values):
+        """Переносим значения завершившегося потока в общий итог."""
+        with self.lock:
+            # После fork реестр начат заново: значения родителя
+            # учтены в его собственном файле.
+            if shards is not self.shards:
+                return
+            del shards[id(values)]
+            for key, value in values.items():
+                self.retired[key] = self.retired.get(key, 0) + value
+
+    def snapshot(self):
+        """Сумма значений всех потоков процесса и сборщиков."""
+        with self.lock:
+            shards = list(self.shards.values())
+            totals = dict(self.retired)
+        for shard in shards:
+            for key, value in shard.copy().items():
+                totals[key] = totals.get(key, 0) + value
+        for collect in self.collectors:
+            for key, value in collect():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def publish(self):
+        """
+        Сохраняет значения процесса в METRICS_MULTIPROCESS_DIR.
+
+        Файл заменяется целиком, поэтому читатель всегда видит
+        согласованный снимок. Имя включает время запуска процесса:
+        повторно выданный PID не затрёт значения завершившегося.
+        """
+        directory = settings.METRICS_MULTIPROCESS_DIR
+        if not directory:
+            return
+        path = Path(directory) / f'metrics-{os.getpid()}-{self.started}.json'
+        temporary = path.with_suffix('.tmp')
+        temporary.write_text(json.dumps([
+            [name, list(labels), value]
+            for (name, labels), value in self.snapshot().items()
+        ]))
+        os.replace(temporary, path)
+
+    def start_flusher(self):
+        """Поток, сохраняющий значения процесса раз в интервал."""
+        if self.flusher is not None:
+            return
+        with self.lock:
+            if self.flusher is not None:
+                return
+            self.flusher = threading.Thread(
+                target=self.flush_forever, name='metrics-flusher',
+                daemon=True,
+            )
+        self.flusher.start()
+        atexit.register(self.publish)
+
+    def flush_forever(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.publish()
+
+
+registry = Registry()
+# Дочерний процесс начинает с нуля: значения родителя
+# уже учтены в его собственном файле.
+os.register_at_fork(after_in_child=registry.reset)
+
+
+def collect():
+    """Значения этого процесса или всех процессов из общей директории."""
+    if not settings.METRICS_MULTIPROCESS_DIR:
+        return registry.snapshot()
+    registry.publish()
+    totals = {}
+    for path in Path(settings.METRICS_MULTIPROCESS_DIR).glob(
+        'metrics-*.json'
+    ):
+        try:
+            items = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in items:
+            key = (name, tuple(labels))
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def format_sample(name, labelnames, labels, value):
+    if labels:
+        pairs = ','.join(
+            f'{labelname}="{escape(label)}"'
+            for labelname, label in zip(labelnames, labels)
+        )
+        name = f'{name}{{{pairs}}}'
+    return f'{name} {value}'
+
+
+class Counter:
+    """Счётчик; имя по соглашению Prometheus оканчивается на _total."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def inc(self, *labels, amount=1):
+        registry.inc((self.name, labels), amount)
+
+    def samples(self, values):
+        return [
+            format_sample(self.name, self.labelnames, labels, value)
+            for labels, value in sorted(values.get(self.name, {}).items())
+        ]
+
+
+class Histogram:
+    """
+    Гистограмма. Корзины хранятся раздельно и накапливаются
+    только при выводе, поэтому наблюдение — одно увеличение
+    корзины, суммы и числа значений.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.bounds = [repr(float(bound)) for bound in buckets] + ['+Inf']
+        registry.register(self)
+
+    def observe(self, value, *labels):
+        bound = self.bounds[bisect.bisect_left(self.buckets, value)]
+        registry.inc((f'{self.name}_bucket', labels + (bound,)))
+        registry.inc((f'{self.name}_sum', labels), value)
+        registry.inc((f'{self.name}_count', labels))
+
+    def samples(self, values):
+        buckets = values.get(f'{self.name}_bucket', {})
+        sums = values.get(f'{self.name}_sum', {})
+        lines = []
+        for labels, count in sorted(
+            values.get(f'{self.name}_count', {}).items()
+        ):
+            cumulative = 0
+            for bound in self.bounds:
+                cumulative += buckets.get(labels + (bound,), 0)
+                lines.append(format_sample(
+                    f'{self.name}_bucket', self.labelnames + ('le',),
+                    labels + (bound,), cumulative,
+                ))
+            lines.append(format_sample(
+                f'{self.name}_sum', self.labelnames, labels, sums[labels]
+            ))
+            lines.append(format_sample(
+                f'{self.name}_count', self.labelnames, labels, count
+            ))
+        return lines
+
+
+def exposition(totals):
+    """Текстовый формат Prometheus."""
+    values = {}
+    for (name, labels), value in totals.items():
+        values.setdefault(name, {})[labels] = value
+    lines = []
+    for family in registry.families.values():
+        lines.append(f'# HELP {family.name} {family.documentation}')
+        lines.append(f'# TYPE {family.name} {family.type}')
+        lines += family.samples(values)
+    return '\n'.join(lines) + '\n'
+
+
+REQUESTS = Counter(
+    'http_requests_total', 'Ответы по имени маршрута, методу и коду.',
+    ('view', 'method', 'status'),
+)
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время ответа по имени маршрута.',
+    ('view',),
+)
+QUERIES = Counter(
+    'db_queries_total', 'SQL-запросы по базе данных.', ('alias',)
+)
+QUERY_SECONDS = Counter(
+    'db_query_seconds_total', 'Время SQL-запросов по базе данных.',
+    ('alias',),
+)
+MODEL_WRITES = Counter(
+    'model_writes_total',
+    'Записи моделей из METRICS_WRITE_MODELS по действию.',
+    ('model', 'action'),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Чтения из кэша: попадания и промахи.',
+    ('cache', 'result'),
+)
+
+
+def count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context['connection'].alias
+        QUERIES.inc(alias)
+        QUERY_SECONDS.inc(alias, amount=time.perf_counter() - started)
+
+
+def install_wrapper(connection):
+    """
+    Ставит count_query первой, самой внешней обёрткой соединения.
+
+    Соединение может открыться внутри чужого execute_wrapper(), а тот
+    при выходе снимает последнюю обёртку списка. Первую он не снимет
+    и свою не оставит, поэтому счётчик работает постоянно.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_query)
+
+
+def install_on_new_connection(sender, connection, **kwargs):
+    install_wrapper(connection)
+
+
+connection_created.connect(install_on_new_connection)
+
+
+def count_save(sender, created, **kwargs):
+    MODEL_WRITES.inc(
+        sender._meta.label, 'created' if created else 'updated'
+    )
+
+
+def count_delete(sender, **kwargs):
+    MODEL_WRITES.inc(sender._meta.label, 'deleted')
+
+
+def connect_write_signals():
+    """
+    Подключает счётчики записей к моделям METRICS_WRITE_MODELS.
+
+    Вызывается из AppConfig.ready(). Приёмник post_delete без sender
+    отключил бы быстрое удаление у всех моделей: clearsessions
+    и каскадное удаление загружали бы каждую строку ради сигнала.
+    """
+    for label in settings.METRICS_WRITE_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(count_save, sender=model)
+        post_delete.connect(count_delete, sender=model)
+
+
+class MetricsMiddleware:
+    """
+    Считает ответы и время ответа по имени маршрута. Ставится
+    в начало MIDDLEWARE, чтобы время включало остальные слои.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = self.start()
+        response = self.get_response(request)
+        self.finish(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = self.start()
+        response = await self.get_response(request)
+        self.finish(request, response, started)
+        return response
+
+    @staticmethod
+    def start():
+        for connection in connections.all():
+            install_wrapper(connection)
+        if settings.METRICS_MULTIPROCESS_DIR:
+            registry.start_flusher()
+        return time.perf_counter()
+
+    @staticmethod
+    def finish(request, response, started):
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        method = request.method if request.method in METHODS else 'other'
+        REQUESTS.inc(view, method, str(response.status_code))
+        REQUEST_DURATION.observe(time.perf_counter() - started, view)
+
+
+def client_address(request):
+    """
+    Адрес клиента для проверки доступа к метрикам.
+
+    За обратным прокси REMOTE_ADDR — адрес прокси. Тогда адрес клиента
+    берётся из заголовка METRICS_CLIENT_IP_HEADER, например
+    HTTP_X_FORWARDED_FOR: последнее значение в нём дописал сам прокси,
+    а более ранние мог подставить клиент.
+    """
+    header = settings.METRICS_CLIENT_IP_HEADER
+    if header and request.META.get(header):
+        return request.META[header].split(',')[-1].strip()
+    return request.META['REMOTE_ADDR']
+
+
+class MetricsView(View):
+    """Метрики для Prometheus; доступ — с адресов METRICS_ALLOWED_IPS."""
+
+    def get(self, request):
+        allowed = settings.METRICS_ALLOWED_IPS
+        if allowed is not None and client_address(request) not in allowed:
+            return HttpResponseForbidden()
+        return HttpResponse(exposition(collect()), content_type=CONTENT_TYPE)
+
+
+def slug_cache_requests():
+    """Попадания и промахи кэша транслитерации slug."""
+    from notes.slugs import slugify
+    info = slugify.cache_info()
+    return [
+        ((CACHE_REQUESTS.name, ('slugify', 'hit')), info.hits),
+        ((CACHE_REQUESTS.name, ('slugify', 'miss')), info.misses),
+    ]
+
+
+registry.collectors.append(slug_cache_requests)
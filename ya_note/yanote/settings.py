@@ -22,7 +22,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yanote.metrics.MetricsMiddleware',
+    'yanote.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yanote.routers.PrimaryStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,13 +55,40 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yanote.wsgi.application'
 
 
+# Каждое соединение с SQLite настраивается через PRAGMA:
+# WAL позволяет читать во время записи, busy_timeout — ждать
+# освобождения блокировки, а не сразу получать «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yanote.sqlite',
+        'NAME': BASE_DIR / 'db.sqlite3',
+        'PRAGMAS': SQLITE_PRAGMAS,
+        'TRANSACTION_MODE': 'IMMEDIATE',
+    },
+    # Реплика для чтения. По умолчанию это тот же файл, открытый
+    # только для чтения; для настоящей реплики укажите в NAME
+    # копию базы, которую поддерживает репликация (например, Litestream).
+    'replica': {
+        'ENGINE': 'yanote.sqlite',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'PRAGMAS': {**SQLITE_PRAGMAS, 'query_only': 'ON'},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['yanote.routers.ReplicaRouter']
+
+# Сколько секунд после записи сеанс читает из основной базы.
+DATABASE_PRIMARY_STICKY_SECONDS = 5
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,3 +117,31 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+NOTES_COUNT_ON_LIST_PAGE = 50
+NOTES_SEARCH_LIMIT = 50
+
+# Профилирование запросов: замеряется доля PROFILING_SAMPLE_RATE
+# запросов, гистограммы представлений хранятся за последние
+# PROFILING_HISTOGRAM_WINDOW секунд. При PROFILING_CPROFILE_SLOWEST > 0
+# профили cProfile стольких самых медленных запросов под WSGI
+# сохраняются в PROFILING_CPROFILE_DIR.
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_HISTOGRAM_WINDOW = 60 * 5
+PROFILING_CPROFILE_SLOWEST = 0
+PROFILING_CPROFILE_DIR = BASE_DIR / 'profiles'
+
+# Метрики Prometheus на /metrics: адреса, с которых их можно читать
+# (None — с любых), и модели, записи которых считаются. Адрес берётся
+# из REMOTE_ADDR; за обратным прокси это адрес прокси, поэтому задайте
+# METRICS_CLIENT_IP_HEADER — заголовок, в который прокси пишет адрес
+# клиента (например 'HTTP_X_FORWARDED_FOR'), — или впишите адрес
+# прокси в METRICS_ALLOWED_IPS. Если обработчиков несколько, каждый
+# процесс раз в METRICS_FLUSH_INTERVAL секунд сохраняет свои значения
+# в METRICS_MULTIPROCESS_DIR, а /metrics складывает файлы всех
+# процессов. Директорию очищают перед запуском сервера.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_CLIENT_IP_HEADER = None
+METRICS_WRITE_MODELS = ['notes.Note']
+METRICS_MULTIPROCESS_DIR = None
+METRICS_FLUSH_INTERVAL = 1